@@ -23,6 +23,7 @@ SOFTWARE.
 """
 
 import requests
+from contextvars import ContextVar
 from enum import Enum
 
 
@@ -31,8 +32,15 @@ class ApiClient:
 	apiUri = 'https://api.elasticemail.com/v2'
 	apiKey = '00000000-0000-0000-0000-0000000000000'
 
+	# When set, Request hands (method, url, data, attachs) to this callable instead
+	# of calling the API; AsyncApiClient uses it to reuse the resource methods.
+	requestHook = ContextVar('requestHook', default=None)
+
 	@staticmethod
 	def Request(method, url, data=None, attachs=None):
+		hook = ApiClient.requestHook.get()
+		if hook is not None:
+			return hook(method, url, data, attachs)
 		if data is None:
 			data = dict()
 		data['apikey'] = ApiClient.apiKey
@@ -41,10 +49,8 @@ class ApiClient:
 		elif method == 'PUT':
 			result = requests.put(ApiClient.apiUri + url, data=data)
 		elif method == 'GET':
-			attach = ''
 			params = {k: v for k, v in data.items() if v != None}
 			result = requests.get(ApiClient.apiUri + url, params=params)
-			print(result.url)
 
 		jsonMy = result.json()
 
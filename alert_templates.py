@@ -0,0 +1,153 @@
+"""
+Precompiled subject, text and HTML templates for alert emails
+"""
+import html
+from dataclasses import dataclass
+from datetime import datetime
+from string import Template
+from typing import Callable, Dict, List, Optional, Tuple
+
+from alerts import ALERT_CATEGORIES, FIVE_PERCENT, STAGNANT, TEN_PERCENT, TOLERANCE_BREACH
+from config import TrackerConfig
+
+SUBJECT_TEMPLATE = Template("Stock Alert: $label - $date")
+
+HTML_TEMPLATE = Template("""<html>
+<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    <h2 style="color: #d32f2f;">Stock Portfolio Alert</h2>
+    $greeting$content
+    <hr style="margin: 20px 0;">
+    <p style="font-size: 12px; color: #666;">
+        This is an automated message from your Stock Tracker system.
+    </p>
+</body>
+</html>""")
+
+# Plain text (e.g. a single stream alert) shown as-is in the HTML body
+PREFORMATTED_TEMPLATE = Template(
+    '<div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px;">'
+    '<pre style="white-space: pre-wrap; font-family: monospace;">$text</pre></div>')
+
+TABLE_START = ('<table style="border-collapse: collapse; margin-bottom: 15px;">'
+               '<tr><th style="text-align: left; padding: 4px 12px;">Symbol</th>'
+               '<th style="text-align: right; padding: 4px 12px;">{}</th></tr>')
+TABLE_ROW = ('<tr><td style="padding: 4px 12px;">{}</td>'
+             '<td style="text-align: right; padding: 4px 12px;">{}</td></tr>').format
+TABLE_END = '</table>'
+
+
+@dataclass
+class RenderedAlert:
+    """One alert email, ready to send"""
+    subject: str
+    text: str
+    html: str
+
+
+@dataclass
+class _Section:
+    """Static parts of one alert category, rendered once per renderer"""
+    label: str
+    text_heading: str
+    text_row: Callable[..., str]
+    html_start: str
+    html_value: Callable[..., str]
+
+
+def render_html_text(text: str) -> str:
+    """Wrap a plain-text message in the alert HTML layout, escaping it"""
+    content = PREFORMATTED_TEMPLATE.substitute(text=html.escape(text))
+    return HTML_TEMPLATE.substitute(greeting='', content=content)
+
+
+class AlertRenderer:
+    """Render alert digests from templates compiled once
+
+    Headings, table headers and the document shell depend only on the
+    configured thresholds, so they are built when the renderer is created.
+    Rendered rows are cached by (category, symbol, value), so an alert shared
+    by many personalized digests is formatted and HTML-escaped once; the
+    cache is dropped when it reaches ``row_cache_size`` entries.
+    """
+
+    def __init__(self, config: TrackerConfig, row_cache_size: int = 100_000):
+        self.row_cache_size = row_cache_size
+        self._rows: Dict[tuple, Tuple[str, str]] = {}
+        ten = f"{config.ten_percent_threshold:g}%"
+        five = f"{config.five_percent_threshold:g}%"
+        drop_row = "  {}: {}% drop from high".format
+        drop_value = "{}%".format
+        self.sections: Dict[str, _Section] = {
+            TOLERANCE_BREACH: self._section("Tolerance Breach", "🚨 CONSIDER SELLING - Tolerance Breached:",
+                                            drop_row, "Drop from high", drop_value),
+            TEN_PERCENT: self._section(f"{ten} Threshold Breached", f"⚠️  {ten} Threshold Breached:",
+                                       drop_row, "Drop from high", drop_value),
+            FIVE_PERCENT: self._section(f"{five} Threshold Breached", f"📉 {five} Threshold Breached:",
+                                        drop_row, "Drop from high", drop_value),
+            STAGNANT: self._section("Stagnant Stocks", "😴 Stagnant Stocks (Time to Review?):",
+                                    "  {}: {} days since peak".format, "Days since peak", "{}".format),
+        }
+
+    @staticmethod
+    def _section(label: str, heading: str, text_row: Callable[..., str], value_header: str,
+                 html_value: Callable[..., str]) -> _Section:
+        html_start = (f'<h3 style="margin: 15px 0 5px;">{html.escape(heading)}</h3>'
+                      + TABLE_START.format(html.escape(value_header)))
+        return _Section(label, heading, text_row, html_start, html_value)
+
+    def subject(self, alerts: Dict[str, List], day: Optional[datetime] = None) -> str:
+        """Subject naming the most severe category present"""
+        label = next((self.sections[category].label for category in ALERT_CATEGORIES if alerts.get(category)), "")
+        return SUBJECT_TEMPLATE.substitute(label=label, date=(day or datetime.now()).strftime('%Y-%m-%d'))
+
+    def render(self, alerts: Dict[str, List], day: Optional[datetime] = None,
+               recipient: Optional[str] = None) -> RenderedAlert:
+        """Render a digest of [symbol, value] pairs keyed by category, optionally addressed to a recipient"""
+        text_parts = [f"Hi {recipient},\n"] if recipient else []
+        html_parts = []
+        rows = self._rows
+        if len(rows) >= self.row_cache_size:
+            rows.clear()
+
+        for category in ALERT_CATEGORIES:
+            entries = alerts.get(category)
+            if not entries:
+                continue
+            section = self.sections[category]
+            text_parts.append(section.text_heading)
+            html_parts.append(section.html_start)
+            for symbol, value in entries:
+                key = (category, symbol, value)
+                row = rows.get(key)
+                if row is None:
+                    row = rows[key] = (section.text_row(symbol, value),
+                                       TABLE_ROW(html.escape(str(symbol)), section.html_value(value)))
+                text_parts.append(row[0])
+                html_parts.append(row[1])
+            text_parts.append("")
+            html_parts.append(TABLE_END)
+
+        greeting = f"<p>Hi {html.escape(recipient)},</p>\n    " if recipient else ""
+        return RenderedAlert(
+            subject=self.subject(alerts, day),
+            text="\n".join(text_parts),
+            html=HTML_TEMPLATE.substitute(greeting=greeting, content="".join(html_parts)),
+        )
+
+    def summary(self, alerts: Dict[str, List], max_length: int = 160) -> str:
+        """Single-line digest for SMS and chat, cut to ``max_length`` with a count of the alerts left out"""
+        total = sum(len(alerts.get(category) or []) for category in ALERT_CATEGORIES)
+        text, shown = "", 0
+        for category in ALERT_CATEGORIES:
+            entries = alerts.get(category)
+            if not entries:
+                continue
+            unit = "d" if category == STAGNANT else "%"
+            prefix = f"{'; ' if text else ''}{self.sections[category].label}: "
+            for position, (symbol, value) in enumerate(entries):
+                candidate = text + (prefix if position == 0 else ", ") + f"{symbol} {value}{unit}"
+                more = f" (+{total - shown - 1} more)" if shown + 1 < total else ""
+                if len(candidate) + len(more) > max_length:
+                    return text + f" (+{total - shown} more)" if text else candidate[:max_length]
+                text, shown = candidate, shown + 1
+        return text
@@ -0,0 +1,57 @@
+"""
+Alert categories and thresholds shared by the batch and streaming evaluators
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from config import TrackerConfig
+
+TOLERANCE_BREACH = 'tolerance_breach'
+TEN_PERCENT = 'ten_percent'
+FIVE_PERCENT = 'five_percent'
+STAGNANT = 'stagnant'
+
+# In the order they are reported
+ALERT_CATEGORIES = [TOLERANCE_BREACH, TEN_PERCENT, FIVE_PERCENT, STAGNANT]
+
+ALERT_SEVERITIES = {
+    TOLERANCE_BREACH: 'critical',
+    TEN_PERCENT: 'high',
+    FIVE_PERCENT: 'medium',
+    STAGNANT: 'low',
+}
+
+
+def empty_alerts() -> Dict[str, List]:
+    """Alert lists keyed by category, each holding [symbol, value] pairs"""
+    return {category: [] for category in ALERT_CATEGORIES}
+
+
+def drawdown_pct(high, close):
+    """Percentage drop of close from high; NaN where there is no usable high"""
+    high = np.asarray(high, dtype=float)
+    close = np.asarray(close, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        diff = (high - close) / high * 100
+    return np.where(high == 0, np.nan, diff)
+
+
+def drawdown_categories(diff: float, tolerance: float, config: TrackerConfig) -> List[str]:
+    """Categories a drawdown of ``diff`` percent falls into
+
+    A tolerance breach is reported alongside the tier; the tiers are
+    exclusive, with the ten percent tier taking precedence.
+    """
+    categories = []
+    if diff > tolerance:
+        categories.append(TOLERANCE_BREACH)
+    if diff >= config.ten_percent_threshold:
+        categories.append(TEN_PERCENT)
+    elif diff >= config.five_percent_threshold:
+        categories.append(FIVE_PERCENT)
+    return categories
+
+
+def is_stagnant(days_since_high: float, config: TrackerConfig) -> bool:
+    return not np.isnan(days_since_high) and days_since_high > config.stagnation_threshold_days
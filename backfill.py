@@ -0,0 +1,198 @@
+"""
+Bulk history backfill for newly tracked symbols
+"""
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from config import TrackerConfig
+from data_provider import PartialFetchError, StockDataProvider
+from price_warehouse import PriceWarehouse
+from storage import CSVStateStore
+from symbol_registry import SymbolRegistry
+
+
+class Backfiller:
+    """Fetch multi-year history for new symbols and seed their highs
+
+    A symbol counts as new while its ``high_date`` is still empty, which is how
+    ``update_meta`` seeds added rows. Pending symbols are fetched in batches,
+    the bars go to the price warehouse, and the computed seeds are recorded in
+    a checkpoint file after every batch so an interrupted backfill resumes
+    where it stopped. Only bars of closed sessions are kept, so a backfill
+    during trading hours neither stores nor seeds from a close still moving.
+    Seeds are written to the state store once all batches have been
+    attempted, for symbols that are still pending then.
+    """
+
+    CHECKPOINT_FILE = "backfill_checkpoint.json"
+
+    def __init__(self, config: TrackerConfig, provider: StockDataProvider,
+                 warehouse: PriceWarehouse, logger: logging.Logger, store=None,
+                 registry: Optional[SymbolRegistry] = None):
+        self.config = config
+        self.provider = provider
+        self.warehouse = warehouse
+        self.logger = logger
+        self.store = store or CSVStateStore(config, logger)
+        self.registry = registry or SymbolRegistry(holidays_file=config.holidays_file)
+        self.checkpoint_file = os.path.join(self.config.history_dir, self.CHECKPOINT_FILE)
+
+    def _load_checkpoint(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.checkpoint_file):
+            return {}
+        try:
+            with open(self.checkpoint_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable backfill checkpoint: {e}")
+            return {}
+
+    def _save_checkpoint(self, seeds: Dict[str, Dict]) -> None:
+        tmp_path = f"{self.checkpoint_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(seeds, f)
+        os.replace(tmp_path, self.checkpoint_file)
+
+    def _purchase_dates(self) -> pd.Series:
+        """Purchase date per symbol from the investments file, if recorded"""
+        if not os.path.exists(self.config.investments_file):
+            return pd.Series(dtype="datetime64[ns]")
+        investments = pd.read_csv(self.config.investments_file, header=0, index_col=0)
+        if 'purchase_date' not in investments.columns:
+            return pd.Series(dtype="datetime64[ns]")
+        return pd.to_datetime(investments['purchase_date'], errors='coerce').dropna()
+
+    def pending_symbols(self, data_df: pd.DataFrame) -> List[str]:
+        """Symbols that have never had a real high recorded"""
+        if data_df.empty:
+            return []
+        return data_df.index[data_df['high_date'].isna()].tolist()
+
+    def _default_start(self) -> pd.Timestamp:
+        return pd.Timestamp(date.today()) - pd.DateOffset(years=self.config.backfill_years)
+
+    def compute_seed(self, closes: pd.Series, since: Optional[pd.Timestamp]) -> Optional[Dict]:
+        """Derive high, high_date and close from a symbol's daily closes
+
+        Uses the same normalization as ``update_prices``: the high is the
+        largest lookback-window minimum close, so a one-day spike does not
+        become the reference for tolerance alerts.
+        """
+        if since is not None:
+            closes = closes[closes.index >= since]
+        closes = closes.dropna()
+        if closes.empty:
+            return None
+
+        window_min = closes.rolling(self.config.lookback_days, min_periods=1).min()
+        high_date = window_min.idxmax()
+        return {
+            'high': float(window_min.max()),
+            'high_date': pd.Timestamp(high_date).date().isoformat(),
+            'close': float(window_min.iloc[-1]),
+            'updated': pd.Timestamp(closes.index[-1]).date().isoformat()
+        }
+
+    def _fetch_batch(self, symbols: List[str], start: pd.Timestamp) -> pd.DataFrame:
+        now = datetime.now()
+        try:
+            closes = self.provider.fetch_closes(symbols, start, now)
+        except PartialFetchError as e:
+            e.close_data = self.registry.final_bars(e.close_data, now)
+            raise
+        return self.registry.final_bars(closes, now)
+
+    def run(self) -> bool:
+        """Backfill every pending symbol, returning False only on fatal errors"""
+        try:
+            if not self.store.exists():
+                self.logger.error(f"Portfolio state not found: {self.store.path}")
+                return False
+
+            data_df = self.store.load()
+            seeds = self._load_checkpoint()
+            pending = [symbol for symbol in self.pending_symbols(data_df) if symbol not in seeds]
+
+            if seeds:
+                self.logger.info(f"Resuming backfill with {len(seeds)} symbols already checkpointed")
+
+            if pending:
+                self._backfill(pending, seeds)
+
+            return self._apply_seeds(seeds)
+
+        except Exception as e:
+            self.logger.error(f"Error in backfill: {e}")
+            return False
+
+    def _backfill(self, pending: List[str], seeds: Dict[str, Dict]) -> None:
+        purchase_dates = self._purchase_dates()
+        default_start = self._default_start()
+        starts = {symbol: max(purchase_dates.get(symbol, default_start), default_start) for symbol in pending}
+
+        # Batch symbols with similar start dates together so no batch pulls years it does not need
+        ordered = sorted(pending, key=lambda symbol: starts[symbol])
+        batch_size = self.config.backfill_batch_size
+        batches = [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+        self.logger.info(f"Backfilling {len(pending)} symbols in {len(batches)} batches")
+
+        # Batches run one after another: Yahoo serializes downloads, and its own threads fetch within a batch
+        for batch in batches:
+            try:
+                closes = self._fetch_batch(batch, min(starts[symbol] for symbol in batch))
+            except PartialFetchError as e:
+                # Symbols left out stay pending and are retried by the next backfill
+                self.logger.warning(f"Backfill batch starting with {batch[0]}: {e}")
+                closes = e.close_data
+            except Exception as e:
+                self.logger.error(f"Backfill batch starting with {batch[0]} failed: {e}")
+                continue
+
+            closes = closes.dropna(how='all')
+            if closes.empty:
+                self.logger.warning(f"No history returned for batch starting with {batch[0]}")
+                continue
+
+            self.warehouse.append(closes)
+
+            for symbol in batch:
+                if symbol not in closes:
+                    self.logger.warning(f"No history found for {symbol}")
+                    continue
+                seed = self.compute_seed(closes[symbol], purchase_dates.get(symbol))
+                if seed is not None:
+                    seeds[symbol] = seed
+
+            self._save_checkpoint(seeds)
+            self.logger.info(f"Backfill progress: {len(seeds)} symbols seeded")
+
+    def _apply_seeds(self, seeds: Dict[str, Dict]) -> bool:
+        # The backfill may have run for a long time; re-read the state under the lock
+        with self.store.lock():
+            data_df = self.store.load()
+            # Symbols seeded since the checkpoint was written, e.g. by a regular update, keep their state
+            still_pending = set(self.pending_symbols(data_df))
+            applicable = {symbol: seed for symbol, seed in seeds.items() if symbol in still_pending}
+            if not applicable:
+                self.logger.info("No symbols to backfill")
+            else:
+                seed_df = pd.DataFrame.from_dict(applicable, orient='index')
+                for column in ['high_date', 'updated']:
+                    seed_df[column] = pd.to_datetime(seed_df[column]).astype('datetime64[s]')
+                for column in ['high', 'high_date', 'close', 'updated']:
+                    data_df.loc[seed_df.index, column] = seed_df[column]
+
+                data_df.sort_index(inplace=True)
+                self.store.save(data_df)
+                self.logger.info(f"Seeded highs for {len(applicable)} symbols from history")
+
+        # Everything is in the state store now; the next backfill starts fresh
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        return True
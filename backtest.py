@@ -0,0 +1,219 @@
+"""
+Backtest alert thresholds against the stored price history
+
+The tracker's state is replayed day by day from the price warehouse: each
+day's close is the lowest close of the lookback window, the high is the
+largest such close seen so far, and stagnation counts calendar days since the
+high was set. None of that depends on the alert thresholds, so it is computed
+once for every symbol as (dates x symbols) arrays and written to scratch
+files. A process pool then memory-maps those arrays and evaluates parameter
+sets in parallel.
+
+An alert fires on the day its condition starts to hold for a symbol (as in
+stream mode), and its forward return is the change in the symbol's close
+over the following ``horizon`` rows of history.
+
+    python backtest.py --what-if tolerance=5:30:1 --what-if stagnation_days=30,45,60
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from alerts import ALERT_CATEGORIES, FIVE_PERCENT, STAGNANT, TEN_PERCENT, TOLERANCE_BREACH
+from config import Config, TrackerConfig
+from price_warehouse import PriceWarehouse
+from storage import create_state_store
+from what_if import format_counts, parameter_sets, parse_what_if
+
+ARRAYS = ['drawdown', 'stagnation', 'forward', 'tolerance', 'evaluate']
+
+# Replayed arrays, memory-mapped once per worker process
+_replay: Dict[str, np.ndarray] = {}
+
+
+def replay_state(closes: pd.DataFrame, lookback_days: int) -> Dict[str, np.ndarray]:
+    """Rebuild the daily drawdown and stagnation the tracker would have recorded
+
+    ``closes`` is a dates x symbols frame. Windows are counted in rows of
+    history, so for a symbol whose exchange was closed on some of those days
+    the window holds fewer sessions. Days before a symbol's first close are
+    NaN in both arrays.
+    """
+    window_min = closes.rolling(lookback_days, min_periods=1).min()
+    # A day without prices leaves the recorded close and high unchanged
+    close = window_min.ffill().to_numpy(dtype=np.float64)
+    high = np.fmax.accumulate(close, axis=0)
+
+    previous_high = np.vstack([np.full((1, close.shape[1]), np.nan), high[:-1]])
+    new_high = (close > previous_high) | (np.isnan(previous_high) & ~np.isnan(close))
+
+    days = closes.index.to_numpy(dtype='datetime64[D]').astype(np.int64).astype(np.float64)
+    high_day = pd.DataFrame(np.where(new_high, days[:, None], np.nan)).ffill().to_numpy()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.where(high > 0, (high - close) / high * 100, np.nan)
+    return {
+        'drawdown': drawdown.astype(np.float32),
+        'stagnation': (days[:, None] - high_day).astype(np.float32),
+    }
+
+
+def forward_returns(closes: pd.DataFrame, horizon: int) -> np.ndarray:
+    """Percentage change of each close over the next ``horizon`` rows, NaN past the end"""
+    prices = closes.ffill().to_numpy(dtype=np.float64)
+    forward = np.full(prices.shape, np.nan)
+    if horizon < len(prices):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            forward[:-horizon] = (prices[horizon:] / prices[:-horizon] - 1) * 100
+    return forward.astype(np.float32)
+
+
+def _onsets(condition: np.ndarray) -> np.ndarray:
+    """Days a condition starts to hold"""
+    onsets = condition.copy()
+    onsets[1:] &= ~condition[:-1]
+    return onsets
+
+
+def evaluate(params: Dict[str, float], arrays: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, float]:
+    """Alerts fired and mean forward return per category for one parameter set
+
+    The conditions match ``StockTracker.calculate_variance``; ``arrays``
+    defaults to the replay loaded by the worker process.
+    """
+    arrays = arrays if arrays is not None else _replay
+    drawdown = arrays['drawdown']
+    valid = ~np.isnan(drawdown)
+    tolerance = params['tolerance']
+    tolerance = arrays['tolerance'][None, :] if np.isnan(tolerance) else tolerance
+
+    with np.errstate(invalid='ignore'):
+        ten = drawdown >= params['ten_percent']
+        conditions = {
+            TOLERANCE_BREACH: drawdown > tolerance,
+            TEN_PERCENT: ten,
+            FIVE_PERCENT: ~ten & (drawdown >= params['five_percent']),
+            STAGNANT: valid & (arrays['stagnation'] > params['stagnation_days']),
+        }
+
+    result = dict(params)
+    evaluate_rows = arrays['evaluate']
+    for category in ALERT_CATEGORIES:
+        onsets = _onsets(conditions[category])
+        onsets[~evaluate_rows] = False
+        returns = arrays['forward'][onsets]
+        returns = returns[~np.isnan(returns)]
+        result[category] = int(onsets.sum())
+        result[f"{category}_return"] = float(returns.mean()) if len(returns) else np.nan
+    return result
+
+
+def _load_replay(directory: str) -> None:
+    for name in ARRAYS:
+        _replay[name] = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+
+
+class Backtester:
+    """Replay stored history once and sweep alert parameter sets over it"""
+
+    def __init__(self, config: TrackerConfig, warehouse: PriceWarehouse, logger: logging.Logger,
+                 tolerances: Optional[pd.Series] = None):
+        self.config = config
+        self.warehouse = warehouse
+        self.logger = logger
+        # State frames carry a categorical index; match it against plain symbol strings
+        self.tolerances = pd.Series(dtype=float) if tolerances is None else \
+            pd.Series(tolerances.to_numpy(dtype=float), index=tolerances.index.astype(str))
+
+    def prepare(self, start=None, end=None, symbols: Optional[List[str]] = None,
+                horizon: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Replay the whole stored history; only alerts in [start, end] are counted"""
+        horizon = horizon or self.config.backtest_horizon_days
+        closes = self.warehouse.query(end=end, symbols=symbols)
+        if closes.empty:
+            raise ValueError("no price history stored in the warehouse")
+
+        arrays = replay_state(closes, self.config.lookback_days)
+        arrays['forward'] = forward_returns(closes, horizon)
+        tolerance = self.tolerances.reindex(closes.columns).fillna(self.config.default_tolerance)
+        arrays['tolerance'] = tolerance.to_numpy(dtype=np.float32)
+        arrays['evaluate'] = np.asarray(closes.index >= pd.Timestamp(start)) if start is not None \
+            else np.ones(len(closes), dtype=bool)
+
+        self.logger.info(f"Replayed {len(closes)} days of history for {len(closes.columns)} symbols")
+        return arrays
+
+    def sweep(self, arrays: Dict[str, np.ndarray], sets: pd.DataFrame, workers: Optional[int] = None) -> pd.DataFrame:
+        """Evaluate every parameter set, in parallel when there is more than one worker"""
+        workers = workers or self.config.backtest_workers or os.cpu_count() or 1
+        records = sets.to_dict('records')
+        start = time.perf_counter()
+
+        if workers == 1 or len(records) == 1:
+            rows = [evaluate(params, arrays) for params in records]
+        else:
+            with tempfile.TemporaryDirectory(prefix="backtest_") as directory:
+                for name in ARRAYS:
+                    np.save(os.path.join(directory, f"{name}.npy"), arrays[name])
+                with ProcessPoolExecutor(max_workers=workers, initializer=_load_replay,
+                                         initargs=(directory,)) as executor:
+                    chunksize = max(1, len(records) // (workers * 4))
+                    rows = list(executor.map(evaluate, records, chunksize=chunksize))
+
+        self.logger.info(f"Evaluated {len(records)} parameter sets on {workers} workers "
+                         f"in {time.perf_counter() - start:.1f}s")
+        return pd.DataFrame(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Sweep alert thresholds over the stored price history"""
+    parser = argparse.ArgumentParser(description="Backtest alert thresholds on stored price history")
+    parser.add_argument('--what-if', action='append', default=[], metavar='PARAM=VALUES',
+                        help="candidate values, e.g. tolerance=5:30:1 (repeat to sweep every combination)")
+    parser.add_argument('--start', help="first day to count alerts on (history before it still builds highs)")
+    parser.add_argument('--end', help="last day of history to replay")
+    parser.add_argument('--horizon', type=int, help="rows of history for forward returns")
+    parser.add_argument('--workers', type=int, help="worker processes (default: BACKTEST_WORKERS or CPU count)")
+    parser.add_argument('--output', help="also write the results to this CSV file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger("backtest")
+
+    try:
+        grid = parse_what_if(args.what_if)
+    except ValueError as e:
+        print(f"Invalid --what-if: {e}")
+        return 1
+
+    config = Config().tracker
+    store = create_state_store(config, logger)
+    try:
+        tolerances = store.load()['tolerance'] if store.exists() else None
+    finally:
+        store.close()
+    backtester = Backtester(config, PriceWarehouse(config.history_dir, logger), logger, tolerances)
+
+    try:
+        arrays = backtester.prepare(args.start, args.end, horizon=args.horizon)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+
+    results = backtester.sweep(arrays, parameter_sets(grid, config), args.workers)
+    if args.output:
+        results.to_csv(args.output, index=False)
+    print(format_counts(results))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Rendering cost of personalized alert digests, string building vs. templates
+
+Generates one digest per recipient from a shared pool of alerts and renders
+each one with the message building ``_send_alerts`` and
+``EmailService._format_html_message`` used to do, and with
+``alert_templates.AlertRenderer``.
+
+    python benchmarks/alert_rendering.py --digests 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_templates import AlertRenderer  # noqa: E402
+from alerts import ALERT_CATEGORIES, STAGNANT  # noqa: E402
+from config import TrackerConfig  # noqa: E402
+
+
+def synthetic_digests(count: int, per_digest: int, pool: int, seed: int = 0) -> List[Dict[str, List]]:
+    """Alert lists for ``count`` recipients, each holding a random slice of the day's ``pool`` alerts"""
+    rng = random.Random(seed)
+    day_alerts = []
+    for position in range(pool):
+        category = rng.choice(ALERT_CATEGORIES)
+        value = rng.randrange(46, 400) if category == STAGNANT else round(rng.uniform(5, 60), 2)
+        day_alerts.append((category, f"S{position:06d}", value))
+
+    digests = []
+    for _ in range(count):
+        alerts = {category: [] for category in ALERT_CATEGORIES}
+        for category, symbol, value in sorted(rng.sample(day_alerts, min(per_digest, pool))):
+            alerts[category].append([symbol, value])
+        digests.append(alerts)
+    return digests
+
+
+def legacy_render(alerts: Dict[str, List], config: TrackerConfig, recipient: str):
+    """Subject, text and HTML built the way the tracker did before templates"""
+    subject_parts = []
+    message_parts = [f"Hi {recipient},", ""]
+    if alerts['tolerance_breach']:
+        subject_parts.append("Tolerance Breach")
+        message_parts.append("🚨 CONSIDER SELLING - Tolerance Breached:")
+        for symbol, diff in alerts['tolerance_breach']:
+            message_parts.append(f"  {symbol}: {diff}% drop from high")
+        message_parts.append("")
+    if alerts['ten_percent']:
+        if not subject_parts:
+            subject_parts.append(f"{config.ten_percent_threshold:g}% Threshold Breached")
+        message_parts.append(f"⚠️  {config.ten_percent_threshold:g}% Threshold Breached:")
+        for symbol, diff in alerts['ten_percent']:
+            message_parts.append(f"  {symbol}: {diff}% drop from high")
+        message_parts.append("")
+    if alerts['five_percent']:
+        if not subject_parts:
+            subject_parts.append(f"{config.five_percent_threshold:g}% Threshold Breached")
+        message_parts.append(f"📉 {config.five_percent_threshold:g}% Threshold Breached:")
+        for symbol, diff in alerts['five_percent']:
+            message_parts.append(f"  {symbol}: {diff}% drop from high")
+        message_parts.append("")
+    if alerts['stagnant']:
+        if not subject_parts:
+            subject_parts.append("Stagnant Stocks")
+        message_parts.append("😴 Stagnant Stocks (Time to Review?):")
+        for symbol, days in alerts['stagnant']:
+            message_parts.append(f"  {symbol}: {days} days since peak")
+        message_parts.append("")
+
+    subject = f"Stock Alert: {', '.join(subject_parts)} - {datetime.now().strftime('%Y-%m-%d')}"
+    message = "\n".join(message_parts)
+    html_message = message.replace('\n', '<br>')
+    html_body = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <h2 style="color: #d32f2f;">Stock Portfolio Alert</h2>
+            <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px;">
+                <pre style="white-space: pre-wrap; font-family: monospace;">{html_message}</pre>
+            </div>
+            <hr style="margin: 20px 0;">
+            <p style="font-size: 12px; color: #666;">
+                This is an automated message from your Stock Tracker system.
+            </p>
+        </body>
+        </html>
+        """
+    return subject, message, html_body
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--digests', type=int, default=10_000, help="personalized digests to render")
+    parser.add_argument('--alerts', type=int, default=25, help="alerts per digest")
+    parser.add_argument('--pool', type=int, default=2_000, help="distinct alerts raised that day")
+    parser.add_argument('--repeat', type=int, default=3, help="best of this many runs")
+    args = parser.parse_args(argv)
+
+    config = TrackerConfig()
+    digests = synthetic_digests(args.digests, args.alerts, args.pool)
+    recipients = [f"Investor {i}" for i in range(args.digests)]
+    day = datetime.now()
+
+    def legacy():
+        for alerts, recipient in zip(digests, recipients):
+            legacy_render(alerts, config, recipient)
+
+    def templated():
+        renderer = AlertRenderer(config)
+        for alerts, recipient in zip(digests, recipients):
+            renderer.render(alerts, day, recipient)
+
+    print(f"{args.digests} digests x {args.alerts} alerts, best of {args.repeat}")
+    for name, render in (('legacy', legacy), ('templated', templated)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            render()
+            best = min(best, time.perf_counter() - start)
+        print(f"  {name:<10} {best:8.3f}s  {best / args.digests * 1e6:8.1f}us per digest")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Local stand-in for the Elastic Email v2 API
+
+Implements /email/send (plain and merge sends), /email/status,
+/email/getstatus and /log/events in memory, with configurable latency,
+error rate, throttling and bounce rate, so the notification path can be
+load tested without credentials or real mail:
+
+    python benchmarks/mock_elastic.py --port 8025 --latency 0.05 --error-rate 0.01 --rate 100
+    ELASTIC_EMAIL_API_URI=http://127.0.0.1:8025/v2 python stock_tracker_improved.py
+
+Messages are accepted as ReadyToSend and become Sent (or, at
+``bounce_rate``, Error) ``delivery_delay`` seconds later.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit import TokenBucket  # noqa: E402
+
+API_PREFIX = "/v2"
+UNKNOWN_STATUS = "Email has expired and the status is unknown."
+
+
+def _form(content_type: str, body: bytes) -> Tuple[Dict[str, str], Dict[str, bytes]]:
+    """Fields and uploaded files of a urlencoded or multipart request body"""
+    if not content_type.startswith("multipart/form-data"):
+        return dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True)), {}
+
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    fields, files = {}, {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True) or b""
+        if part.get_filename():
+            files[name] = payload
+        else:
+            fields[name] = payload.decode("utf-8")
+    return fields, files
+
+
+class MockElasticEmail:
+    """In-memory message store and the behaviour knobs of the mock API"""
+
+    def __init__(self, api_key: str = "mock-key", latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate: float = 0.0, burst: float = 10.0,
+                 delivery_delay: float = 1.0, bounce_rate: float = 0.0, seed: Optional[int] = None):
+        self.api_key = api_key
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.delivery_delay = delivery_delay
+        self.bounce_rate = bounce_rate
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.random = random.Random(seed)
+        self.messages: Dict[str, Dict] = {}
+        self.transactions: Dict[str, List[str]] = {}
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _status(self, message: Dict, now: float) -> str:
+        if now - message["sent_at"] < self.delivery_delay:
+            return "ReadyToSend"
+        return "Error" if message["bounced"] else "Sent"
+
+    def send(self, fields: Dict[str, str], files: Dict[str, bytes]) -> Dict:
+        if files:
+            merge = next(iter(files.values())).decode("utf-8")
+            recipients = [row.get("ToEmail", "") for row in csv.DictReader(io.StringIO(merge))]
+        else:
+            recipients = [email for email in fields.get("to", "").split(",") if email]
+        if not recipients:
+            raise ValueError("No recipients")
+
+        now = time.time()
+        transaction_id = str(uuid.uuid4())
+        message_ids = []
+        with self._lock:
+            for recipient in recipients:
+                message_id = uuid.uuid4().hex
+                self.messages[message_id] = {
+                    "to": recipient, "subject": fields.get("subject", ""), "channel": fields.get("channel", ""),
+                    "sent_at": now, "bounced": self.random.random() < self.bounce_rate,
+                }
+                message_ids.append(message_id)
+            self.transactions[transaction_id] = message_ids
+        return {"transactionid": transaction_id, "messageid": message_ids[0] if len(message_ids) == 1 else None}
+
+    def status(self, fields: Dict[str, str]) -> Dict:
+        message_id = fields.get("messageID", "")
+        with self._lock:
+            message = self.messages.get(message_id)
+        if message is None:
+            raise ValueError(UNKNOWN_STATUS)
+        status = self._status(message, time.time())
+        return {
+            "MessageID": message_id, "To": message["to"], "StatusName": status,
+            "Date": datetime.fromtimestamp(message["sent_at"]).isoformat(timespec="seconds"),
+            "ErrorMessage": "550 Mailbox unavailable" if status == "Error" else None,
+        }
+
+    def job_status(self, fields: Dict[str, str]) -> Dict:
+        transaction_id = fields.get("transactionID", "")
+        now = time.time()
+        with self._lock:
+            message_ids = self.transactions.get(transaction_id)
+            if message_ids is None:
+                raise ValueError("Transaction not found")
+            messages = [self.messages[message_id] for message_id in message_ids]
+        statuses = [self._status(message, now) for message in messages]
+        return {
+            "ID": transaction_id, "RecipientsCount": len(messages),
+            "DeliveredCount": statuses.count("Sent"),
+            "FailedCount": statuses.count("Error"),
+            "PendingCount": statuses.count("ReadyToSend"),
+            "Failed": [{"Address": message["to"], "Error": "550 Mailbox unavailable"}
+                       for message, status in zip(messages, statuses) if status == "Error"],
+        }
+
+    def events(self, fields: Dict[str, str]) -> Dict:
+        start = datetime.fromisoformat(fields["from"]).timestamp() if fields.get("from") else 0.0
+        end = datetime.fromisoformat(fields["to"]).timestamp() if fields.get("to") else float("inf")
+        limit = int(fields.get("limit") or 0)
+        offset = int(fields.get("offset") or 0)
+        now = time.time()
+        with self._lock:
+            window = sorted(((message_id, message) for message_id, message in self.messages.items()
+                             if start <= message["sent_at"] <= end), key=lambda item: item[1]["sent_at"])
+        window = window[offset:offset + limit] if limit else window[offset:]
+        return {"Recipients": [{
+            "MsgID": message_id, "To": message["to"], "Subject": message["subject"],
+            "EventType": self._status(message, now), "Channel": message["channel"],
+            "EventDate": datetime.fromtimestamp(message["sent_at"]).isoformat(timespec="seconds"),
+        } for message_id, message in window]}
+
+    def handle(self, path: str, fields: Dict[str, str], files: Dict[str, bytes]) -> Tuple[int, Dict]:
+        """HTTP status and JSON payload for one API call"""
+        with self._lock:
+            self.requests += 1
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.bucket is not None and not self.bucket.try_acquire():
+            with self._lock:
+                self.throttled += 1
+            return 429, {"success": False, "error": "Too many requests"}
+        if self.random.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return 500, {"success": False, "error": "Internal server error"}
+        if fields.get("apikey") != self.api_key:
+            return 200, {"success": False, "error": "Incorrect apikey"}
+
+        routes = {"/email/send": self.send, "/email/status": self.status,
+                  "/email/getstatus": self.job_status, "/log/events": self.events}
+        route = routes.get(path[len(API_PREFIX):] if path.startswith(API_PREFIX) else path)
+        if route is None:
+            return 404, {"success": False, "error": f"Unknown endpoint {path}"}
+        try:
+            data = route(fields, files) if route == self.send else route(fields)
+        except ValueError as e:
+            return 200, {"success": False, "error": str(e)}
+        return 200, {"success": True, "data": data}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "throttled": self.throttled, "errors": self.errors,
+                    "messages": len(self.messages)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, fields: Dict[str, str], files: Dict[str, bytes]) -> None:
+        status, payload = self.server.api.handle(urlsplit(self.path).path.lower(), fields, files)
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(dict(parse_qsl(urlsplit(self.path).query, keep_blank_values=True)), {})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        fields, files = _form(self.headers.get("Content-Type", ""), self.rfile.read(length))
+        fields.update(parse_qsl(urlsplit(self.path).query, keep_blank_values=True))
+        self._respond(fields, files)
+
+    do_PUT = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer:
+    """Serve a MockElasticEmail on a local port from a background thread"""
+
+    def __init__(self, api: MockElasticEmail, host: str = "127.0.0.1", port: int = 0):
+        self.api = api
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.api = api
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_uri(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-elastic", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Behaviour options shared with the load test driver"""
+    parser.add_argument("--api-key", default="mock-key", help="API key the mock accepts (default: mock-key)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- seconds around --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="requests per second before answering 429 (default: unlimited)")
+    parser.add_argument("--burst", type=float, default=10.0, help="requests allowed in a burst over --rate")
+    parser.add_argument("--delivery-delay", type=float, default=1.0,
+                        help="seconds before an accepted message is reported as delivered")
+    parser.add_argument("--bounce-rate", type=float, default=0.0, help="fraction of messages that bounce")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latency, errors and bounces")
+
+
+def from_args(args: argparse.Namespace) -> MockElasticEmail:
+    return MockElasticEmail(args.api_key, args.latency, args.jitter, args.error_rate, args.rate, args.burst,
+                            args.delivery_delay, args.bounce_rate, args.seed)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockServer(from_args(args), args.host, args.port)
+    print(f"Mock Elastic Email API on {server.api_uri} (api key {args.api_key!r})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.api.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
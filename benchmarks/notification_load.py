@@ -0,0 +1,155 @@
+"""
+Load test of the notification path against the local mock Elastic Email API
+
+Sends ``--messages`` alert emails through ``EmailService`` at ``--per-minute``
+from a pool of worker threads, then confirms their delivery with
+``DeliveryReconciler`` the way the tracker's background task does. Reports
+throughput and p50/p99 latency of sends and of delivery checks.
+
+    python benchmarks/notification_load.py --messages 5000 --per-minute 3000 --latency 0.05 --error-rate 0.01
+    python benchmarks/notification_load.py --uri http://staging:8025/v2 --api-key ... --messages 500
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import TOLERANCE_BREACH  # noqa: E402
+from config import EmailConfig  # noqa: E402
+from delivery import DeliveryReconciler, OutboundLog  # noqa: E402
+from email_service import EmailService  # noqa: E402
+from mock_elastic import MockServer, add_arguments, from_args  # noqa: E402
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/max of latencies in milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 2)
+
+    return {"p50_ms": at(0.50), "p90_ms": at(0.90), "p99_ms": at(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+class TimedReconciler(DeliveryReconciler):
+    """DeliveryReconciler recording the latency of each status check"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies: List[float] = []
+
+    async def _check(self, client, entry):
+        start = time.perf_counter()
+        try:
+            return await super()._check(client, entry)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def run_sends(service: EmailService, messages: int, per_minute: float, workers: int) -> Dict:
+    """Send ``messages`` alerts paced at ``per_minute``; returns counts and latency percentiles"""
+    latencies: List[float] = []
+    failures = 0
+    lock = threading.Lock()
+    interval = 60.0 / per_minute if per_minute > 0 else 0.0
+    begin = time.perf_counter()
+
+    def send(number: int) -> None:
+        nonlocal failures
+        delay = begin + number * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        symbol = f"S{number:06d}"
+        start = time.perf_counter()
+        ok = service.send_notification(f"Stock Alert: {symbol}", f"{symbol}: 20.0% drop from high",
+                                       alerts={TOLERANCE_BREACH: [[symbol, 20.0]]})
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            failures += not ok
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(send, range(messages)))
+    wall = time.perf_counter() - begin
+
+    return {"messages": messages, "failed": failures, "seconds": round(wall, 2),
+            "per_minute": round(messages / wall * 60, 1), **percentiles(latencies)}
+
+
+def run_reconcile(reconciler: TimedReconciler, outbound: OutboundLog, deadline: float) -> Dict:
+    """Reconcile until nothing is pending or ``deadline`` seconds pass"""
+    begin = time.perf_counter()
+    passes = 0
+    counts = outbound.counts()
+    while counts["pending"] and time.perf_counter() - begin < deadline:
+        counts = reconciler.reconcile()
+        passes += 1
+        if counts["pending"]:
+            time.sleep(0.5)
+    wall = time.perf_counter() - begin
+
+    checks = len(reconciler.latencies)
+    return {"passes": passes, "checks": checks, "seconds": round(wall, 2),
+            "checks_per_second": round(checks / wall, 1) if wall else 0.0, **counts,
+            **percentiles(reconciler.latencies)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test EmailService and delivery reconciliation")
+    parser.add_argument("--messages", type=int, default=1000, help="alert emails to send (default: 1000)")
+    parser.add_argument("--per-minute", type=float, default=3000.0,
+                        help="target send rate; 0 sends as fast as the workers allow (default: 3000)")
+    parser.add_argument("--workers", type=int, default=32, help="concurrent senders (default: 32)")
+    parser.add_argument("--batch-size", type=int, default=50, help="concurrent delivery checks (default: 50)")
+    parser.add_argument("--reconcile-timeout", type=float, default=60.0,
+                        help="seconds to wait for every message to settle (default: 60)")
+    parser.add_argument("--uri", help="API to test instead of starting the mock, e.g. http://host:8025/v2")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logger = logging.getLogger("notification_load")
+    # Failed sends and undelivered alerts are expected at non-zero error and bounce rates
+    logger.setLevel(logging.CRITICAL)
+
+    server = None if args.uri else MockServer(from_args(args)).start()
+    api_uri = args.uri or server.api_uri
+
+    with tempfile.TemporaryDirectory() as scratch:
+        outbound = OutboundLog(os.path.join(scratch, "outbound.json"), logger, 0.0, 1.0, 3600.0, 86400.0)
+        config = EmailConfig(args.api_key, "alerts@example.com", "Stock Tracker", ["ops@example.com"],
+                             api_uri=api_uri)
+        service = EmailService(config, logger, outbound)
+        reconciler = TimedReconciler(outbound, config, logger, args.batch_size)
+
+        try:
+            results = {
+                "api_uri": api_uri,
+                "send": run_sends(service, args.messages, args.per_minute, args.workers),
+                "delivery": run_reconcile(reconciler, outbound, args.reconcile_timeout),
+            }
+            if server is not None:
+                results["mock"] = server.api.stats()
+        finally:
+            if server is not None:
+                server.stop()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
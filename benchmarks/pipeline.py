@@ -0,0 +1,285 @@
+"""
+End-to-end benchmark of the StockTracker pipeline on synthetic portfolios
+
+Each portfolio size runs in its own subprocess (so peak RSS is per size) in a
+scratch directory: investment files and a price history are generated, then
+get_investments, update_meta, update_prices (through the offline provider),
+calculate_variance and alert rendering are timed. Results go to a JSON file
+and can be compared against a stored baseline.
+
+    python benchmarks/pipeline.py --sizes 100,10000 --save-baseline benchmarks/baseline.json
+    python benchmarks/pipeline.py --sizes 100,10000 --baseline benchmarks/baseline.json
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+
+# Stages faster than this are too noisy to call a regression
+NOISE_FLOOR_SECONDS = 0.05
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+
+
+def synthetic_symbols(size: int) -> List[str]:
+    """Mostly US tickers with every tenth symbol listed on the NSE"""
+    return [f"S{i:07d}.NS" if i % 10 == 0 else f"S{i:07d}" for i in range(size)]
+
+
+def synthetic_history(symbols: List[str], days: int, seed: int = 0) -> pd.DataFrame:
+    """Random-walk daily closes for the business days up to yesterday"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=1), periods=days)
+    start = rng.uniform(10, 1000, size=len(symbols)).astype(np.float32)
+    steps = rng.normal(0, 0.02, size=(days, len(symbols))).astype(np.float32)
+    closes = start * np.exp(np.cumsum(steps, axis=0))
+    return pd.DataFrame(closes, index=dates, columns=symbols)
+
+
+def prime_state(tracker, history: pd.DataFrame, seed: int = 0) -> None:
+    """Give every symbol a recorded high above its recent closes, as after months of tracking
+
+    Freshly added symbols start at a high of 1, which would make every close a
+    new high and leave calculate_variance with nothing to report.
+    """
+    rng = np.random.default_rng(seed)
+    with tracker.store.lock():
+        state = tracker.store.load()
+        peaks = history.max().reindex(state.index.astype(str)).to_numpy(dtype=float)
+        state['high'] = peaks * rng.uniform(1.0, 1.3, size=len(state))
+        state['high_date'] = pd.Timestamp.today().normalize() - pd.to_timedelta(rng.integers(1, 120, len(state)), unit='D')
+        tracker.store.save(state)
+
+
+def write_investments(symbols: List[str], input_dir: str, files: int = 4, seed: int = 0) -> None:
+    """Split the portfolio over a few broker exports, with repeated buys"""
+    rng = np.random.default_rng(seed)
+    trade_dates = pd.to_datetime('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, len(symbols)), unit='D')
+    trades = pd.DataFrame({
+        'Symbol': symbols,
+        'Trade Date': trade_dates.strftime('%Y%m%d'),
+        'Quantity': rng.integers(1, 100, len(symbols)),
+    })
+    trades = pd.concat([trades, trades.sample(frac=0.1, random_state=seed)])
+    bounds = np.linspace(0, len(trades), files + 1).astype(int)
+    for position in range(files):
+        chunk = trades.iloc[bounds[position]:bounds[position + 1]]
+        chunk.to_csv(os.path.join(input_dir, f"broker_{position}.csv"), index=False)
+
+
+class StageRecorder:
+    """Time, peak RSS and Python allocations per pipeline stage"""
+
+    def __init__(self, trace_allocations: bool):
+        self.trace_allocations = trace_allocations
+        self.stages: Dict[str, Dict] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            allocated_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = {'ok': False}
+        try:
+            yield result
+        finally:
+            result['seconds'] = round(time.perf_counter() - start, 4)
+            result['peak_rss_mb'] = round(_max_rss_mb(), 1)
+            if self.trace_allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                result['alloc_peak_mb'] = round((peak - allocated_before) / 2**20, 2)
+                result['alloc_retained_mb'] = round((current - allocated_before) / 2**20, 2)
+            self.stages[name] = result
+
+
+def run_size(size: int, days: int, trace_allocations: bool) -> Dict:
+    """Run the pipeline once for one portfolio size in a scratch directory"""
+    workdir = tempfile.mkdtemp(prefix=f"stock_tracker_bench_{size}_")
+    try:
+        os.chdir(workdir)
+        os.environ.update({
+            'DATA_DIR': 'data',
+            'INPUT_DIR': 'data/input',
+            'INVESTMENTS_FILE': 'data/investments.csv',
+            'DATA_FILE': 'data/state.csv',
+            'HISTORY_DIR': 'data/history',
+            'SNAPSHOT_DIR': 'data/snapshots',
+        })
+
+        from config import Config
+        from data_provider import OfflineProvider
+        from stock_tracker_improved import StockTracker
+
+        tracker = StockTracker(Config())
+        tracker.logger.setLevel(logging.WARNING)
+
+        symbols = synthetic_symbols(size)
+        write_investments(symbols, tracker.config.tracker.input_dir)
+        history = synthetic_history(symbols, days)
+        tracker.warehouse.append(history)
+
+        # Serve every venue from the warehouse, with no pacing between batches
+        offline = OfflineProvider(tracker.logger, tracker.warehouse)
+        tracker.providers = {name: offline for name in ('yahoo', 'nse')}
+        tracker.registry.routes = {exchange: dataclasses.replace(route, min_interval=0.0)
+                                   for exchange, route in tracker.registry.routes.items()}
+
+        captured = {}
+        tracker._send_alerts, render_alerts = (lambda alerts: captured.update(alerts) or True), tracker._send_alerts
+        tracker.email_service.send_notification = lambda subject, message, html=None, **kwargs: True
+
+        if trace_allocations:
+            tracemalloc.start()
+        recorder = StageRecorder(trace_allocations)
+
+        with recorder.stage('get_investments') as result:
+            result['ok'] = tracker.get_investments()
+        with recorder.stage('update_meta') as result:
+            tracker.update_meta()
+            result['ok'] = True
+
+        if trace_allocations:
+            tracemalloc.stop()
+        prime_state(tracker, history)
+        del history
+        if trace_allocations:
+            tracemalloc.start()
+
+        with recorder.stage('update_prices') as result:
+            result['ok'] = tracker.update_prices()
+        with recorder.stage('calculate_variance') as result:
+            result['ok'] = tracker.calculate_variance()
+        with recorder.stage('render_alerts') as result:
+            result['ok'] = render_alerts(captured) if any(captured.values()) else True
+            result['alerts'] = sum(len(entries) for entries in captured.values())
+
+        if trace_allocations:
+            tracemalloc.stop()
+
+        return {'symbols': size, 'days': days, 'stages': recorder.stages}
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_in_subprocess(size: int, days: int, trace_allocations: bool) -> Dict:
+    command = [sys.executable, os.path.abspath(__file__), '--worker', str(size), '--days', str(days)]
+    if not trace_allocations:
+        command.append('--no-tracemalloc')
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+    if completed.returncode != 0:
+        return {'symbols': size, 'days': days, 'error': completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout)
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Stages slower than the baseline by more than ``tolerance`` (a fraction)"""
+    regressions = []
+    for size, current in results['results'].items():
+        previous = baseline.get('results', {}).get(size)
+        if not previous or 'stages' not in current or 'stages' not in previous:
+            continue
+        for stage, measured in current['stages'].items():
+            reference = previous['stages'].get(stage)
+            if reference is None:
+                continue
+            seconds, base_seconds = measured['seconds'], reference['seconds']
+            if seconds - base_seconds > NOISE_FLOOR_SECONDS and seconds > base_seconds * (1 + tolerance):
+                regressions.append(f"{stage} at {size} symbols: {base_seconds:.3f}s -> {seconds:.3f}s "
+                                   f"({seconds / base_seconds - 1:+.0%})")
+    return regressions
+
+
+def print_report(results: Dict) -> None:
+    rows = []
+    for size, result in results['results'].items():
+        if 'error' in result:
+            rows.append({'symbols': size, 'stage': f"error: {' '.join(result['error'])}"})
+            continue
+        for stage, measured in result['stages'].items():
+            rows.append({'symbols': size, 'stage': stage, **{key: value for key, value in measured.items() if key != 'ok'}})
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the StockTracker pipeline on synthetic portfolios")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated portfolio sizes")
+    parser.add_argument('--days', type=int, default=30, help="days of synthetic price history")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/pipeline-<timestamp>.json)")
+    parser.add_argument('--baseline', help="compare against this results file")
+    parser.add_argument('--save-baseline', metavar='PATH', help="also write the results here as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before a stage regresses")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="skip allocation tracing (it slows pandas)")
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        print(json.dumps(run_size(args.worker, args.days, not args.no_tracemalloc)))
+        return 0
+
+    results = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'tracemalloc': not args.no_tracemalloc,
+        },
+        'results': {},
+    }
+    for size in (int(size) for size in args.sizes.split(',')):
+        print(f"Running {size:,} symbols...", file=sys.stderr)
+        results['results'][str(size)] = run_in_subprocess(size, args.days, not args.no_tracemalloc)
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"pipeline-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    for path in filter(None, [output, args.save_baseline]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    print_report(results)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Memory footprint of the portfolio state, loosely typed vs. typed
+
+Builds a synthetic portfolio the way the tracker used to hold it (object
+columns of strings and date objects, ints where a price was never fetched)
+and the same portfolio through ``portfolio.to_portfolio``, then reports
+bytes per symbol for each column.
+
+    python benchmarks/portfolio_memory.py --symbols 1000000
+"""
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portfolio import to_portfolio  # noqa: E402
+
+
+def loose_portfolio(n: int, seed: int = 0) -> pd.DataFrame:
+    """State frame as update_meta and update_prices used to build it"""
+    rng = np.random.default_rng(seed)
+    symbols = [f"SYM{i:07d}.NS" if i % 3 == 0 else f"SYM{i:07d}" for i in range(n)]
+    first_day = date(2015, 1, 1)
+    days = rng.integers(0, 3650, size=n)
+    fetched = rng.random(n) < 0.9
+
+    high = rng.uniform(10, 5000, size=n)
+    high_dates = np.array([first_day + timedelta(days=int(d)) for d in days], dtype=object)
+    updated = np.array([date.today()] * n, dtype=object)
+
+    df = pd.DataFrame({
+        'high': np.where(fetched, high, 1).astype(object),
+        'high_date': np.where(fetched, high_dates, ''),
+        'close': np.where(fetched, high * rng.uniform(0.7, 1.0, size=n), 1).astype(object),
+        'tolerance': rng.choice([10, 15, 20], size=n).astype(object),
+        'updated': np.where(fetched, updated, ''),
+    }, index=pd.Index(symbols, dtype=object, name='symbol'))
+    return df
+
+
+def bytes_per_symbol(df: pd.DataFrame) -> pd.Series:
+    usage = df.memory_usage(deep=True, index=True)
+    return usage / len(df)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=1_000_000, help="portfolio size (default: 1M)")
+    args = parser.parse_args(argv)
+
+    loose = loose_portfolio(args.symbols)
+    typed = to_portfolio(loose)
+
+    report = pd.DataFrame({
+        'loose': bytes_per_symbol(loose),
+        'typed': bytes_per_symbol(typed),
+    })
+    report.loc['total'] = report.sum()
+    report['ratio'] = report['loose'] / report['typed']
+
+    print(f"Bytes per symbol at {args.symbols:,} symbols")
+    print(report.round(2).to_string())
+    print(f"\nTotal: {report.loc['total', 'loose'] * args.symbols / 2**20:,.1f} MiB -> "
+          f"{report.loc['total', 'typed'] * args.symbols / 2**20:,.1f} MiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,7 +2,7 @@
 Configuration management for Stock Tracker
 """
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional
 
 
@@ -14,6 +14,20 @@ class EmailConfig:
     sender_name: str
     recipient_emails: List[str]
     api_uri: str = "https://api.elasticemail.com/v2"
+    merge_template: str = ""
+    merge_batch_size: int = 1000
+    merge_max_bytes: int = 8_000_000
+    fallback_emails: List[str] = field(default_factory=list)
+    api_failures: int = 3
+    api_reset_seconds: float = 120.0
+    smtp_host: str = ""
+    smtp_port: int = 587
+    smtp_username: str = ""
+    smtp_password: str = ""
+    smtp_starttls: bool = True
+    smtp_timeout: float = 30.0
+    smtp_idle_seconds: float = 60.0
+    smtp_max_messages: int = 100
 
 
 @dataclass
@@ -23,9 +37,60 @@ class TrackerConfig:
     input_dir: str = "data/input"
     investments_file: str = "data/yfin_investments.csv"
     data_file: str = "data/yfin_data.csv"
+    subscribers_file: str = "data/subscribers.csv"
+    storage_backend: str = "csv"
+    database_file: str = "data/stock_tracker.db"
+    delta_compact_ratio: float = 2.0
+    history_dir: str = "data/history"
+    holidays_file: str = "data/holidays.csv"
+    snapshot_dir: str = "data/snapshots"
+    snapshot_count: int = 5
+    lock_timeout: float = 300.0
     lookback_days: int = 5
     stagnation_threshold_days: int = 45
     default_tolerance: float = 15.0
+    five_percent_threshold: float = 5.0
+    ten_percent_threshold: float = 10.0
+    backfill_years: int = 10
+    backfill_batch_size: int = 100
+    nse_workers: int = 8
+    nse_timeout: float = 20.0
+    backtest_workers: int = 0
+    fetch_rate: float = 2.0
+    fetch_min_rate: float = 0.1
+    fetch_max_rate: float = 10.0
+    fetch_rate_step: float = 0.5
+    fetch_burst: float = 4.0
+    fetch_chunk_size: int = 100
+    fetch_min_chunk_size: int = 5
+    fetch_max_chunk_size: int = 500
+    fetch_chunk_step: int = 20
+    fetch_max_threads: int = 8
+    fetch_target_latency: float = 15.0
+    breaker_failures: int = 5
+    breaker_reset_seconds: float = 120.0
+    price_cache_dir: str = "data/cache/prices"
+    price_cache_max_mb: float = 256.0
+    price_cache_open_ttl: float = 900.0
+    price_cache_closed_ttl: float = 604800.0
+    negative_cache_file: str = "data/negative_symbols.json"
+    negative_probe_hours: float = 24.0
+    negative_max_probe_days: float = 30.0
+    health_summary_days: float = 7.0
+    backtest_horizon_days: int = 20
+    outbound_log_file: str = "data/outbound.json"
+    delivery_check_seconds: float = 60.0
+    delivery_max_check_minutes: float = 60.0
+    delivery_timeout_hours: float = 24.0
+    delivery_retention_days: float = 30.0
+    delivery_batch_size: int = 50
+    notify_routes: str = ""
+    notify_state_file: str = "data/notify_state.json"
+    notify_email_timeout: float = 120.0
+    notify_sms_timeout: float = 10.0
+    notify_webhook_timeout: float = 10.0
+    sms_numbers: List[str] = field(default_factory=list)
+    webhook_url: str = ""
 
 
 class Config:
@@ -36,7 +101,22 @@ class Config:
             api_key=os.getenv("ELASTIC_EMAIL_API_KEY", ""),
             sender_email=os.getenv("SENDER_EMAIL", ""),
             sender_name=os.getenv("SENDER_NAME", "Stock Tracker"),
-            recipient_emails=os.getenv("RECIPIENT_EMAILS", "").split(",")
+            recipient_emails=os.getenv("RECIPIENT_EMAILS", "").split(","),
+            api_uri=os.getenv("ELASTIC_EMAIL_API_URI", "https://api.elasticemail.com/v2"),
+            merge_template=os.getenv("ELASTIC_EMAIL_MERGE_TEMPLATE", ""),
+            merge_batch_size=int(os.getenv("EMAIL_MERGE_BATCH_SIZE", "1000")),
+            merge_max_bytes=int(os.getenv("EMAIL_MERGE_MAX_BYTES", "8000000")),
+            fallback_emails=[email for email in os.getenv("FALLBACK_EMAILS", "").split(",") if email],
+            api_failures=int(os.getenv("EMAIL_API_FAILURES", "3")),
+            api_reset_seconds=float(os.getenv("EMAIL_API_RESET_SECONDS", "120")),
+            smtp_host=os.getenv("SMTP_HOST", ""),
+            smtp_port=int(os.getenv("SMTP_PORT", "587")),
+            smtp_username=os.getenv("SMTP_USERNAME", ""),
+            smtp_password=os.getenv("SMTP_PASSWORD", ""),
+            smtp_starttls=os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes"),
+            smtp_timeout=float(os.getenv("SMTP_TIMEOUT", "30")),
+            smtp_idle_seconds=float(os.getenv("SMTP_IDLE_SECONDS", "60")),
+            smtp_max_messages=int(os.getenv("SMTP_MAX_MESSAGES", "100"))
         )
         
         self.tracker = TrackerConfig(
@@ -44,9 +124,60 @@ class Config:
             input_dir=os.getenv("INPUT_DIR", "data/input"),
             investments_file=os.getenv("INVESTMENTS_FILE", "data/yfin_investments.csv"),
             data_file=os.getenv("DATA_FILE", "data/yfin_data.csv"),
+            subscribers_file=os.getenv("SUBSCRIBERS_FILE", "data/subscribers.csv"),
+            storage_backend=os.getenv("STORAGE_BACKEND", "csv").lower(),
+            database_file=os.getenv("DATABASE_FILE", "data/stock_tracker.db"),
+            delta_compact_ratio=float(os.getenv("DELTA_COMPACT_RATIO", "2.0")),
+            history_dir=os.getenv("HISTORY_DIR", "data/history"),
+            holidays_file=os.getenv("HOLIDAYS_FILE", "data/holidays.csv"),
+            snapshot_dir=os.getenv("SNAPSHOT_DIR", "data/snapshots"),
+            snapshot_count=int(os.getenv("SNAPSHOT_COUNT", "5")),
+            lock_timeout=float(os.getenv("LOCK_TIMEOUT", "300")),
             lookback_days=int(os.getenv("LOOKBACK_DAYS", "5")),
             stagnation_threshold_days=int(os.getenv("STAGNATION_THRESHOLD", "45")),
-            default_tolerance=float(os.getenv("DEFAULT_TOLERANCE", "15.0"))
+            default_tolerance=float(os.getenv("DEFAULT_TOLERANCE", "15.0")),
+            five_percent_threshold=float(os.getenv("FIVE_PERCENT_THRESHOLD", "5.0")),
+            ten_percent_threshold=float(os.getenv("TEN_PERCENT_THRESHOLD", "10.0")),
+            backfill_years=int(os.getenv("BACKFILL_YEARS", "10")),
+            backfill_batch_size=int(os.getenv("BACKFILL_BATCH_SIZE", "100")),
+            nse_workers=int(os.getenv("NSE_WORKERS", "8")),
+            nse_timeout=float(os.getenv("NSE_TIMEOUT", "20.0")),
+            backtest_workers=int(os.getenv("BACKTEST_WORKERS", "0")),
+            fetch_rate=float(os.getenv("FETCH_RATE", "2.0")),
+            fetch_min_rate=float(os.getenv("FETCH_MIN_RATE", "0.1")),
+            fetch_max_rate=float(os.getenv("FETCH_MAX_RATE", "10.0")),
+            fetch_rate_step=float(os.getenv("FETCH_RATE_STEP", "0.5")),
+            fetch_burst=float(os.getenv("FETCH_BURST", "4.0")),
+            fetch_chunk_size=int(os.getenv("FETCH_CHUNK_SIZE", "100")),
+            fetch_min_chunk_size=int(os.getenv("FETCH_MIN_CHUNK_SIZE", "5")),
+            fetch_max_chunk_size=int(os.getenv("FETCH_MAX_CHUNK_SIZE", "500")),
+            fetch_chunk_step=int(os.getenv("FETCH_CHUNK_STEP", "20")),
+            fetch_max_threads=int(os.getenv("FETCH_MAX_THREADS", "8")),
+            fetch_target_latency=float(os.getenv("FETCH_TARGET_LATENCY", "15.0")),
+            breaker_failures=int(os.getenv("BREAKER_FAILURES", "5")),
+            breaker_reset_seconds=float(os.getenv("BREAKER_RESET_SECONDS", "120")),
+            price_cache_dir=os.getenv("PRICE_CACHE_DIR", "data/cache/prices"),
+            price_cache_max_mb=float(os.getenv("PRICE_CACHE_MAX_MB", "256")),
+            price_cache_open_ttl=float(os.getenv("PRICE_CACHE_OPEN_TTL", "900")),
+            price_cache_closed_ttl=float(os.getenv("PRICE_CACHE_CLOSED_TTL", "604800")),
+            negative_cache_file=os.getenv("NEGATIVE_CACHE_FILE", "data/negative_symbols.json"),
+            negative_probe_hours=float(os.getenv("NEGATIVE_PROBE_HOURS", "24")),
+            negative_max_probe_days=float(os.getenv("NEGATIVE_MAX_PROBE_DAYS", "30")),
+            health_summary_days=float(os.getenv("HEALTH_SUMMARY_DAYS", "7")),
+            backtest_horizon_days=int(os.getenv("BACKTEST_HORIZON_DAYS", "20")),
+            outbound_log_file=os.getenv("OUTBOUND_LOG_FILE", "data/outbound.json"),
+            delivery_check_seconds=float(os.getenv("DELIVERY_CHECK_SECONDS", "60")),
+            delivery_max_check_minutes=float(os.getenv("DELIVERY_MAX_CHECK_MINUTES", "60")),
+            delivery_timeout_hours=float(os.getenv("DELIVERY_TIMEOUT_HOURS", "24")),
+            delivery_retention_days=float(os.getenv("DELIVERY_RETENTION_DAYS", "30")),
+            delivery_batch_size=int(os.getenv("DELIVERY_BATCH_SIZE", "50")),
+            notify_routes=os.getenv("NOTIFY_ROUTES", ""),
+            notify_state_file=os.getenv("NOTIFY_STATE_FILE", "data/notify_state.json"),
+            notify_email_timeout=float(os.getenv("NOTIFY_EMAIL_TIMEOUT", "120")),
+            notify_sms_timeout=float(os.getenv("NOTIFY_SMS_TIMEOUT", "10")),
+            notify_webhook_timeout=float(os.getenv("NOTIFY_WEBHOOK_TIMEOUT", "10")),
+            sms_numbers=[number for number in os.getenv("SMS_NUMBERS", "").split(",") if number],
+            webhook_url=os.getenv("ALERT_WEBHOOK_URL", "")
         )
     
     def validate(self) -> List[str]:
@@ -0,0 +1,427 @@
+"""
+Price data providers for Stock Tracker
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+from typing import Dict, List, Optional
+
+import pandas as pd
+import yfinance as yf
+
+from price_warehouse import PriceWarehouse
+from rate_limit import AIMDController, CircuitOpenError, TokenBucket, breaker_for
+from response_cache import ResponseCache
+from symbol_registry import SymbolRegistry
+from trading_calendar import to_days
+
+try:
+    import nsepy
+except ImportError:
+    nsepy = None
+
+# yfinance raises its own error for HTTP 429 in recent versions
+RATE_LIMIT_ERRORS = tuple(filter(None, [getattr(getattr(yf, 'exceptions', None), 'YFRateLimitError', None)]))
+
+
+def is_host_failure(error: Exception) -> bool:
+    """Whether an error says the host is struggling: throttling, server errors, timeouts, dropped connections
+
+    Other errors (bad symbols, parsing) say nothing about the host.
+    """
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # requests' exceptions are OSErrors too
+    return isinstance(error, (OSError, TimeoutError) + RATE_LIMIT_ERRORS)
+
+
+class PartialFetchError(RuntimeError):
+    """Some symbols could not be fetched because requests failed
+
+    Carries the closes that were fetched and the symbols that were not, so
+    callers keep the prices and can tell a failed request from a symbol
+    that has no data.
+    """
+
+    def __init__(self, message: str, close_data: pd.DataFrame, failed: List[str]):
+        super().__init__(message)
+        self.close_data = close_data
+        self.failed = list(failed)
+
+
+class StockDataProvider:
+    """Base class for sources of daily closing prices"""
+
+    name = "base"
+    # Whether fetch_closes accepts a ``threads`` argument for its own parallelism
+    concurrent_downloads = False
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def fetch_closes(self, symbols: List[str], start, end) -> pd.DataFrame:
+        """Return daily closes for symbols as a dates x symbols frame
+
+        An empty frame means the source had no data for the window; transport
+        errors are raised to the caller. Providers that fetch in several
+        requests raise ``PartialFetchError`` when only some of them failed.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release threads or connections held by the provider"""
+
+
+class YahooFinanceProvider(StockDataProvider):
+    """Daily closes from Yahoo Finance via yfinance"""
+
+    name = "yahoo"
+    host = "query1.finance.yahoo.com"
+    concurrent_downloads = True
+
+    # yf.download keeps its per-call results in module globals, so overlapping
+    # calls from several threads clobber each other. Calls are serialized here
+    # and yfinance's own download threads supply the per-batch concurrency.
+    _download_lock = threading.Lock()
+
+    def fetch_closes(self, symbols: List[str], start, end, threads: Optional[int] = None) -> pd.DataFrame:
+        if not symbols:
+            return pd.DataFrame()
+
+        with self._download_lock:
+            ticker_hist = yf.download(' '.join(symbols), start=start, end=end, progress=False,
+                                      threads=threads if threads is not None else True)
+
+        if ticker_hist.empty:
+            return pd.DataFrame()
+
+        # Handle single vs multiple tickers
+        close_data = ticker_hist['Close']
+        if isinstance(close_data, pd.Series):
+            close_data = close_data.to_frame(symbols[0])
+
+        return close_data
+
+
+class NSEProvider(StockDataProvider):
+    """Daily closes from the National Stock Exchange via nsepy
+
+    nsepy fetches one ticker per HTTP request, so tickers are fetched on a
+    thread pool and a batch takes roughly as long as its slowest ticker. A
+    ticker that has not answered within ``timeout`` seconds of its request
+    starting is dropped from the result rather than holding up the batch.
+    Its thread cannot be interrupted and stays busy until nsepy returns; if
+    every worker is stuck that way, tickers still queued are dropped too.
+    Tickers dropped or whose request raised are reported through
+    ``PartialFetchError``.
+    """
+
+    name = "nse"
+
+    def __init__(self, logger: logging.Logger, max_workers: int = 8, timeout: float = 20.0):
+        super().__init__(logger)
+        if nsepy is None:
+            raise RuntimeError("nsepy is not installed")
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nse")
+        # Requests given up on that may still occupy a worker
+        self._abandoned = set()
+
+    @staticmethod
+    def available() -> bool:
+        return nsepy is not None
+
+    @staticmethod
+    def _nse_ticker(symbol: str) -> str:
+        """nsepy expects bare tickers, without the Yahoo '.NS' suffix"""
+        return symbol[:-3] if symbol.upper().endswith(".NS") else symbol
+
+    def _fetch_one(self, symbol: str, start: date, end: date, started: Dict[str, float]) -> pd.Series:
+        started[symbol] = time.monotonic()
+        ticker_hist = nsepy.get_history(symbol=self._nse_ticker(symbol), start=start, end=end)
+        return ticker_hist['Close'] if not ticker_hist.empty else pd.Series(dtype=float)
+
+    def fetch_closes(self, symbols: List[str], start, end) -> pd.DataFrame:
+        if not symbols:
+            return pd.DataFrame()
+
+        start, end = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+        started: Dict[str, float] = {}
+        futures = {self._executor.submit(self._fetch_one, symbol, start, end, started): symbol
+                   for symbol in dict.fromkeys(symbols)}
+
+        closes = {}
+        failed = []
+        pending = set(futures)
+        while pending:
+            # Wake up when the earliest running request reaches its deadline
+            deadlines = [started[futures[future]] + self.timeout for future in pending if futures[future] in started]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else self.timeout
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                symbol = futures[future]
+                try:
+                    series = future.result()
+                except Exception as e:
+                    self.logger.warning(f"NSE history request for {symbol} failed: {e}")
+                    failed.append(symbol)
+                    continue
+                if not series.empty:
+                    closes[symbol] = series
+
+            now = time.monotonic()
+            for future in [future for future in pending if now - started.get(futures[future], now) >= self.timeout]:
+                pending.discard(future)
+                self._abandoned.add(future)
+                failed.append(futures[future])
+                self.logger.warning(f"NSE history request for {futures[future]} timed out after {self.timeout:g}s")
+
+            self._abandoned = {future for future in self._abandoned if not future.done()}
+            if pending and len(self._abandoned) >= self.max_workers:
+                for future in pending:
+                    future.cancel()
+                    failed.append(futures[future])
+                self.logger.warning(f"Every NSE worker is stuck on a timed-out request, "
+                                    f"dropping {len(pending)} queued tickers")
+                break
+
+        close_data = pd.DataFrame(closes)
+        if closes:
+            close_data.index = pd.to_datetime(close_data.index)
+        if failed:
+            raise PartialFetchError(f"{len(failed)} of {len(futures)} NSE tickers not fetched", close_data, failed)
+        return close_data
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class OfflineProvider(StockDataProvider):
+    """Daily closes served from a local price warehouse, without network access
+
+    Mirrors Yahoo's window semantics (``end`` is exclusive) so it can stand in
+    for a live provider in benchmarks and dry runs.
+    """
+
+    name = "offline"
+
+    def __init__(self, logger: logging.Logger, warehouse: PriceWarehouse):
+        super().__init__(logger)
+        self.warehouse = warehouse
+
+    def fetch_closes(self, symbols: List[str], start, end) -> pd.DataFrame:
+        if not symbols:
+            return pd.DataFrame()
+
+        last_day = pd.Timestamp(end).normalize() - pd.Timedelta(days=1)
+        close_data = self.warehouse.query(start, last_day, symbols)
+        if close_data.empty:
+            return pd.DataFrame()
+        return close_data
+
+
+class AdaptiveProvider(StockDataProvider):
+    """Wrap a provider in a rate limiter, a circuit breaker and adaptive chunking
+
+    Requests are split into chunks and paced by a token bucket. Request rate,
+    chunk size and (for providers with their own download threads)
+    concurrency are AIMD limits: each chunk with data raises them a little,
+    and each chunk failing with throttling, a server error or a transport
+    error (see ``is_host_failure``) halves them. Empty chunks, such as
+    holidays or delisted symbols, and other errors leave the limits alone
+    and show the breaker the host is answering. A chunk that raised is
+    split in two and retried until it reaches the minimum chunk size. The
+    host's circuit breaker is shared across wrappers; once it is open no
+    more chunks are requested. Symbols of chunks given up on, or never
+    requested because the breaker opened, are reported through
+    ``PartialFetchError`` along with the closes fetched so far. A chunk that
+    answers slower than ``target_latency`` counts as a success for chunk
+    size but lowers concurrency.
+    """
+
+    def __init__(self, provider: StockDataProvider, logger: logging.Logger, config):
+        super().__init__(logger)
+        self.provider = provider
+        self.name = provider.name
+        self.host = getattr(provider, 'host', provider.name)
+        self.target_latency = config.fetch_target_latency
+        self.rate = AIMDController(config.fetch_rate, config.fetch_min_rate, config.fetch_max_rate,
+                                   increase=config.fetch_rate_step)
+        self.bucket = TokenBucket(self.rate.value, config.fetch_burst)
+        self.chunk_size = AIMDController(config.fetch_chunk_size, config.fetch_min_chunk_size,
+                                         config.fetch_max_chunk_size, increase=config.fetch_chunk_step)
+        self.concurrency = AIMDController(config.fetch_max_threads, 1, config.fetch_max_threads)
+        self.breaker = breaker_for(self.host, config.breaker_failures, config.breaker_reset_seconds)
+
+    def _request(self, chunk: List[str], start, end) -> pd.DataFrame:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"circuit open for {self.host}, skipping {len(chunk)} symbols")
+
+        self.bucket.acquire()
+        kwargs = {'threads': int(self.concurrency.value)} if self.provider.concurrent_downloads else {}
+        began = time.monotonic()
+        try:
+            close_data = self.provider.fetch_closes(chunk, start, end, **kwargs)
+        except Exception as e:
+            if is_host_failure(e):
+                self._record(False)
+            else:
+                self.breaker.record_success()
+            raise
+        if close_data.empty:
+            self.breaker.record_success()
+        else:
+            self._record(True, time.monotonic() - began)
+        return close_data
+
+    def _record(self, success: bool, latency: float = 0.0) -> None:
+        if success:
+            self.breaker.record_success()
+            self.chunk_size.on_success()
+            self.bucket.set_rate(self.rate.on_success())
+            if latency > self.target_latency:
+                self.concurrency.on_failure()
+            else:
+                self.concurrency.on_success()
+        else:
+            self.breaker.record_failure()
+            self.chunk_size.on_failure()
+            self.concurrency.on_failure()
+            self.bucket.set_rate(self.rate.on_failure())
+
+    def fetch_closes(self, symbols: List[str], start, end) -> pd.DataFrame:
+        if not symbols:
+            return pd.DataFrame()
+
+        size = int(self.chunk_size.value)
+        pending = deque(symbols[i:i + size] for i in range(0, len(symbols), size))
+        frames = []
+        failed = []
+        while pending:
+            chunk = pending.popleft()
+            try:
+                close_data = self._request(chunk, start, end)
+                error = None
+            except CircuitOpenError as e:
+                failed.extend(chunk)
+                for rest in pending:
+                    failed.extend(rest)
+                self.logger.warning(f"{e}; not requesting the remaining {len(failed)} symbols")
+                break
+            except Exception as e:
+                close_data, error = pd.DataFrame(), e
+
+            if not close_data.empty:
+                frames.append(close_data)
+                continue
+
+            if error is None:
+                # Nothing traded for these symbols in the window; smaller requests would not change that
+                self.logger.info(f"{self.host} returned no data for {len(chunk)} symbols starting with {chunk[0]}")
+            elif len(chunk) > self.chunk_size.minimum:
+                # Retry in smaller pieces at the (possibly reduced) chunk size
+                size = max(int(self.chunk_size.value), 1)
+                size = min(size, -(-len(chunk) // 2))
+                pending.extendleft(reversed([chunk[i:i + size] for i in range(0, len(chunk), size)]))
+                self.logger.info(f"{self.host} request for {len(chunk)} symbols failed ({error}), "
+                                 f"retrying in chunks of {size}")
+            else:
+                self.logger.warning(f"Giving up on {len(chunk)} symbols starting with {chunk[0]}: {error}")
+                failed.extend(chunk)
+
+        close_data = pd.concat(frames, axis=1) if frames else pd.DataFrame()
+        if failed:
+            raise PartialFetchError(f"{len(failed)} of {len(symbols)} symbols not fetched from {self.host}",
+                                    close_data, failed)
+        return close_data
+
+    def close(self) -> None:
+        self.provider.close()
+
+
+class CachedProvider(StockDataProvider):
+    """Serve repeated requests for the same window from an on-disk response cache
+
+    Each symbol's closes are cached on their own, so a request for a
+    portfolio that gained or lost symbols still reuses the others and only
+    fetches what is missing. A symbol whose window reaches a session of its
+    exchange that has not closed yet (by the exchange's closing time) is
+    cached for ``open_ttl`` seconds, since its last close will change;
+    closed windows are final and kept for ``closed_ttl``. Symbols that
+    came back without data are not cached.
+    """
+
+    interval = "1d"
+
+    def __init__(self, provider: StockDataProvider, logger: logging.Logger, cache: ResponseCache,
+                 registry: SymbolRegistry, open_ttl: float, closed_ttl: float):
+        super().__init__(logger)
+        self.provider = provider
+        self.name = provider.name
+        self.cache = cache
+        self.registry = registry
+        self.open_ttl = open_ttl
+        self.closed_ttl = closed_ttl
+
+    def _includes_open_session(self, exchange: str, start, end) -> bool:
+        """Whether [start, end] holds a session of the exchange that has not closed yet"""
+        calendar = self.registry.calendar(exchange)
+        since = max(to_days(start), to_days(calendar.last_closed_session()) + 1)
+        return calendar.sessions_between(since, to_days(end) + 1) > 0
+
+    def fetch_closes(self, symbols: List[str], start, end) -> pd.DataFrame:
+        if not symbols:
+            return pd.DataFrame()
+
+        keys = {symbol: self.cache.key(self.provider.name, [symbol], self.interval, start, end)
+                for symbol in dict.fromkeys(symbols)}
+        try:
+            cached = self.cache.get_many(list(keys.values()))
+        except Exception as e:
+            self.logger.warning(f"Price cache read failed: {e}")
+            cached = {}
+
+        frames = [cached[key] for key in keys.values() if key in cached]
+        missing = [symbol for symbol, key in keys.items() if key not in cached]
+        failed = []
+        if missing:
+            try:
+                close_data = self.provider.fetch_closes(missing, start, end)
+            except PartialFetchError as e:
+                close_data, failed = e.close_data, e.failed
+            if not close_data.empty:
+                frames.append(close_data)
+                self._store(close_data, keys, start, end)
+
+        close_data = pd.DataFrame() if not frames else pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+        if failed:
+            raise PartialFetchError(f"{len(failed)} of {len(keys)} symbols not fetched", close_data, failed)
+        return close_data
+
+    def _store(self, close_data: pd.DataFrame, keys: Dict[str, str], start, end) -> None:
+        """Cache each fetched symbol, with the TTL its exchange's session state calls for"""
+        by_ttl: Dict[float, Dict[str, pd.DataFrame]] = {}
+        open_exchanges = {}
+        for symbol in close_data.columns.unique():
+            series = close_data[[symbol]].dropna()
+            if symbol not in keys or series.empty:
+                continue
+            exchange = self.registry.resolve(symbol).exchange
+            if exchange not in open_exchanges:
+                open_exchanges[exchange] = self._includes_open_session(exchange, start, end)
+            ttl = self.open_ttl if open_exchanges[exchange] else self.closed_ttl
+            by_ttl.setdefault(ttl, {})[keys[symbol]] = close_data[[symbol]]
+        try:
+            for ttl, frames in by_ttl.items():
+                self.cache.put_many(frames, ttl)
+        except Exception as e:
+            self.logger.warning(f"Price cache write failed: {e}")
+
+    def close(self) -> None:
+        self.provider.close()
@@ -0,0 +1,289 @@
+"""
+Delivery confirmation for sent alert emails
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from alerts import TOLERANCE_BREACH
+from config import EmailConfig
+from elastic_async import AsyncApiClient, ElasticEmailError
+from storage import file_lock
+
+PENDING = 'pending'
+DELIVERED = 'delivered'
+FAILED = 'failed'
+EXPIRED = 'expired'
+
+# Email.Status names meaning the message reached the recipient's server
+DELIVERED_STATUSES = {'sent', 'opened', 'clicked', 'unsubscribed', 'abusereport'}
+FAILED_STATUSES = {'error', 'bounced'}
+
+
+class OutboundLog:
+    """Messages accepted by the send API, with the alerts they carried and their delivery status
+
+    Entries are keyed by message ID (or transaction ID for merge sends) and
+    live in a JSON file, so messages sent by one run are confirmed by the
+    next. Pending entries are checked again after an interval that doubles
+    with each inconclusive check, from ``check_interval`` up to
+    ``max_check_interval`` seconds, and expire ``timeout`` seconds after
+    they were sent. Settled entries are dropped after ``retention``. Merge
+    sends also record each recipient's own alerts, so an undelivered
+    recipient is re-sent only what their digest carried.
+
+    ``save`` merges with what other processes wrote to the file since it was
+    read: per key, the entry further along (settled, then more checks) wins.
+    """
+
+    def __init__(self, path: str, logger: logging.Logger, check_interval: float,
+                 max_check_interval: float, timeout: float, retention: float):
+        self.path = path
+        self.logger = logger
+        self.check_interval = check_interval
+        self.max_check_interval = max_check_interval
+        self.timeout = timeout
+        self.retention = retention
+        self.entries: Dict[str, Dict] = self._read()
+        self._pruned = set()
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable outbound log {self.path}: {e}")
+            return {}
+
+    @staticmethod
+    def _progress(entry: Dict) -> Tuple[bool, int]:
+        return entry["status"] != PENDING, entry["checks"]
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, file_lock(self.path):
+            for key, entry in self._read().items():
+                if key in self._pruned:
+                    continue
+                current = self.entries.get(key)
+                if current is None or self._progress(entry) > self._progress(current):
+                    self.entries[key] = entry
+            self._pruned.clear()
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def record(self, data: Dict, recipients: List[str], subject: str,
+               alerts: Optional[Dict[str, List]] = None, now: Optional[float] = None,
+               recipient_alerts: Optional[Dict[str, Dict[str, List]]] = None) -> Optional[str]:
+        """Log a message from the send API's ``data`` payload; returns its key, or None without IDs"""
+        now = time.time() if now is None else now
+        message_id = data.get('messageid')
+        transaction_id = data.get('transactionid')
+        key = message_id or transaction_id
+        if not key:
+            return None
+        with self._lock:
+            self.entries[key] = {
+                "message_id": message_id,
+                "transaction_id": transaction_id,
+                "recipients": list(recipients),
+                "subject": subject,
+                "alerts": {category: entries for category, entries in (alerts or {}).items() if entries},
+                "sent_at": now,
+                "status": PENDING,
+                "checks": 0,
+                "next_check": now + self.check_interval,
+            }
+            if recipient_alerts is not None:
+                self.entries[key]["recipient_alerts"] = {
+                    address.lower(): {category: entries for category, entries in (by_category or {}).items() if entries}
+                    for address, by_category in recipient_alerts.items()
+                }
+        return key
+
+    def due(self, now: Optional[float] = None) -> List[Tuple[str, Dict]]:
+        """Pending entries whose next check has come"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return [(key, dict(entry)) for key, entry in self.entries.items()
+                    if entry["status"] == PENDING and entry["next_check"] <= now]
+
+    def update(self, key: str, status: str, detail: str = "", undelivered: Optional[List[str]] = None,
+               now: Optional[float] = None) -> Optional[Dict]:
+        """Apply a check result; returns the entry if it settled as undelivered"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["status"] != PENDING:
+                return None
+            entry["checks"] += 1
+            entry["checked_at"] = now
+            if detail:
+                entry["detail"] = detail
+            if status == PENDING and now - entry["sent_at"] >= self.timeout:
+                status = EXPIRED
+            entry["status"] = status
+            if status == PENDING:
+                entry["next_check"] = now + min(self.check_interval * 2 ** entry["checks"], self.max_check_interval)
+                return None
+            if status in (FAILED, EXPIRED):
+                entry["undelivered"] = undelivered or entry["recipients"]
+                return dict(entry)
+            return None
+
+    def prune(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        with self._lock:
+            stale = [key for key, entry in self.entries.items()
+                     if entry["status"] != PENDING and now - entry["sent_at"] > self.retention]
+            for key in stale:
+                del self.entries[key]
+            self._pruned.update(stale)
+        return len(stale)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {PENDING: 0, DELIVERED: 0, FAILED: 0, EXPIRED: 0}
+            for entry in self.entries.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return counts
+
+
+def undelivered_breaches(entry: Dict, recipient: Optional[str] = None) -> List:
+    """The tolerance breaches an undelivered entry carried, to one recipient or to all undelivered ones
+
+    Entries without per-recipient alerts carried the same alerts to everyone.
+    """
+    per_recipient = entry.get("recipient_alerts")
+    if per_recipient is None:
+        return entry.get("alerts", {}).get(TOLERANCE_BREACH, [])
+    addresses = [recipient] if recipient is not None else entry.get("undelivered") or entry["recipients"]
+    breaches = []
+    for address in addresses:
+        for breach in per_recipient.get(address.lower(), {}).get(TOLERANCE_BREACH, []):
+            if breach not in breaches:
+                breaches.append(breach)
+    return breaches
+
+
+class DeliveryReconciler:
+    """Confirm delivery of logged messages by polling Elastic Email in concurrent batches
+
+    Single messages are checked with ``Email.Status`` and merge sends with
+    ``Email.GetStatus`` of their transaction. Entries that settle as failed
+    or expired while carrying tolerance breaches are passed to
+    ``on_undelivered`` so they can be re-sent through another channel.
+    ``start`` runs the checks on a background thread until ``stop``.
+    """
+
+    def __init__(self, outbound: OutboundLog, config: EmailConfig, logger: logging.Logger,
+                 batch_size: int = 50, on_undelivered: Optional[Callable[[List[Dict]], None]] = None):
+        self.outbound = outbound
+        self.config = config
+        self.logger = logger
+        self.batch_size = batch_size
+        self.on_undelivered = on_undelivered
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _message_status(payload: Dict) -> Tuple[str, str, List[str]]:
+        name = str(payload.get('StatusName') or payload.get('Status') or '').lower()
+        if name in DELIVERED_STATUSES:
+            return DELIVERED, name, []
+        if name in FAILED_STATUSES:
+            return FAILED, payload.get('ErrorMessage') or name, []
+        return PENDING, name, []
+
+    @staticmethod
+    def _job_status(payload: Dict) -> Tuple[str, str, List[str]]:
+        failed = [item.get('Address', '') for item in payload.get('Failed') or []]
+        detail = (f"{payload.get('DeliveredCount') or 0} delivered, {payload.get('FailedCount') or 0} failed, "
+                  f"{payload.get('PendingCount') or 0} pending")
+        if payload.get('PendingCount'):
+            return PENDING, detail, []
+        if payload.get('FailedCount'):
+            return FAILED, detail, failed
+        return DELIVERED, detail, []
+
+    async def _check(self, client: AsyncApiClient, entry: Dict) -> Tuple[str, str, List[str]]:
+        try:
+            if entry["message_id"]:
+                return self._message_status(await client.Email.Status(entry["message_id"]))
+            payload = await client.Email.GetStatus(entry["transaction_id"], showFailed=True)
+            return self._job_status(payload)
+        except ElasticEmailError as e:
+            # Raised until the message has been processed
+            return PENDING, str(e), []
+
+    async def _check_all(self, due: List[Tuple[str, Dict]]) -> List:
+        results = []
+        async with AsyncApiClient(self.config.api_key, self.config.api_uri, max_in_flight=self.batch_size,
+                                  logger=self.logger) as client:
+            for start in range(0, len(due), self.batch_size):
+                batch = due[start:start + self.batch_size]
+                results += await asyncio.gather(*(self._check(client, entry) for _, entry in batch),
+                                                return_exceptions=True)
+        return results
+
+    def reconcile(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Check every due entry once; returns the outbound log's status counts"""
+        due = self.outbound.due(now)
+        if due:
+            results = asyncio.run(self._check_all(due))
+            undelivered = []
+            for (key, _), result in zip(due, results):
+                if isinstance(result, Exception):
+                    self.logger.warning(f"Delivery check of {key} failed: {result}")
+                    continue
+                status, detail, addresses = result
+                entry = self.outbound.update(key, status, detail, addresses, now)
+                if entry is not None:
+                    undelivered.append(entry)
+
+            for entry in undelivered:
+                self.logger.error(f"Alert email '{entry['subject']}' was not delivered to "
+                                  f"{', '.join(entry['undelivered'])}: {entry.get('detail', entry['status'])}")
+            breaches = [entry for entry in undelivered if undelivered_breaches(entry)]
+            if breaches and self.on_undelivered is not None:
+                self.on_undelivered(breaches)
+
+        self.outbound.prune(now)
+        self.outbound.save()
+        return self.outbound.counts()
+
+    def _loop(self, interval: float) -> None:
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                self.logger.error(f"Error reconciling deliveries: {e}")
+            if self._stop.wait(interval):
+                return
+
+    def start(self, interval: float) -> None:
+        """Reconcile every ``interval`` seconds on a daemon thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="delivery-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
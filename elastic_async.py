@@ -0,0 +1,195 @@
+"""
+Asyncio client for the Elastic Email v2 API
+
+Every resource class of ElasticEmailClient (Email, Contact, Log, List, ...)
+is available as an awaitable twin; the parameters are built by the bundled
+methods themselves and only the HTTP call differs:
+
+    async with AsyncApiClient(api_key) as client:
+        statuses = await asyncio.gather(*(client.Email.Status(message_id) for message_id in ids))
+
+Requests share one pooled session, at most ``max_in_flight`` are in flight at
+once, and throttled (429), server-side (5xx) and connection failures are
+retried with exponential backoff. The API key is sent but never logged.
+"""
+import asyncio
+import logging
+import random
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import ElasticEmailClient
+from ElasticEmailClient import ApiClient
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ElasticEmailError(RuntimeError):
+    """The API answered with success=false"""
+
+
+class _RetryableError(Exception):
+    pass
+
+
+RETRY_EXCEPTIONS = (_RetryableError, OSError, asyncio.TimeoutError, requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout)
+if aiohttp is not None:
+    RETRY_EXCEPTIONS += (aiohttp.ClientConnectionError,)
+
+
+def capture_request(function, *args, **kwargs) -> Tuple[str, str, Dict, Optional[List]]:
+    """Run a bundled resource method without calling the API; returns its (method, url, data, attachs)"""
+    captured = []
+    token = ApiClient.requestHook.set(lambda *request: captured.append(request))
+    try:
+        function(*args, **kwargs)
+    finally:
+        ApiClient.requestHook.reset(token)
+    if not captured:
+        raise ValueError(f"{function.__qualname__} did not issue a request")
+    return captured[0]
+
+
+class _AsyncResource:
+    """Awaitable versions of one resource class's methods"""
+
+    def __init__(self, client: "AsyncApiClient", resource):
+        self._client = client
+        self._resource = resource
+
+    def __getattr__(self, name: str):
+        function = getattr(self._resource, name)
+        if not callable(function):
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            method, url, data, attachs = capture_request(function, *args, **kwargs)
+            return await self._client.request(method, url, data, attachs)
+
+        call.__name__ = name
+        call.__doc__ = function.__doc__
+        return call
+
+
+class AsyncApiClient:
+    """Pooled, bounded, retrying asyncio twin of ``ElasticEmailClient.ApiClient``
+
+    Uses aiohttp when it is installed. Otherwise requests run on a pooled
+    ``requests.Session`` in worker threads, which still lets many API calls
+    overlap without blocking the event loop.
+    """
+
+    def __init__(self, api_key: str, api_uri: str = ApiClient.apiUri, max_in_flight: int = 8,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 30.0,
+                 logger: Optional[logging.Logger] = None):
+        self.api_key = api_key
+        self.api_uri = api_uri.rstrip('/')
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session = None
+
+    async def __aenter__(self) -> "AsyncApiClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        if aiohttp is not None:
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        else:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+
+    async def close(self) -> None:
+        if self._session is None:
+            return
+        if aiohttp is not None:
+            await self._session.close()
+        else:
+            self._session.close()
+        self._session = None
+
+    def __getattr__(self, name: str) -> _AsyncResource:
+        resource = getattr(ElasticEmailClient, name, None)
+        if name.startswith('_') or not isinstance(resource, type) or name in ('ApiClient', 'ApiTypes'):
+            raise AttributeError(name)
+        return _AsyncResource(self, resource)
+
+    async def _send_aiohttp(self, method: str, url: str, data: Dict, attachs: Optional[List]) -> Dict:
+        if method == 'GET':
+            response = self._session.get(url, params=data)
+        elif attachs:
+            form = aiohttp.FormData()
+            for key, value in data.items():
+                form.add_field(key, value)
+            for field, handle in attachs:
+                form.add_field(field, handle, filename=getattr(handle, 'name', field))
+            response = self._session.request(method, url, data=form)
+        else:
+            response = self._session.request(method, url, data=data)
+
+        async with response as result:
+            if result.status in RETRY_STATUSES:
+                raise _RetryableError(f"HTTP {result.status}")
+            result.raise_for_status()
+            return await result.json(content_type=None)
+
+    def _send_requests(self, method: str, url: str, data: Dict, attachs: Optional[List]) -> Dict:
+        if method == 'GET':
+            result = self._session.get(url, params=data, timeout=self.timeout)
+        else:
+            result = self._session.request(method, url, data=data, files=attachs or None, timeout=self.timeout)
+        if result.status_code in RETRY_STATUSES:
+            raise _RetryableError(f"HTTP {result.status_code}")
+        result.raise_for_status()
+        return result.json()
+
+    async def request(self, method: str, url: str, data: Optional[Dict] = None, attachs: Optional[List] = None):
+        """Call an API endpoint; returns its ``data`` (or 'success') and raises ElasticEmailError on API errors"""
+        if self._session is None:
+            raise RuntimeError("AsyncApiClient is not open; use 'async with AsyncApiClient(...)'")
+
+        # Rendered the way requests renders them for the synchronous client
+        params = {key: str(value) for key, value in (data or {}).items() if value is not None}
+        params['apikey'] = self.api_key
+        full_url = self.api_uri + url
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    if aiohttp is not None:
+                        payload = await self._send_aiohttp(method, full_url, params, attachs)
+                    else:
+                        payload = await asyncio.get_running_loop().run_in_executor(
+                            None, self._send_requests, method, full_url, params, attachs)
+                break
+            except RETRY_EXCEPTIONS as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+                self.logger.warning(f"{method} {url} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        if payload.get('success') is False:
+            raise ElasticEmailError(payload.get('error', 'Unknown error'))
+        return payload.get('data', 'success')
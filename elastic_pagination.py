@@ -0,0 +1,116 @@
+"""
+Auto-paginating iterators over Elastic Email listings
+
+The bundled client returns one ``limit``/``offset`` page per call. These
+generators walk the pages for you and yield one item at a time, fetching the
+next page in the background while the current one is consumed, so a month of
+delivery events streams through in constant memory:
+
+    ApiClient.apiKey = config.email.api_key
+    store.record_delivery_events(iter_events(start=since, end=until))
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, Optional
+
+import ElasticEmailClient
+from elastic_async import AsyncApiClient, ElasticEmailError
+
+DEFAULT_PAGE_SIZE = 500
+
+
+def _page_items(page, items_key: Optional[str], more_key: Optional[str], page_size: int):
+    """Items of one page and whether another page may follow"""
+    if isinstance(page, str):
+        # The synchronous client returns the error message instead of raising
+        raise ElasticEmailError(page)
+    if items_key is None:
+        items = page or []
+    else:
+        items = (page or {}).get(items_key) or []
+    if more_key is not None and page:
+        return items, bool(page.get(more_key))
+    return items, len(items) >= page_size
+
+
+def paginate(function: Callable, *args, items_key: Optional[str] = None, more_key: Optional[str] = None,
+             page_size: int = DEFAULT_PAGE_SIZE, prefetch: bool = True, **kwargs) -> Iterator:
+    """Yield every item of a ``limit``/``offset`` listing of the bundled client
+
+    ``items_key`` names the list inside each page for endpoints that wrap it
+    (``Recipients`` of an EventLog); ``more_key`` names the page's "more
+    available" flag where the API reports one, otherwise a short page ends
+    the listing. With ``prefetch`` the next page is requested on a worker
+    thread as soon as a full page arrives.
+    """
+    def fetch(offset: int):
+        return function(*args, limit=page_size, offset=offset, **kwargs)
+
+    if not prefetch:
+        offset = 0
+        while True:
+            items, more = _page_items(fetch(offset), items_key, more_key, page_size)
+            yield from items
+            if not more or not items:
+                return
+            offset += len(items)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="elastic-page") as executor:
+        # Run in the caller's context so a request hook set by the caller (see capture_request) applies
+        pending = executor.submit(contextvars.copy_context().run, fetch, 0)
+        offset = 0
+        while pending is not None:
+            items, more = _page_items(pending.result(), items_key, more_key, page_size)
+            offset += len(items)
+            pending = None
+            if more and items:
+                pending = executor.submit(contextvars.copy_context().run, fetch, offset)
+            yield from items
+
+
+async def apaginate(client: AsyncApiClient, resource: str, method: str, *args, items_key: Optional[str] = None,
+                    more_key: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE, **kwargs) -> AsyncIterator:
+    """Asyncio twin of ``paginate`` over ``client.<resource>.<method>``, prefetching one page ahead"""
+    call = getattr(getattr(client, resource), method)
+    pending = asyncio.ensure_future(call(*args, limit=page_size, offset=0, **kwargs))
+    offset = 0
+    try:
+        while pending is not None:
+            items, more = _page_items(await pending, items_key, more_key, page_size)
+            offset += len(items)
+            pending = None
+            if more and items:
+                pending = asyncio.ensure_future(call(*args, limit=page_size, offset=offset, **kwargs))
+            for item in items:
+                yield item
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+def iter_events(statuses: Optional[Iterable[int]] = None, start=None, end=None, channel_name: Optional[str] = None,
+                page_size: int = DEFAULT_PAGE_SIZE, prefetch: bool = True) -> Iterator[Dict]:
+    """Delivery events (RecipientEvent dicts) between two dates, from ``Log.Events``"""
+    return paginate(ElasticEmailClient.Log.Events, statuses=statuses or [], EEfrom=start, to=end,
+                    channelName=channel_name, items_key='Recipients', page_size=page_size, prefetch=prefetch)
+
+
+def iter_link_tracking(start=None, end=None, channel_name: Optional[str] = None,
+                       page_size: int = DEFAULT_PAGE_SIZE, prefetch: bool = True) -> Iterator[Dict]:
+    """Tracked links (TrackedLink dicts) between two dates, from ``Log.LinkTracking``"""
+    return paginate(ElasticEmailClient.Log.LinkTracking, EEfrom=start, to=end, channelName=channel_name,
+                    items_key='TrackedLink', more_key='MoreAvailable', page_size=page_size, prefetch=prefetch)
+
+
+def iter_contact_history(email: str, page_size: int = DEFAULT_PAGE_SIZE,
+                         prefetch: bool = True) -> Iterator[Dict]:
+    """A contact's history (ContactHistory dicts), from ``Contact.LoadHistory``"""
+    return paginate(ElasticEmailClient.Contact.LoadHistory, email, page_size=page_size, prefetch=prefetch)
+
+
+def iter_segment_contacts(segment_name: str, page_size: int = DEFAULT_PAGE_SIZE,
+                          prefetch: bool = True) -> Iterator[Dict]:
+    """Contacts (Contact dicts) of a segment, from ``Contact.GetContactsBySegment``"""
+    return paginate(ElasticEmailClient.Contact.GetContactsBySegment, segment_name, page_size=page_size,
+                    prefetch=prefetch)
@@ -1,83 +1,226 @@
 """
 Email service for sending stock alerts
 """
+import csv
+import io
 import requests
-from typing import Optional
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 import logging
+from urllib.parse import urlsplit
 from config import EmailConfig
+from alert_templates import RenderedAlert, render_html_text
+from delivery import OutboundLog
+from rate_limit import breaker_for
+from smtp_transport import SMTPTransport
+
+# Merge fields filled per recipient in bulk sends; a stored template refers to them as {alerts_html} etc.
+MERGE_FIELDS = ['ToEmail', 'name', 'subject', 'alerts_text', 'alerts_html']
+
+
+@dataclass
+class Digest:
+    """One recipient's personalized alert email"""
+    email: str
+    name: str
+    alert: RenderedAlert
+    alerts: Optional[Dict[str, List]] = None
 
 
 class EmailService:
-    """Email service using Elastic Email API"""
+    """Email service using Elastic Email API
     
-    def __init__(self, config: EmailConfig, logger: logging.Logger):
+    When SMTP_HOST is set, messages the API fails to accept are sent over
+    SMTP instead. A circuit breaker on the API host skips the API entirely
+    after repeated timeouts, throttling or server errors, so while it is
+    degraded alerts go straight to SMTP without waiting on it.
+    """
+    
+    def __init__(self, config: EmailConfig, logger: logging.Logger, outbound: Optional[OutboundLog] = None):
         self.config = config
         self.logger = logger
+        self.outbound = outbound
+        self.breaker = breaker_for(urlsplit(config.api_uri).netloc, config.api_failures, config.api_reset_seconds)
+        self.smtp = SMTPTransport(config, logger) if config.smtp_host else None
     
-    def send_notification(self, subject: str, message: str) -> bool:
-        """Send email notification"""
+    def _post(self, email_data: Dict, files: Optional[Dict] = None) -> Optional[Dict]:
+        """POST to /email/send, returning the API's ``data`` payload or None on failure"""
+        if not self.breaker.allow():
+            self.logger.debug("Email API circuit is open, not calling it")
+            return None
         try:
-            # Prepare email data
-            email_data = {
-                'apikey': self.config.api_key,
-                'subject': subject,
-                'from': self.config.sender_email,
-                'fromName': self.config.sender_name,
-                'to': ','.join(self.config.recipient_emails),
-                'bodyText': message,
-                'bodyHtml': self._format_html_message(message),
-                'isTransactional': True
-            }
-            
-            # Send email
             response = requests.post(
                 f"{self.config.api_uri}/email/send",
-                data=email_data,
+                data={'apikey': self.config.api_key, **email_data},
+                files=files,
                 timeout=30
             )
             
+            # Throttling and server errors mean the API is degraded; other answers mean it is up
+            if response.status_code == 429 or response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            
             # Check response
             if response.status_code == 200:
                 result = response.json()
                 if result.get('success', False):
-                    self.logger.info(f"Email sent successfully to {len(self.config.recipient_emails)} recipients")
-                    return True
+                    return result.get('data') or {}
                 else:
                     error_msg = result.get('error', 'Unknown error')
                     self.logger.error(f"Email API error: {error_msg}")
-                    return False
+                    return None
             else:
                 self.logger.error(f"HTTP error {response.status_code}: {response.text}")
-                return False
-                
+                return None
+        
         except requests.exceptions.Timeout:
+            self.breaker.record_failure()
             self.logger.error("Email request timed out")
-            return False
+            return None
         except requests.exceptions.RequestException as e:
+            self.breaker.record_failure()
             self.logger.error(f"Email request failed: {e}")
-            return False
+            return None
         except Exception as e:
             self.logger.error(f"Unexpected error sending email: {e}")
+            return None
+    
+    def _record(self, data: Dict, recipients: List[str], subject: str, alerts: Optional[Dict[str, List]],
+                recipient_alerts: Optional[Dict[str, Dict[str, List]]] = None) -> None:
+        """Log an accepted message so its delivery can be confirmed later"""
+        if (self.outbound is not None
+                and self.outbound.record(data, recipients, subject, alerts, recipient_alerts=recipient_alerts) is None):
+            self.logger.warning(f"Send API returned no message ID for '{subject}'")
+    
+    def _send_smtp(self, subject: str, message: str, html: str, recipients: List[str]) -> bool:
+        if self.smtp is None:
+            return False
+        if not self.smtp.send(subject, message, html, recipients):
             return False
+        self.logger.info(f"Email sent over SMTP to {len(recipients)} recipients")
+        return True
     
-    def _format_html_message(self, text_message: str) -> str:
-        """Convert text message to HTML format"""
-        html_message = text_message.replace('\n', '<br>')
+    def send_notification(self, subject: str, message: str, html: Optional[str] = None,
+                          to: Optional[List[str]] = None, alerts: Optional[Dict[str, List]] = None) -> bool:
+        """Send email notification; without ``html`` the text is wrapped in the default layout
+
+        ``alerts`` are logged with the message ID for delivery tracking.
+        Falls back to SMTP, when configured, if the API does not accept it.
+        """
+        recipients = to or self.config.recipient_emails
+        html = html if html is not None else self._format_html_message(message)
+        email_data = {
+            'subject': subject,
+            'from': self.config.sender_email,
+            'fromName': self.config.sender_name,
+            'to': ','.join(recipients),
+            'bodyText': message,
+            'bodyHtml': html,
+            'isTransactional': True
+        }
         
-        # Add some basic styling
-        html_template = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <h2 style="color: #d32f2f;">Stock Portfolio Alert</h2>
-            <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px;">
-                <pre style="white-space: pre-wrap; font-family: monospace;">{html_message}</pre>
-            </div>
-            <hr style="margin: 20px 0;">
-            <p style="font-size: 12px; color: #666;">
-                This is an automated message from your Stock Tracker system.
-            </p>
-        </body>
-        </html>
+        data = self._post(email_data)
+        if data is None:
+            return self._send_smtp(subject, message, html, recipients)
+        self._record(data, recipients, subject, alerts)
+        self.logger.info(f"Email sent successfully to {len(recipients)} recipients")
+        return True
+    
+    def _merge_file(self, digests: List[Digest]) -> bytes:
+        """CSV of recipients and their merge fields, one row per digest"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(MERGE_FIELDS)
+        for digest in digests:
+            writer.writerow([digest.email, digest.name, digest.alert.subject, digest.alert.text, digest.alert.html])
+        return buffer.getvalue().encode('utf-8')
+    
+    def _merge_batches(self, digests: List[Digest]) -> List[List[Digest]]:
+        """Split digests into merge sends bounded by row count and merge file size"""
+        batches, batch, batch_bytes = [], [], 0
+        for digest in digests:
+            size = len(digest.alert.text) + len(digest.alert.html) + len(digest.alert.subject) + 64
+            if batch and (len(batch) >= self.config.merge_batch_size
+                          or batch_bytes + size > self.config.merge_max_bytes):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(digest)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    @staticmethod
+    def _merged_alerts(digests: List[Digest]) -> Dict[str, List]:
+        """Distinct alerts carried by a batch of digests"""
+        merged: Dict[str, List] = {}
+        seen = set()
+        for digest in digests:
+            for category, entries in (digest.alerts or {}).items():
+                for entry in entries:
+                    if (category, *entry) not in seen:
+                        seen.add((category, *entry))
+                        merged.setdefault(category, []).append(entry)
+        return merged
+    
+    def send_digests(self, digests: List[Digest]) -> int:
+        """Send personalized digests through merge sends; returns how many were sent
+
+        Each batch is one /email/send call with a merge CSV attached. Elastic
+        Email sends one message per row, filling {subject}, {name},
+        {alerts_text} and {alerts_html} into the stored template named by
+        ``merge_template``, or into inline bodies made of those fields. A
+        batch the API rejects is retried as individual sends, which fall
+        back to SMTP when it is configured.
         """
+        sent = 0
+        for batch in self._merge_batches(digests):
+            email_data = {
+                'subject': '{subject}',
+                'from': self.config.sender_email,
+                'fromName': self.config.sender_name,
+                'mergeSourceFilename': 'recipients.csv',
+                'isTransactional': True
+            }
+            if self.config.merge_template:
+                email_data['template'] = self.config.merge_template
+            else:
+                email_data['bodyText'] = '{alerts_text}'
+                email_data['bodyHtml'] = '{alerts_html}'
+            
+            files = {'attachments': ('recipients.csv', self._merge_file(batch), 'text/csv')}
+            data = self._post(email_data, files)
+            if data is not None:
+                self._record(data, [digest.email for digest in batch], f"{len(batch)} alert digests",
+                             self._merged_alerts(batch), {digest.email: digest.alerts for digest in batch})
+                self.logger.info(f"Merge send accepted for {len(batch)} digests")
+                sent += len(batch)
+                continue
+            
+            self.logger.warning(f"Merge send of {len(batch)} digests failed, sending them individually")
+            for digest in batch:
+                if self.send_notification(digest.alert.subject, digest.alert.text, html=digest.alert.html,
+                                          to=[digest.email], alerts=digest.alerts):
+                    sent += 1
         
-        return html_template
\ No newline at end of file
+        return sent
+    
+    def send_fallback(self, subject: str, message: str, html: Optional[str] = None,
+                      to: Optional[List[str]] = None) -> bool:
+        """Send over SMTP when configured, otherwise through the API; for re-sending undelivered alerts"""
+        recipients = to or self.config.recipient_emails
+        if self.smtp is not None:
+            html = html if html is not None else self._format_html_message(message)
+            return self._send_smtp(subject, message, html, recipients)
+        return self.send_notification(subject, message, html=html, to=recipients)
+    
+    def close(self) -> None:
+        """Close the SMTP connection, if one is open"""
+        if self.smtp is not None:
+            self.smtp.close()
+    
+    def _format_html_message(self, text_message: str) -> str:
+        """Convert text message to HTML format"""
+        return render_html_text(text_message)
@@ -0,0 +1,98 @@
+"""
+Negative cache of symbols that repeatedly return no price data
+"""
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+from storage import file_lock
+
+
+class NegativeCache:
+    """Track invalid, delisted or unresolvable symbols and when to probe them again
+
+    Each consecutive miss doubles the wait before a symbol is requested
+    again, from ``base_interval`` up to ``max_interval`` seconds; any price
+    data clears it. Entries live in a JSON file so the back-off survives
+    between runs. Symbols are reported when they are first suppressed and
+    then only in the periodic health summary.
+    """
+
+    def __init__(self, path: str, logger: logging.Logger, base_interval: float,
+                 max_interval: float, summary_interval: float):
+        self.path = path
+        self.logger = logger
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.summary_interval = summary_interval
+        self.entries: Dict[str, Dict] = {}
+        self.last_summary = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable negative cache {self.path}: {e}")
+            return
+        self.entries = payload.get("symbols", {})
+        self.last_summary = payload.get("last_summary", 0.0)
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with file_lock(self.path):
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"symbols": self.entries, "last_summary": self.last_summary}, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def suppressed(self, symbols: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """Symbols still waiting out their back-off"""
+        now = time.time() if now is None else now
+        return [symbol for symbol in symbols
+                if symbol in self.entries and self.entries[symbol]["next_probe"] > now]
+
+    def record_missing(self, symbols: Iterable[str], reason: str, now: Optional[float] = None) -> List[str]:
+        """Push back the next probe of symbols that returned nothing; returns the newly suppressed ones"""
+        now = time.time() if now is None else now
+        new = []
+        for symbol in symbols:
+            entry = self.entries.get(symbol)
+            if entry is None:
+                entry = self.entries[symbol] = {"failures": 0, "first_missing": now}
+                new.append(symbol)
+            entry["failures"] += 1
+            entry["reason"] = reason
+            entry["last_missing"] = now
+            interval = min(self.base_interval * 2 ** (entry["failures"] - 1), self.max_interval)
+            entry["next_probe"] = now + interval
+        return new
+
+    def record_found(self, symbols: Iterable[str]) -> List[str]:
+        """Clear symbols that returned data again; returns the ones that had been suppressed"""
+        recovered = [symbol for symbol in symbols if symbol in self.entries]
+        for symbol in recovered:
+            del self.entries[symbol]
+        return recovered
+
+    def summary(self, now: Optional[float] = None) -> str:
+        """Health summary of known-bad symbols, or '' if none is due"""
+        now = time.time() if now is None else now
+        if not self.entries or now - self.last_summary < self.summary_interval:
+            return ""
+
+        self.last_summary = now
+        lines = [f"{len(self.entries)} symbols are returning no price data:"]
+        for symbol, entry in sorted(self.entries.items()):
+            days = (now - entry["first_missing"]) / 86400
+            next_probe = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry["next_probe"]))
+            lines.append(f"  {symbol}: {entry['reason']}, {entry['failures']} misses over {days:.0f} days, "
+                         f"next probe {next_probe}")
+        return "\n".join(lines)
@@ -0,0 +1,273 @@
+"""
+Fan-out of alerts to email, SMS and webhook channels
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+import ElasticEmailClient
+from alert_templates import AlertRenderer
+from alerts import ALERT_CATEGORIES
+from config import EmailConfig, TrackerConfig
+from elastic_async import capture_request
+from email_service import EmailService
+from storage import file_lock
+
+# Named schedules a route can be limited to, e.g. stagnant=email@weekly
+PERIODS = {'hourly': 3600, 'daily': 86400, 'weekly': 7 * 86400}
+
+
+def parse_routes(spec: str, channels: List[str]) -> Dict[str, List[Tuple[str, float]]]:
+    """Parse 'category=channel[@period],...;...' into (channel, minimum seconds between sends) per category
+
+    Categories left out of ``spec`` go to email on every run; an empty
+    ``spec`` is the plain email-only behaviour.
+    """
+    routes = {category: [('email', 0.0)] for category in ALERT_CATEGORIES}
+    for clause in filter(None, (part.strip() for part in spec.split(';'))):
+        category, _, targets = clause.partition('=')
+        category = category.strip()
+        if category not in routes:
+            raise ValueError(f"unknown alert category '{category}' (expected one of {', '.join(ALERT_CATEGORIES)})")
+        routes[category] = []
+        for target in filter(None, (part.strip() for part in targets.split(','))):
+            channel, _, period = target.partition('@')
+            if channel not in channels:
+                raise ValueError(f"unknown channel '{channel}' (expected one of {', '.join(channels)})")
+            if period and period not in PERIODS:
+                raise ValueError(f"unknown period '{period}' (expected one of {', '.join(PERIODS)})")
+            routes[category].append((channel, float(PERIODS.get(period, 0))))
+    return routes
+
+
+class Channel:
+    """A way of delivering alerts; ``send`` must finish within ``timeout`` seconds"""
+
+    name = ''
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+    def send(self, alerts: Dict[str, List], subject: Optional[str] = None, text: Optional[str] = None) -> bool:
+        """Deliver alerts, or the preformatted subject and text when given"""
+        raise NotImplementedError
+
+
+class EmailChannel(Channel):
+    """Alert emails through the tracker's usual path (digests, templates, delivery tracking)"""
+
+    name = 'email'
+
+    def __init__(self, timeout: float, send_alerts: Callable[[Dict[str, List]], bool], email_service: EmailService):
+        super().__init__(timeout)
+        self.send_alerts = send_alerts
+        self.email_service = email_service
+
+    def send(self, alerts, subject=None, text=None) -> bool:
+        if text is not None:
+            return self.email_service.send_notification(subject, text, alerts=alerts)
+        return self.send_alerts(alerts)
+
+
+class SMSChannel(Channel):
+    """Short summaries to mobile numbers through Elastic Email's SMS.Send"""
+
+    name = 'sms'
+
+    def __init__(self, timeout: float, config: EmailConfig, numbers: List[str], renderer: AlertRenderer,
+                 logger: logging.Logger):
+        super().__init__(timeout)
+        self.config = config
+        self.numbers = numbers
+        self.renderer = renderer
+        self.logger = logger
+        self.session = requests.Session()
+
+    def send(self, alerts, subject=None, text=None) -> bool:
+        body = text[:160] if text is not None else self.renderer.summary(alerts)
+        sent = 0
+        for number in self.numbers:
+            method, url, data, _ = capture_request(ElasticEmailClient.SMS.Send, number, body)
+            try:
+                response = self.session.request(method, f"{self.config.api_uri}{url}",
+                                                params={**data, 'apikey': self.config.api_key}, timeout=self.timeout)
+                result = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.logger.error(f"SMS to {number} failed: {e}")
+                continue
+            if not result.get('success', False):
+                self.logger.error(f"SMS API error for {number}: {result.get('error', 'Unknown error')}")
+                continue
+            sent += 1
+        return sent == len(self.numbers)
+
+
+class WebhookChannel(Channel):
+    """JSON posts to a chat webhook; ``text`` is what Slack, Mattermost and Teams display"""
+
+    name = 'webhook'
+
+    def __init__(self, timeout: float, url: str, renderer: AlertRenderer, logger: logging.Logger):
+        super().__init__(timeout)
+        self.url = url
+        self.renderer = renderer
+        self.logger = logger
+        self.session = requests.Session()
+
+    def send(self, alerts, subject=None, text=None) -> bool:
+        if text is None:
+            rendered = self.renderer.render(alerts)
+            subject, text = rendered.subject, rendered.text
+        payload = {'text': f"*{subject}*\n{text}", 'alerts': alerts}
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Webhook post failed: {e}")
+            return False
+        if response.status_code >= 300:
+            self.logger.error(f"Webhook returned HTTP {response.status_code}: {response.text[:200]}")
+            return False
+        return True
+
+
+class Notifier:
+    """Route alert categories to channels and dispatch to all of them at once
+
+    Every channel runs on its own worker thread and is waited on for at
+    most its own timeout, so a slow SMS gateway or webhook never holds back
+    the email (or the other way round). A channel still busy with a send
+    that timed out is skipped until it finishes; if that send succeeds
+    late it is recorded then. Routes limited to a period (say
+    ``stagnant=email@weekly``) send at most once per period; the time of
+    the last send per category and channel is kept in ``state_file``.
+    """
+
+    def __init__(self, channels: List[Channel], routes: Dict[str, List[Tuple[str, float]]],
+                 state_file: str, logger: logging.Logger):
+        self.channels = {channel.name: channel for channel in channels}
+        self.routes = routes
+        self.state_file = state_file
+        self.logger = logger
+        self.last_sent: Dict[str, float] = {}
+        self._executors = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"notify-{name}")
+                           for name in self.channels}
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, "r") as f:
+                self.last_sent = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable notification state {self.state_file}: {e}")
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.state_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, file_lock(self.state_file):
+            tmp_path = f"{self.state_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.last_sent, f, indent=1)
+            os.replace(tmp_path, self.state_file)
+
+    def _sent(self, name: str, categories, now: float) -> None:
+        with self._lock:
+            for category in categories:
+                self.last_sent[f"{category}:{name}"] = now
+
+    def _late_result(self, name: str, categories, now: float, future: Future) -> None:
+        """Record a send that finished after its timeout, if it succeeded"""
+        if future.cancelled() or future.exception() is not None or not future.result():
+            return
+        self.logger.info(f"Late {name} notification succeeded")
+        self._sent(name, categories, now)
+        self._save()
+
+    def plan(self, alerts: Dict[str, List], now: Optional[float] = None) -> Dict[str, Dict[str, List]]:
+        """The alerts each channel should send now, honouring route periods"""
+        now = time.time() if now is None else now
+        plan: Dict[str, Dict[str, List]] = {}
+        for category, entries in alerts.items():
+            if not entries:
+                continue
+            for channel, period in self.routes.get(category, []):
+                if channel not in self.channels:
+                    continue
+                if period and now - self.last_sent.get(f"{category}:{channel}", 0.0) < period:
+                    continue
+                plan.setdefault(channel, {})[category] = entries
+        return plan
+
+    def notify(self, alerts: Dict[str, List], subject: Optional[str] = None, text: Optional[str] = None) -> bool:
+        """Send alerts to their channels concurrently; True if every channel that had alerts succeeded"""
+        now = time.time()
+        plan = self.plan(alerts, now)
+        if not plan:
+            self.logger.info("No channel is due for these alerts")
+            return True
+
+        success = True
+        started = time.monotonic()
+        futures = {}
+        for name, channel_alerts in plan.items():
+            previous = self._in_flight.get(name)
+            if previous is not None and not previous.done():
+                self.logger.error(f"{name} is still busy with an earlier notification, skipping it")
+                success = False
+                continue
+            futures[name] = self._in_flight[name] = self._executors[name].submit(
+                self.channels[name].send, channel_alerts, subject, text)
+
+        for name, future in futures.items():
+            channel = self.channels[name]
+            try:
+                ok = future.result(timeout=max(0.0, started + channel.timeout - time.monotonic()))
+            except TimeoutError:
+                self.logger.error(f"{name} notification timed out after {channel.timeout:g}s")
+                if not future.cancel():
+                    future.add_done_callback(lambda late, name=name: self._late_result(name, plan[name], now, late))
+                ok = False
+            except Exception as e:
+                self.logger.error(f"{name} notification failed: {e}")
+                ok = False
+
+            if ok:
+                self.logger.info(f"Sent {sum(map(len, plan[name].values()))} alerts by {name}")
+                self._sent(name, plan[name], now)
+            success &= ok
+
+        self._save()
+        return success
+
+    def close(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_notifier(config: TrackerConfig, email_config: EmailConfig, email_service: EmailService,
+                    send_alerts: Callable[[Dict[str, List]], bool], renderer: AlertRenderer,
+                    logger: logging.Logger) -> Notifier:
+    """Notifier with every configured channel and the routes from ``notify_routes``"""
+    channels: List[Channel] = [EmailChannel(config.notify_email_timeout, send_alerts, email_service)]
+    if config.sms_numbers:
+        channels.append(SMSChannel(config.notify_sms_timeout, email_config, config.sms_numbers, renderer, logger))
+    if config.webhook_url:
+        channels.append(WebhookChannel(config.notify_webhook_timeout, config.webhook_url, renderer, logger))
+
+    routes = parse_routes(config.notify_routes, ['email', 'sms', 'webhook'])
+    configured = {channel.name for channel in channels}
+    for category, targets in routes.items():
+        for channel, _ in targets:
+            if channel not in configured:
+                logger.warning(f"NOTIFY_ROUTES sends {category} by {channel}, which is not configured")
+    return Notifier(channels, routes, config.notify_state_file, logger)
@@ -0,0 +1,100 @@
+"""
+Portfolio state updates shared by every price provider
+"""
+from datetime import date
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import to_days
+
+# Compact per-symbol state: 8-byte prices and dates, 4-byte tolerance. pandas
+# has no day-resolution datetime dtype; second resolution is the coarsest one
+# it stores and costs the same 8 bytes as datetime64[D].
+PORTFOLIO_DTYPES = {
+    'high': 'float64',
+    'high_date': 'datetime64[s]',
+    'close': 'float64',
+    'tolerance': 'float32',
+    'updated': 'datetime64[s]',
+}
+DATE_COLUMNS = [column for column, dtype in PORTFOLIO_DTYPES.items() if dtype.startswith('datetime')]
+
+
+def _as_dates(values) -> pd.Series:
+    return pd.Series(to_days(values), index=getattr(values, 'index', None)).astype('datetime64[s]')
+
+
+def to_portfolio(df: pd.DataFrame) -> pd.DataFrame:
+    """Return the portfolio state with explicit dtypes and a categorical symbol index
+
+    Accepts the loosely typed frames read from CSV or built by older code
+    (ints for prices, '' or strings or date objects for dates). Missing dates
+    become NaT.
+    """
+    columns = {}
+    for column, dtype in PORTFOLIO_DTYPES.items():
+        values = df[column] if column in df.columns else pd.Series(index=df.index, dtype=object)
+        if column in DATE_COLUMNS:
+            columns[column] = _as_dates(values).to_numpy()
+        else:
+            columns[column] = pd.to_numeric(values, errors='coerce').to_numpy(dtype=dtype)
+
+    index = pd.CategoricalIndex(df.index.astype(str), name='symbol')
+    return pd.DataFrame(columns, index=index)
+
+
+def new_portfolio_rows(symbols: Iterable[str], tolerance: float) -> pd.DataFrame:
+    """Typed state rows for newly tracked symbols
+
+    High and close start at 1 so the first price update records a real high;
+    the dates stay empty until then.
+    """
+    symbols = pd.Index(list(symbols), dtype=object, name='symbol')
+    n = len(symbols)
+    return to_portfolio(pd.DataFrame({
+        'high': np.ones(n),
+        'high_date': np.full(n, np.datetime64('NaT', 's')),
+        'close': np.ones(n),
+        'tolerance': np.full(n, tolerance, dtype='float32'),
+        'updated': np.full(n, np.datetime64('NaT', 's')),
+    }, index=symbols))
+
+
+def apply_window_closes(symbol_list: pd.DataFrame, close_data: pd.DataFrame,
+                        today: Optional[date] = None) -> Tuple[pd.Index, pd.Index]:
+    """Record each symbol's lowest close in the window and raise highs it exceeds
+
+    ``close_data`` is a dates x symbols frame. The lowest close of the window
+    becomes the symbol's ``close``; if it is above the recorded ``high`` it
+    becomes the new high (and ``high_date`` when the state has that column).
+    Works on the whole portfolio at once and updates ``symbol_list`` in place.
+
+    Returns the symbols that were updated and the subset that made a new high.
+    """
+    today = today or date.today()
+
+    window_min = close_data.min()
+    window_min = window_min[window_min.notna() & ~window_min.index.duplicated()]
+    window_min = window_min[window_min.index.isin(symbol_list.index)]
+    symbols = window_min.index
+
+    # Frames read straight from CSV are not typed yet
+    for column in ['high', 'close']:
+        if symbol_list[column].dtype != float:
+            symbol_list[column] = symbol_list[column].astype(float)
+    for column in DATE_COLUMNS:
+        if column in symbol_list.columns and not pd.api.types.is_datetime64_dtype(symbol_list[column]):
+            symbol_list[column] = _as_dates(symbol_list[column])
+
+    today = pd.Timestamp(today)
+    symbol_list.loc[symbols, 'close'] = window_min.to_numpy()
+    symbol_list.loc[symbols, 'updated'] = today
+
+    higher = symbols[window_min.to_numpy() > symbol_list.loc[symbols, 'high'].to_numpy()]
+    symbol_list.loc[higher, 'high'] = window_min[higher].to_numpy()
+    if 'high_date' in symbol_list.columns:
+        symbol_list.loc[higher, 'high_date'] = today
+
+    return symbols, higher
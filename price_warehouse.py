@@ -0,0 +1,279 @@
+"""
+Local price warehouse storing daily closes as partitioned date x symbol matrices
+"""
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class PriceWarehouse:
+    """Append-only store of daily closing prices partitioned by year/month
+
+    Every partition directory (``<root>/YYYY/MM``) holds a sorted
+    ``datetime64[D]`` date vector and a dense float32 matrix of shape
+    dates x symbols, both saved as ``.npy`` so they can be memory-mapped.
+    Column positions come from one symbol dictionary (``symbols.json``) shared
+    by all partitions; a partition written before a symbol was registered is
+    simply narrower and the missing columns read back as NaN.
+
+    A small ``partition.json`` manifest names the current version of the two
+    array files, so a partition is replaced atomically even though it spans
+    several files.
+    """
+
+    SYMBOLS_FILE = "symbols.json"
+    MANIFEST_FILE = "partition.json"
+
+    def __init__(self, root: str, logger: logging.Logger):
+        self.root = root
+        self.logger = logger
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+        self._symbols: List[str] = self._load_symbols()
+        self._symbol_ids: Dict[str, int] = {symbol: i for i, symbol in enumerate(self._symbols)}
+
+    @property
+    def symbols(self) -> List[str]:
+        """Symbols in column order"""
+        return list(self._symbols)
+
+    def _load_symbols(self) -> List[str]:
+        path = os.path.join(self.root, self.SYMBOLS_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _write_json(self, path: str, payload) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    def _register_symbols(self, symbols: Sequence[str]) -> np.ndarray:
+        """Return column ids for symbols, adding unknown ones to the dictionary"""
+        new_symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self._symbol_ids]
+        if new_symbols:
+            for symbol in new_symbols:
+                self._symbol_ids[symbol] = len(self._symbols)
+                self._symbols.append(symbol)
+            self._write_json(os.path.join(self.root, self.SYMBOLS_FILE), self._symbols)
+            self.logger.debug(f"Registered {len(new_symbols)} new symbols in price warehouse")
+        return np.array([self._symbol_ids[symbol] for symbol in symbols], dtype=np.int64)
+
+    def _partition_dir(self, year: int, month: int) -> str:
+        return os.path.join(self.root, f"{year:04d}", f"{month:02d}")
+
+    def partitions(self) -> List[Tuple[int, int]]:
+        """List existing (year, month) partitions in chronological order"""
+        found = []
+        for year_dir in os.listdir(self.root):
+            if not year_dir.isdigit():
+                continue
+            for month_dir in os.listdir(os.path.join(self.root, year_dir)):
+                manifest = os.path.join(self.root, year_dir, month_dir, self.MANIFEST_FILE)
+                if month_dir.isdigit() and os.path.exists(manifest):
+                    found.append((int(year_dir), int(month_dir)))
+        return sorted(found)
+
+    def load_partition(self, year: int, month: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Memory-map a partition, returning (dates, closes) or None if absent"""
+        partition_dir = self._partition_dir(year, month)
+        manifest_path = os.path.join(partition_dir, self.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+
+        with open(manifest_path, "r") as f:
+            version = json.load(f)["version"]
+
+        dates = np.load(os.path.join(partition_dir, f"dates.{version}.npy"), mmap_mode="r")
+        closes = np.load(os.path.join(partition_dir, f"closes.{version}.npy"), mmap_mode="r")
+        return dates, closes
+
+    def _write_partition(self, year: int, month: int, dates: np.ndarray, closes: np.ndarray) -> None:
+        partition_dir = self._partition_dir(year, month)
+        os.makedirs(partition_dir, exist_ok=True)
+        manifest_path = os.path.join(partition_dir, self.MANIFEST_FILE)
+
+        previous = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                previous = json.load(f)["version"]
+        version = 0 if previous is None else previous + 1
+
+        np.save(os.path.join(partition_dir, f"dates.{version}.npy"), dates)
+        np.save(os.path.join(partition_dir, f"closes.{version}.npy"), closes)
+        self._write_json(manifest_path, {"version": version, "rows": len(dates), "width": closes.shape[1]})
+
+        # Readers holding a memory map of the old version keep a valid view on POSIX
+        if previous is not None:
+            for name in (f"dates.{previous}.npy", f"closes.{previous}.npy"):
+                try:
+                    os.remove(os.path.join(partition_dir, name))
+                except OSError as e:
+                    self.logger.debug(f"Could not remove stale partition file {name}: {e}")
+
+    @staticmethod
+    def _to_day_index(index: pd.Index) -> np.ndarray:
+        dates = pd.DatetimeIndex(index)
+        if dates.tz is not None:
+            dates = dates.tz_localize(None)
+        return dates.values.astype("datetime64[D]")
+
+    def append(self, closes: pd.DataFrame) -> int:
+        """Merge a dates x symbols frame of closes into the warehouse
+
+        Non-NaN values overwrite what is already stored for the same day and
+        symbol; NaN never erases a stored price. Returns the number of daily
+        rows written.
+        """
+        if closes is None or closes.empty:
+            return 0
+
+        frame = closes.dropna(how="all")
+        if frame.empty:
+            return 0
+
+        with self._lock:
+            column_ids = self._register_symbols([str(symbol) for symbol in frame.columns])
+            width = len(self._symbols)
+            days = self._to_day_index(frame.index)
+            values = frame.to_numpy(dtype=np.float32, na_value=np.nan)
+            months = days.astype("datetime64[M]")
+
+            for month in np.unique(months):
+                rows_in_month = months == month
+                new_dates = days[rows_in_month]
+                new_values = values[rows_in_month]
+                year, month_number = int(str(month)[:4]), int(str(month)[5:7])
+
+                existing = self.load_partition(year, month_number)
+                if existing is not None:
+                    old_dates, old_closes = existing
+                    all_dates = np.union1d(old_dates, new_dates)
+                    matrix = np.full((len(all_dates), width), np.nan, dtype=np.float32)
+                    matrix[np.searchsorted(all_dates, old_dates), :old_closes.shape[1]] = old_closes
+                    del old_dates, old_closes, existing
+                else:
+                    all_dates = np.unique(new_dates)
+                    matrix = np.full((len(all_dates), width), np.nan, dtype=np.float32)
+
+                rows = np.searchsorted(all_dates, new_dates)
+                current = matrix[rows[:, None], column_ids[None, :]]
+                matrix[rows[:, None], column_ids[None, :]] = np.where(np.isnan(new_values), current, new_values)
+
+                self._write_partition(year, month_number, all_dates, matrix)
+
+        self.logger.debug(f"Stored {len(frame)} daily rows for {len(frame.columns)} symbols in price warehouse")
+        return len(frame)
+
+    def iter_partitions(self, start=None, end=None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield memory-mapped (dates, closes) views restricted to [start, end]
+
+        Row slicing keeps the views zero-copy, which makes this the primitive for
+        cross-sectional scans over long histories.
+        """
+        start_day = np.datetime64(pd.Timestamp(start).date(), "D") if start is not None else None
+        end_day = np.datetime64(pd.Timestamp(end).date(), "D") if end is not None else None
+
+        for year, month in self.partitions():
+            month_start = np.datetime64(f"{year:04d}-{month:02d}", "M")
+            if start_day is not None and month_start < start_day.astype("datetime64[M]"):
+                continue
+            if end_day is not None and month_start > end_day.astype("datetime64[M]"):
+                continue
+
+            partition = self.load_partition(year, month)
+            if partition is None:
+                continue
+            dates, closes = partition
+            lo = 0 if start_day is None else int(np.searchsorted(dates, start_day, side="left"))
+            hi = len(dates) if end_day is None else int(np.searchsorted(dates, end_day, side="right"))
+            if lo < hi:
+                yield dates[lo:hi], closes[lo:hi]
+
+    def _select_columns(self, closes: np.ndarray, column_ids: Optional[np.ndarray]) -> np.ndarray:
+        if column_ids is None:
+            if closes.shape[1] == len(self._symbols):
+                return closes
+            padded = np.full((closes.shape[0], len(self._symbols)), np.nan, dtype=np.float32)
+            padded[:, :closes.shape[1]] = closes
+            return padded
+
+        selected = np.full((closes.shape[0], len(column_ids)), np.nan, dtype=np.float32)
+        present = column_ids < closes.shape[1]
+        selected[:, present] = closes[:, column_ids[present]]
+        return selected
+
+    def _resolve_columns(self, symbols: Optional[Sequence[str]]) -> Tuple[List[str], Optional[np.ndarray]]:
+        if symbols is None:
+            return list(self._symbols), None
+        known = [symbol for symbol in symbols if symbol in self._symbol_ids]
+        return known, np.array([self._symbol_ids[symbol] for symbol in known], dtype=np.int64)
+
+    def query(self, start=None, end=None, symbols: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Return closes between start and end (inclusive) as a dates x symbols frame
+
+        Symbols never stored are left out of the result. A range inside a single
+        partition with all symbols selected is returned without copying.
+        """
+        columns, column_ids = self._resolve_columns(symbols)
+        blocks = []
+        for dates, closes in self.iter_partitions(start, end):
+            blocks.append((dates, self._select_columns(closes, column_ids)))
+
+        if not blocks:
+            return pd.DataFrame(columns=columns, dtype=np.float32)
+
+        if len(blocks) == 1:
+            dates, matrix = blocks[0]
+        else:
+            dates = np.concatenate([block[0] for block in blocks])
+            matrix = np.concatenate([block[1] for block in blocks])
+
+        index = pd.DatetimeIndex(dates.astype("datetime64[ns]"), name="Date")
+        return pd.DataFrame(matrix, index=index, columns=columns, copy=False)
+
+    def cross_section(self, date, symbols: Optional[Sequence[str]] = None) -> pd.Series:
+        """Return the closes of every (or the given) symbol on one day"""
+        columns, column_ids = self._resolve_columns(symbols)
+        for dates, closes in self.iter_partitions(date, date):
+            row = self._select_columns(closes, column_ids)[0]
+            return pd.Series(row, index=columns, name=pd.Timestamp(dates[0]), copy=False)
+        return pd.Series(np.nan, index=columns, dtype=np.float32, name=pd.Timestamp(date))
+
+    def latest_date(self, symbols: Optional[Sequence[str]] = None) -> Optional[pd.Timestamp]:
+        """Most recent day with a stored price for any of the symbols (default all), if any"""
+        _, column_ids = self._resolve_columns(symbols)
+        if column_ids is not None and not len(column_ids):
+            return None
+        for year, month in reversed(self.partitions()):
+            dates, closes = self.load_partition(year, month)
+            stored = np.flatnonzero(~np.isnan(self._select_columns(closes, column_ids)).all(axis=1))
+            if len(stored):
+                return pd.Timestamp(dates[stored[-1]])
+        return None
+
+    def latest_dates(self, symbols: Sequence[str]) -> pd.Series:
+        """Most recent day with a stored price for each symbol, NaT for symbols without one"""
+        latest = pd.Series(pd.NaT, index=pd.Index(symbols, dtype=object), dtype="datetime64[ns]")
+        columns, column_ids = self._resolve_columns(symbols)
+        pending = np.ones(len(columns), dtype=bool)
+        for year, month in reversed(self.partitions()):
+            if not pending.any():
+                break
+            dates, closes = self.load_partition(year, month)
+            stored = ~np.isnan(self._select_columns(closes, column_ids))
+            found = pending & stored.any(axis=0)
+            if found.any():
+                # Index of the last stored row per column: rows are sorted by date
+                last_rows = len(dates) - 1 - np.argmax(stored[::-1], axis=0)
+                for position in np.flatnonzero(found):
+                    latest[columns[position]] = pd.Timestamp(dates[last_rows[position]])
+                pending &= ~found
+        return latest
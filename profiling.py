@@ -0,0 +1,217 @@
+"""
+Profiling hooks for Stock Tracker runs
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+# pstats keys functions as (filename, line, name)
+FunctionKey = Tuple[str, int, str]
+
+MAX_STACK_DEPTH = 64
+
+# Call paths carrying less than this share of the profile's time are left out of collapsed stacks
+MIN_STACK_SHARE = 0.001
+
+
+def _frame_label(key: FunctionKey) -> str:
+    filename, line, name = key
+    if filename == '~':
+        return name.strip('<>')
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats: pstats.Stats, min_share: float = MIN_STACK_SHARE) -> Dict[str, float]:
+    """Approximate flamegraph stacks (``a;b;c`` -> seconds) from cProfile's call graph
+
+    cProfile only records caller/callee pairs, not whole stacks, so each
+    function's own time is split over the paths reaching it in proportion to
+    the time each caller spent in it. The number of paths grows
+    exponentially with the width of the call graph, so a path is not
+    followed once the time flowing down it drops below ``min_share`` of the
+    profile's total. Time along a path only shrinks with depth, which keeps
+    the walk to about ``MAX_STACK_DEPTH / min_share`` paths.
+    """
+    raw = stats.stats
+    callees: Dict[FunctionKey, Dict[FunctionKey, float]] = {}
+    for function, (_, _, _, cumulative, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[function] = edge[3]
+
+    total = sum(entry[2] for entry in raw.values())
+    cutoff = total * min_share
+    stacks: Counter = Counter()
+
+    def walk(function: FunctionKey, path: Tuple[str, ...], share: float, seen: frozenset) -> None:
+        _, _, own, cumulative, _ = raw[function]
+        path = path + (_frame_label(function),)
+        if own * share > 0:
+            stacks[';'.join(path)] += own * share
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_time in callees.get(function, {}).items():
+            callee_cumulative = raw[callee][3]
+            if callee in seen or callee_cumulative <= 0:
+                continue
+            callee_share = share * min(edge_time / callee_cumulative, 1.0)
+            if callee_cumulative * callee_share < cutoff:
+                continue
+            walk(callee, path, callee_share, seen | {callee})
+
+    roots = [function for function, entry in raw.items() if not entry[4]]
+    for root in roots:
+        walk(root, (), 1.0, frozenset([root]))
+    return dict(stacks)
+
+
+def write_collapsed(stacks: Dict[str, float], path: str, scale: float = 1e6) -> None:
+    """Write stacks in Brendan Gregg's collapsed format (weights in microseconds by default)"""
+    with open(path, 'w') as f:
+        for stack, weight in sorted(stacks.items()):
+            count = int(round(weight * scale))
+            if count:
+                f.write(f"{stack} {count}\n")
+
+
+class StageProfiler:
+    """Wrap tracker stages in cProfile and report where the time went
+
+    Each stage writes ``<prefix>_<stage>.prof`` (for snakeviz, pstats, ...)
+    and ``<prefix>_<stage>.collapsed`` (for flamegraph.pl or speedscope) to
+    ``output_dir``, and logs its top hotspots by own time. A disabled
+    profiler costs nothing.
+    """
+
+    def __init__(self, logger: logging.Logger, output_dir: str = "logs", top_n: int = 15, enabled: bool = True):
+        self.logger = logger
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.enabled = enabled
+        self.prefix = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.timings: Dict[str, float] = {}
+
+    def stage(self, name: str):
+        """Context manager profiling one stage"""
+        if not self.enabled:
+            return nullcontext()
+        return self._profile(name)
+
+    @contextmanager
+    def _profile(self, name: str):
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.timings[name] = time.perf_counter() - start
+            try:
+                self._report(name, profile)
+            except Exception as e:
+                self.logger.warning(f"Could not write profile for {name}: {e}")
+
+    def _report(self, name: str, profile: cProfile.Profile) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{self.prefix}_{name}")
+        profile.dump_stats(f"{base}.prof")
+
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        write_collapsed(collapsed_stacks(stats), f"{base}.collapsed")
+
+        stats.sort_stats(pstats.SortKey.TIME)
+        lines = [f"Profile of {name}: {self.timings[name]:.3f}s, top {self.top_n} by own time ({base}.prof)"]
+        for function in stats.fcn_list[:self.top_n]:
+            calls, _, own, cumulative, _ = stats.stats[function]
+            lines.append(f"  {own:8.3f}s own {cumulative:8.3f}s cum {calls:>9} calls  {_frame_label(function)}")
+        self.logger.info("\n".join(lines))
+
+
+class SamplingProfiler:
+    """Low-overhead stack sampler for long-running modes
+
+    A background thread records the target thread's stack every
+    ``interval`` seconds. Samples are flushed to a collapsed-stack file and
+    the hottest functions are logged every ``flush_interval`` seconds and on
+    stop, so a daemon can be profiled in place without cProfile's overhead.
+    """
+
+    def __init__(self, logger: logging.Logger, output_dir: str = "logs", name: str = "stream",
+                 interval: float = 0.01, flush_interval: float = 300.0, top_n: int = 15):
+        self.logger = logger
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.top_n = top_n
+        self.path = os.path.join(output_dir, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{name}.collapsed")
+        self.samples: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._target_id: Optional[int] = None
+
+    def start(self, thread: Optional[threading.Thread] = None) -> "SamplingProfiler":
+        self._target_id = (thread or threading.current_thread()).ident
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Sampling profiler every {self.interval * 1000:.0f}ms, writing {self.path}")
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self._target_id)
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if stack:
+            with self._lock:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        last_flush = time.monotonic()
+        while not self._stop.wait(self.interval):
+            self._sample()
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        """Rewrite the collapsed-stack file and log the hottest functions so far"""
+        with self._lock:
+            samples = dict(self.samples)
+        if not samples:
+            return
+
+        write_collapsed(samples, self.path, scale=1)
+
+        own: Counter = Counter()
+        for stack, count in samples.items():
+            own[stack.rsplit(';', 1)[-1]] += count
+        total = sum(samples.values())
+        lines = [f"Sampled profile: {total} samples, top {self.top_n} by own time ({self.path})"]
+        for function, count in own.most_common(self.top_n):
+            lines.append(f"  {count / total:6.1%} {count:>8} samples  {function}")
+        self.logger.info("\n".join(lines))
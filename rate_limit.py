@@ -0,0 +1,159 @@
+"""
+Rate limiting, adaptive limits and circuit breaking for price requests
+"""
+import threading
+import time
+from typing import Callable, Dict
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a host whose circuit breaker is open"""
+
+
+class TokenBucket:
+    """Token bucket allowing ``rate`` requests per second with bursts of ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens, sleeping until they are available; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def set_rate(self, rate: float) -> None:
+        """Change the refill rate; tokens earned so far accrue at the old rate"""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if they are available now, without waiting"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+
+class AIMDController:
+    """Limit that grows additively on success and shrinks multiplicatively on failure
+
+    Used for request rate, download concurrency and chunk size, so each
+    settles just under the level where the host starts to push back.
+    """
+
+    def __init__(self, initial: float, minimum: float, maximum: float,
+                 increase: float = 1.0, decrease: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self._value = min(max(initial, minimum), maximum)
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def on_success(self) -> float:
+        with self._lock:
+            self._value = min(self.maximum, self._value + self.increase)
+            return self._value
+
+    def on_failure(self) -> float:
+        with self._lock:
+            self._value = max(self.minimum, self._value * self.decrease)
+            return self._value
+
+
+class CircuitBreaker:
+    """Stop calling a host after repeated failures, probing it again after a pause
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    ``allow`` refuses calls for ``reset_timeout`` seconds. It then lets a
+    single probe through (half-open): a success closes the circuit, a
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(host: str, failure_threshold: int = 5, reset_timeout: float = 60.0) -> CircuitBreaker:
+    """Shared circuit breaker for a host, created on first use"""
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(failure_threshold, reset_timeout)
+        return _breakers[host]
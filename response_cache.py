@@ -0,0 +1,151 @@
+"""
+On-disk cache of price responses with TTLs and LRU eviction
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from storage import file_lock
+
+
+class ResponseCache:
+    """Price frames keyed by request, stored as .npz files under ``directory``
+
+    An ``index.json`` records each entry's file, size, expiry and last access.
+    Reads and writes of the index happen under a file lock so concurrent runs
+    share the cache. When the cached files exceed ``max_bytes`` the least
+    recently used entries are evicted. Hits, misses and evictions are
+    counted for the lifetime of the cache object.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, directory: str, logger: logging.Logger, max_bytes: int):
+        self.directory = directory
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, self.INDEX_FILE)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(provider: str, symbols: Sequence[str], interval: str, start, end) -> str:
+        """Stable key for a request; symbol order does not matter"""
+        start = pd.Timestamp(start).date().isoformat()
+        end = pd.Timestamp(end).date().isoformat()
+        request = "|".join([provider, interval, start, end, ",".join(sorted(symbols))])
+        return hashlib.sha1(request.encode("utf-8")).hexdigest()
+
+    def _load_index(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable response cache index: {e}")
+            return {}
+
+    def _save_index(self, index: Dict[str, Dict]) -> None:
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _remove(self, index: Dict[str, Dict], key: str) -> None:
+        entry = index.pop(key)
+        try:
+            os.remove(os.path.join(self.directory, entry["file"]))
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Cached frame for a key, or None if absent or expired"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, pd.DataFrame]:
+        """Cached frames of the keys that are present and unexpired, reading the index once"""
+        now = time.time()
+        frames = {}
+        with file_lock(self.index_path):
+            index = self._load_index()
+            for key in keys:
+                entry = index.get(key)
+                if entry is not None and entry["expires"] <= now:
+                    self._remove(index, key)
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    continue
+
+                try:
+                    with np.load(os.path.join(self.directory, entry["file"]), allow_pickle=False) as data:
+                        frames[key] = pd.DataFrame(data["closes"],
+                                                   index=pd.DatetimeIndex(data["dates"], name="Date"),
+                                                   columns=data["symbols"].tolist())
+                except (OSError, ValueError, KeyError) as e:
+                    self.logger.warning(f"Dropping unreadable response cache entry {key}: {e}")
+                    self._remove(index, key)
+                    self.misses += 1
+                    continue
+
+                entry["accessed"] = now
+                self.hits += 1
+
+            if keys:
+                self._save_index(index)
+        return frames
+
+    def put(self, key: str, frame: pd.DataFrame, ttl: float) -> None:
+        """Store a frame for ``ttl`` seconds, evicting least recently used entries to stay in budget"""
+        self.put_many({key: frame}, ttl)
+
+    def put_many(self, frames: Dict[str, pd.DataFrame], ttl: float) -> None:
+        """Store frames by key for ``ttl`` seconds, updating the index once"""
+        if ttl <= 0:
+            return
+
+        written = {}
+        for key, frame in frames.items():
+            if frame.empty:
+                continue
+            filename = f"{key}.npz"
+            path = os.path.join(self.directory, filename)
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(tmp_path,
+                     dates=pd.DatetimeIndex(frame.index).to_numpy(dtype="datetime64[ns]"),
+                     closes=frame.to_numpy(dtype=np.float64),
+                     symbols=np.array([str(column) for column in frame.columns]))
+            os.replace(tmp_path, path)
+            written[key] = {"file": filename, "size": os.path.getsize(path)}
+        if not written:
+            return
+
+        now = time.time()
+        with file_lock(self.index_path):
+            index = self._load_index()
+            for key, entry in written.items():
+                index[key] = {**entry, "expires": now + ttl, "accessed": now}
+
+            total = sum(entry["size"] for entry in index.values())
+            for stale in sorted(index, key=lambda k: index[k]["accessed"]):
+                if total <= self.max_bytes:
+                    break
+                if stale in written:
+                    continue
+                total -= index[stale]["size"]
+                self._remove(index, stale)
+                self.evictions += 1
+
+            self._save_index(index)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
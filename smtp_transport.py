@@ -0,0 +1,104 @@
+"""
+SMTP transport used when the Elastic Email HTTP API is unavailable
+"""
+import logging
+import smtplib
+import ssl
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
+from typing import List, Optional
+
+from config import EmailConfig
+
+
+class SMTPTransport:
+    """Send mail over one authenticated, reused SMTP connection
+
+    The connection is opened (STARTTLS, then login) on first use and kept
+    for later messages, so a burst of alerts pays the TCP, TLS and AUTH
+    round trips once. It is replaced after ``smtp_idle_seconds`` without
+    traffic, since servers drop idle sessions, after ``smtp_max_messages``
+    messages, and whenever the server disconnects. Sends are serialized on
+    the connection.
+    """
+
+    def __init__(self, config: EmailConfig, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._sent_on_connection = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.config.smtp_host, self.config.smtp_port, timeout=self.config.smtp_timeout)
+        try:
+            smtp.ehlo()
+            if self.config.smtp_starttls:
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            if self.config.smtp_username:
+                smtp.login(self.config.smtp_username, self.config.smtp_password)
+        except Exception:
+            smtp.close()
+            raise
+        self.logger.debug(f"Opened SMTP connection to {self.config.smtp_host}:{self.config.smtp_port}")
+        self._sent_on_connection = 0
+        return smtp
+
+    def _disconnect(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    def _connection(self) -> smtplib.SMTP:
+        stale = time.monotonic() - self._last_used > self.config.smtp_idle_seconds
+        if self._smtp is not None and (stale or self._sent_on_connection >= self.config.smtp_max_messages):
+            self._disconnect()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def _message(self, subject: str, text: str, html: Optional[str], recipients: List[str]) -> EmailMessage:
+        message = EmailMessage()
+        message['Subject'] = subject
+        message['From'] = formataddr((self.config.sender_name, self.config.sender_email))
+        message['To'] = ', '.join(recipients)
+        message['Message-ID'] = make_msgid(domain=self.config.sender_email.rpartition('@')[2] or None)
+        message.set_content(text)
+        if html is not None:
+            message.add_alternative(html, subtype='html')
+        return message
+
+    def send(self, subject: str, text: str, html: Optional[str], recipients: List[str]) -> bool:
+        """Send one message, reconnecting once if the server dropped the connection"""
+        message = self._message(subject, text, html, recipients)
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    self._connection().send_message(message)
+                    self._sent_on_connection += 1
+                    self._last_used = time.monotonic()
+                    return True
+                except smtplib.SMTPServerDisconnected as e:
+                    self._smtp = None
+                    if attempt:
+                        self.logger.error(f"SMTP server disconnected: {e}")
+                except smtplib.SMTPRecipientsRefused as e:
+                    self.logger.error(f"SMTP refused recipients {', '.join(e.recipients)}")
+                    return False
+                except (smtplib.SMTPException, OSError) as e:
+                    self.logger.error(f"SMTP send failed: {e}")
+                    self._disconnect()
+                    return False
+        return False
+
+    def close(self) -> None:
+        with self._lock:
+            self._disconnect()
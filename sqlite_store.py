@@ -0,0 +1,261 @@
+"""
+SQLite backend for portfolio state and alert history
+"""
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from itertools import islice
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from alerts import ALERT_SEVERITIES
+from storage import STATE_COLUMNS, CSVStateStore, StateStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    symbol TEXT PRIMARY KEY,
+    tolerance REAL NOT NULL,
+    added TEXT
+);
+CREATE TABLE IF NOT EXISTS highs (
+    symbol TEXT PRIMARY KEY REFERENCES symbols(symbol) ON DELETE CASCADE,
+    high REAL,
+    high_date TEXT,
+    close REAL,
+    updated TEXT
+);
+CREATE TABLE IF NOT EXISTS alert_history (
+    alert_id TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    alert_type TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    value REAL,
+    created_at TEXT NOT NULL,
+    resolved_at TEXT
+);
+CREATE TABLE IF NOT EXISTS delivery_events (
+    msg_id TEXT NOT NULL,
+    recipient TEXT,
+    event_type TEXT NOT NULL,
+    event_date TEXT NOT NULL,
+    subject TEXT,
+    channel TEXT,
+    PRIMARY KEY (msg_id, event_type, event_date)
+);
+CREATE INDEX IF NOT EXISTS idx_symbols_tolerance ON symbols(tolerance);
+CREATE INDEX IF NOT EXISTS idx_highs_updated ON highs(updated);
+CREATE INDEX IF NOT EXISTS idx_highs_high_date ON highs(high_date);
+CREATE INDEX IF NOT EXISTS idx_alert_history_symbol ON alert_history(symbol, created_at);
+CREATE INDEX IF NOT EXISTS idx_alert_history_created ON alert_history(created_at);
+CREATE INDEX IF NOT EXISTS idx_alert_history_open ON alert_history(symbol, alert_type) WHERE resolved_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_delivery_events_date ON delivery_events(event_date);
+"""
+
+
+def _text(value) -> Optional[str]:
+    """Store dates as ISO strings and missing values as NULL"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    value = str(value)
+    return value or None
+
+
+def _real(value) -> Optional[float]:
+    return None if value is None or pd.isna(value) else float(value)
+
+
+class SQLiteStateStore(StateStore):
+    """Portfolio state in an embedded SQLite database
+
+    Runs in WAL mode so readers (ad-hoc queries, reports) never block the
+    tracker's writes. ``save`` upserts only the rows that changed, with one
+    ``executemany`` per table. On first use an existing data CSV is
+    imported so switching backends keeps the recorded highs.
+    """
+
+    def __init__(self, config, logger: logging.Logger):
+        super().__init__(config, logger)
+        self.path = config.database_file
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        # The schema is created below, so whether the state exists is decided by the file
+        self._existed = os.path.exists(self.path)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+        self._import_csv()
+
+    def connection(self) -> sqlite3.Connection:
+        """Per-thread connection; use as a context manager for a transaction"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Used only by its own thread, but close() may run on another one
+            conn = sqlite3.connect(self.path, timeout=self.config.lock_timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close the connections opened by every thread"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def _import_csv(self) -> None:
+        csv_store = CSVStateStore(self.config, self.logger)
+        if self._has_rows() or not csv_store.exists():
+            return
+        df = csv_store.load()
+        if df.empty:
+            return
+        self._write(df, df.index, pd.Index([]))
+        self.logger.info(f"Imported {len(df)} symbols from {self.config.data_file} into {self.path}")
+
+    def _has_rows(self) -> bool:
+        return self.connection().execute("SELECT 1 FROM symbols LIMIT 1").fetchone() is not None
+
+    def exists(self) -> bool:
+        """True once the database was created by an earlier run or holds symbols, even if none are tracked now"""
+        return self._existed or self._has_rows()
+
+    def _read(self) -> pd.DataFrame:
+        query = """
+            SELECT s.symbol, h.high, h.high_date, h.close, s.tolerance, h.updated
+            FROM symbols s LEFT JOIN highs h ON h.symbol = s.symbol
+            ORDER BY s.symbol
+        """
+        return pd.read_sql_query(query, self.connection(), index_col='symbol')[STATE_COLUMNS]
+
+    def _write(self, df: pd.DataFrame, dirty: pd.Index, removed: pd.Index) -> None:
+        rows = df.loc[dirty]
+        added = date.today().isoformat()
+
+        symbol_rows = [(str(symbol), _real(row['tolerance']), added) for symbol, row in rows.iterrows()]
+        high_rows = [
+            (str(symbol), _real(row['high']), _text(row['high_date']), _real(row['close']), _text(row['updated']))
+            for symbol, row in rows.iterrows()
+        ]
+
+        conn = self.connection()
+        with conn:
+            if len(removed):
+                conn.executemany("DELETE FROM symbols WHERE symbol = ?", [(str(symbol),) for symbol in removed])
+            conn.executemany("""
+                INSERT INTO symbols (symbol, tolerance, added) VALUES (?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET tolerance = excluded.tolerance
+            """, symbol_rows)
+            conn.executemany("""
+                INSERT INTO highs (symbol, high, high_date, close, updated) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    high = excluded.high, high_date = excluded.high_date,
+                    close = excluded.close, updated = excluded.updated
+            """, high_rows)
+
+    def record_alerts(self, alerts: Dict[str, List], evaluated: Optional[Iterable[str]] = None) -> int:
+        """Record the alerts of one run in the alert history
+
+        An alert still open for the same symbol and type is updated with the
+        latest value instead of being added again. When ``evaluated`` names
+        the symbols the run checked, their open alerts of the given types
+        that did not fire again are resolved.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        firing = {(str(symbol), alert_type): _real(value)
+                  for alert_type, entries in alerts.items()
+                  for symbol, value in entries}
+        conn = self.connection()
+        with conn:
+            # History written before alerts were upserted may hold several open rows per symbol and type
+            open_alerts: Dict[tuple, List[str]] = {}
+            for alert_id, symbol, alert_type in conn.execute(
+                    "SELECT alert_id, symbol, alert_type FROM alert_history WHERE resolved_at IS NULL"):
+                open_alerts.setdefault((symbol, alert_type), []).append(alert_id)
+            conn.executemany("UPDATE alert_history SET value = ? WHERE alert_id = ?", [
+                (value, alert_id) for key, value in firing.items() for alert_id in open_alerts.get(key, [])
+            ])
+            conn.executemany("""
+                INSERT INTO alert_history (alert_id, symbol, alert_type, severity, value, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(uuid.uuid4().hex, symbol, alert_type, ALERT_SEVERITIES.get(alert_type, 'low'), value, now)
+                  for (symbol, alert_type), value in firing.items() if (symbol, alert_type) not in open_alerts])
+            if evaluated is not None:
+                checked = {str(symbol) for symbol in evaluated}
+                conn.executemany("UPDATE alert_history SET resolved_at = ? WHERE alert_id = ?", [
+                    (now, alert_id) for (symbol, alert_type), alert_ids in open_alerts.items()
+                    if alert_type in alerts and symbol in checked and (symbol, alert_type) not in firing
+                    for alert_id in alert_ids
+                ])
+        return len(firing)
+
+    def record_delivery_events(self, events: Iterable[Dict], batch_size: int = 1000) -> int:
+        """Insert Elastic Email delivery events (RecipientEvent dicts), one batch at a time
+
+        ``events`` may be a paginating iterator; at most ``batch_size`` events
+        are held at once. Events already recorded are skipped, so overlapping
+        windows can be synced again.
+        """
+        conn = self.connection()
+        events = iter(events)
+        recorded = 0
+        while True:
+            rows = [
+                (event['MsgID'], event.get('To'), event['EventType'], event['EventDate'],
+                 event.get('Subject'), event.get('Channel'))
+                for event in islice(events, batch_size)
+            ]
+            if not rows:
+                return recorded
+            with conn:
+                before = conn.total_changes
+                conn.executemany("""
+                    INSERT OR IGNORE INTO delivery_events (msg_id, recipient, event_type, event_date, subject, channel)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, rows)
+                recorded += conn.total_changes - before
+
+    def symbols_with_high_since(self, since) -> List[str]:
+        """Symbols whose recorded high was set on or after a date"""
+        cursor = self.connection().execute(
+            "SELECT symbol FROM highs WHERE high_date >= ? ORDER BY symbol", (_text(since),))
+        return [symbol for (symbol,) in cursor]
+
+    def symbols_with_tolerance_below(self, tolerance: float) -> List[str]:
+        cursor = self.connection().execute(
+            "SELECT symbol FROM symbols WHERE tolerance < ? ORDER BY symbol", (tolerance,))
+        return [symbol for (symbol,) in cursor]
+
+    def stale_symbols(self, before) -> List[str]:
+        """Symbols not updated since a date"""
+        cursor = self.connection().execute(
+            "SELECT symbol FROM highs WHERE updated IS NULL OR updated < ? ORDER BY symbol", (_text(before),))
+        return [symbol for (symbol,) in cursor]
+
+    def alert_history(self, symbol: Optional[str] = None, since=None) -> pd.DataFrame:
+        clauses, params = [], []
+        if symbol is not None:
+            clauses.append("symbol = ?")
+            params.append(symbol)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(_text(since))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return pd.read_sql_query(f"SELECT * FROM alert_history {where} ORDER BY created_at", self.connection(),
+                                 params=params)
@@ -1,11 +1,16 @@
 import glob
+import logging
 import smtplib
 from email.message import EmailMessage
 import sys
 import pandas as pd
-import nsepy
 import datetime
 from pandas.tseries.offsets import BDay
+from data_provider import NSEProvider
+from portfolio import apply_window_closes
+
+# One NSE provider (and thread pool) for the whole run
+_provider = None
 
 
 def get_investments():
@@ -118,21 +123,19 @@ def notify(subject, body):
 
 
 def update_price():
-    # get the history
+    # get the history for the last 5 trading days, all tickers fetched concurrently
     curr_day = datetime.datetime.today()
     prev_day = curr_day - BDay(5)
-    ticker_hist = pd.DataFrame()
 
     symbol_list = pd.read_csv('data/data.csv', index_col='symbol')
 
-    for ticker in symbol_list.index:
-        ticker_hist = nsepy.get_history(symbol=ticker, start=prev_day, end=curr_day)
-        # check if the normalized high from ticker_hist is greater than the one recorded in investments
-        # update if the normalized close is higher than the recorded high
-        symbol_list.loc[ticker, 'close'] = ticker_hist['Close'].min()
-        symbol_list.loc[ticker, 'updated'] = datetime.date.today()
-        if ticker_hist['Close'].min() > symbol_list.loc[ticker, 'high']:
-            symbol_list.loc[ticker, 'high'] = ticker_hist['Close'].min()
+    global _provider
+    if _provider is None:
+        _provider = NSEProvider(logging.getLogger('stock_tracker'))
+    ticker_hist = _provider.fetch_closes(symbol_list.index.tolist(), prev_day, curr_day)
+
+    # record the lowest close of the window and raise the high where the window minimum exceeds it
+    apply_window_closes(symbol_list, ticker_hist)
 
     symbol_list.to_csv('data/data.csv')
 
@@ -144,7 +147,11 @@ def main():
     if args == '--u':
         get_investments()
         update_meta()
-    update_price()
+    try:
+        update_price()
+    finally:
+        if _provider is not None:
+            _provider.close()
     calculate_variance()
 
 
@@ -3,39 +3,184 @@ Improved Stock Tracker with better error handling, logging, and configuration
 """
 import glob
 import sys
-import yfinance as yf
+import argparse
+import time
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
-from pandas.tseries.offsets import BDay
 from typing import List, Tuple, Optional, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 
 from config import Config
 from logger import setup_logger
-from email_service import EmailService
+from email_service import Digest, EmailService
+from delivery import DeliveryReconciler, OutboundLog, undelivered_breaches
+from notifier import create_notifier
+from price_warehouse import PriceWarehouse
+from response_cache import ResponseCache
+from negative_cache import NegativeCache
+from data_provider import AdaptiveProvider, CachedProvider, NSEProvider, PartialFetchError, YahooFinanceProvider
+from portfolio import apply_window_closes, new_portfolio_rows, to_portfolio
+from storage import atomic_write_csv, create_state_store
+from alert_templates import AlertRenderer
+from alerts import STAGNANT, TOLERANCE_BREACH, drawdown_categories, drawdown_pct, empty_alerts, is_stagnant
+from backfill import Backfiller
+from profiling import SamplingProfiler, StageProfiler
+from stream_evaluator import AlertEvent, StreamEvaluator, open_source
+from what_if import alert_counts, format_counts, parameter_sets, parse_what_if
+from trading_calendar import calendar_days_between, to_days
+from symbol_registry import FetchBatch, SymbolRegistry, normalize_symbol
 
 
 class StockTracker:
     """Main stock tracking class with improved error handling and logging"""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, profile: bool = False, profile_top: int = 15):
         self.config = config
         self.logger = setup_logger()
-        self.email_service = EmailService(config.email, self.logger)
+        self.outbound = OutboundLog(config.tracker.outbound_log_file, self.logger,
+                                    config.tracker.delivery_check_seconds,
+                                    config.tracker.delivery_max_check_minutes * 60,
+                                    config.tracker.delivery_timeout_hours * 3600,
+                                    config.tracker.delivery_retention_days * 86400)
+        self.email_service = EmailService(config.email, self.logger, self.outbound)
+        self.reconciler = DeliveryReconciler(self.outbound, config.email, self.logger,
+                                             config.tracker.delivery_batch_size,
+                                             on_undelivered=self._resend_undelivered)
+        self.renderer = AlertRenderer(config.tracker)
+        # Looked up on each send so a replaced _send_alerts (as the pipeline benchmark does) still applies
+        self.notifier = create_notifier(config.tracker, config.email, self.email_service,
+                                        lambda alerts: self._send_alerts(alerts), self.renderer, self.logger)
+        self.profile = profile
+        self.profiler = StageProfiler(self.logger, top_n=profile_top, enabled=profile)
         
         # Ensure data directories exist
         os.makedirs(self.config.tracker.data_dir, exist_ok=True)
         os.makedirs(self.config.tracker.input_dir, exist_ok=True)
+        
+        self.store = create_state_store(self.config.tracker, self.logger)
+        self.warehouse = PriceWarehouse(self.config.tracker.history_dir, self.logger)
+        self.registry = SymbolRegistry(holidays_file=self.config.tracker.holidays_file)
+        self.price_cache = ResponseCache(self.config.tracker.price_cache_dir, self.logger,
+                                         int(self.config.tracker.price_cache_max_mb * 2**20))
+        self.negative_cache = NegativeCache(self.config.tracker.negative_cache_file, self.logger,
+                                            self.config.tracker.negative_probe_hours * 3600,
+                                            self.config.tracker.negative_max_probe_days * 86400,
+                                            self.config.tracker.health_summary_days * 86400)
+        yahoo = AdaptiveProvider(YahooFinanceProvider(self.logger), self.logger, self.config.tracker)
+        self.providers = {YahooFinanceProvider.name: CachedProvider(yahoo, self.logger, self.price_cache, self.registry,
+                                                                    self.config.tracker.price_cache_open_ttl,
+                                                                    self.config.tracker.price_cache_closed_ttl)}
+        if NSEProvider.available():
+            self.providers[NSEProvider.name] = NSEProvider(self.logger, self.config.tracker.nse_workers,
+                                                           self.config.tracker.nse_timeout)
     
     def days_between(self, d1: str, d2: str) -> int:
         """Calculate days between two date strings"""
-        try:
-            date1 = datetime.strptime(d1, "%Y-%m-%d")
-            date2 = datetime.strptime(d2, "%Y-%m-%d")
-            return abs((date2 - date1).days)
-        except ValueError as e:
-            self.logger.error(f"Error parsing dates {d1}, {d2}: {e}")
+        days = calendar_days_between(d1, d2)
+        if np.isnan(days):
+            self.logger.error(f"Error parsing dates {d1}, {d2}")
             return 0
+        return int(days)
+    
+    def _stale_symbols(self, symbol_list: pd.DataFrame, plan: Dict[str, List[FetchBatch]], curr_day: datetime) -> List[str]:
+        """Symbols whose exchange has closed a session after their last stored daily bar
+        
+        Symbols never updated are always stale. The warehouse only holds bars
+        of closed sessions (see ``SymbolRegistry.final_bars``), so a run during
+        a session still fetches that session's close later.
+        """
+        never_updated = symbol_list.index[np.isnat(to_days(symbol_list['updated']))]
+        stale = set(never_updated)
+        for batches in plan.values():
+            symbols = [symbol for batch in batches for symbol in batch.symbols]
+            latest = to_days(self.warehouse.latest_dates(symbols))
+            last_closed = to_days(batches[0].calendar.last_closed_session(curr_day))
+            behind = np.isnat(latest) | (latest < last_closed)
+            stale.update(symbol for symbol, is_behind in zip(symbols, behind) if is_behind)
+        return [symbol for symbol in symbol_list.index if symbol in stale]
+    
+    def _state_lock(self):
+        """Lock serializing read-modify-write cycles on the tracker's state"""
+        return self.store.lock()
+    
+    def _save_csv(self, df: pd.DataFrame, path: str) -> None:
+        """Atomically replace a state file, keeping rolling snapshots of it"""
+        atomic_write_csv(df, path, self.config.tracker.snapshot_dir, self.config.tracker.snapshot_count)
+    
+    def _fetch_venue(self, batches: List[FetchBatch], curr_day: datetime) -> Tuple[List[pd.DataFrame], List[str]]:
+        """Fetch one exchange's batches in turn, paced by its route
+
+        Returns the fetched frames and the symbols of batches, or of chunks
+        within them, that failed or came back empty, which say nothing about
+        the symbols themselves.
+        """
+        frames = []
+        failed = []
+        prev_day = batches[0].calendar.window_start(curr_day.date(), self.config.tracker.lookback_days)
+        
+        for position, batch in enumerate(batches):
+            if position and batch.route.min_interval:
+                time.sleep(batch.route.min_interval)
+            
+            # Venues whose preferred provider is not installed fall back to Yahoo
+            provider = self.providers.get(batch.route.provider, self.providers[YahooFinanceProvider.name])
+            try:
+                close_data = provider.fetch_closes(batch.symbols, prev_day, curr_day)
+            except PartialFetchError as e:
+                # Symbols whose requests failed are reported as failed, not as missing data
+                self.logger.warning(f"Partial fetch of {batch.exchange} batch starting with {batch.symbols[0]}: {e}")
+                failed.extend(e.failed)
+                close_data = e.close_data
+            except Exception as e:
+                self.logger.error(f"Error fetching {batch.exchange} batch starting with {batch.symbols[0]}: {e}")
+                failed.extend(batch.symbols)
+                continue
+            
+            if not close_data.empty:
+                frames.append(close_data)
+            else:
+                failed.extend(batch.symbols)
+        
+        return frames, failed
+    
+    def _fetch_provider_venues(self, venues: List[List[FetchBatch]], curr_day: datetime) -> Tuple[List[pd.DataFrame], List[str]]:
+        """Fetch the exchanges served by one provider, one after another"""
+        frames = []
+        failed = []
+        for batches in venues:
+            venue_frames, venue_failed = self._fetch_venue(batches, curr_day)
+            frames.extend(venue_frames)
+            failed.extend(venue_failed)
+        return frames, failed
+    
+    def _fetch_closes(self, plan: Dict[str, List[FetchBatch]], curr_day: datetime) -> Tuple[pd.DataFrame, List[str]]:
+        """Fetch every exchange and combine the closes, with the symbols of failed batches
+        
+        Exchanges are grouped by the provider that serves them and only the
+        groups run side by side: Yahoo serializes its downloads, so exchanges
+        routed to it gain nothing from separate threads, while an exchange on
+        another provider (nsepy for NSE, when installed) is fetched alongside.
+        """
+        by_provider: Dict[str, List[List[FetchBatch]]] = {}
+        for batches in plan.values():
+            route_provider = batches[0].route.provider
+            name = route_provider if route_provider in self.providers else YahooFinanceProvider.name
+            by_provider.setdefault(name, []).append(batches)
+        
+        frames = []
+        failed = []
+        with ThreadPoolExecutor(max_workers=len(by_provider)) as executor:
+            futures = [executor.submit(self._fetch_provider_venues, venues, curr_day) for venues in by_provider.values()]
+            for future in as_completed(futures):
+                provider_frames, provider_failed = future.result()
+                frames.extend(provider_frames)
+                failed.extend(provider_failed)
+        
+        if not frames:
+            return pd.DataFrame(), failed
+        return pd.concat(frames, axis=1), failed
     
     def get_investments(self) -> bool:
         """Load and process investment files"""
@@ -70,13 +215,23 @@ class StockTracker:
                 self.logger.error("Symbol column not found in investment files")
                 return False
             
+            investments['Symbol'] = investments['Symbol'].map(normalize_symbol)
+            
+            # Keep the earliest purchase date per symbol so backfills know where history starts
+            columns = ['Symbol']
+            if 'Trade Date' in investments.columns:
+                purchase_dates = pd.to_datetime(investments['Trade Date'].astype(str), format='%Y%m%d', errors='coerce')
+                investments['purchase_date'] = purchase_dates.groupby(investments['Symbol']).transform('min').dt.date
+                columns.append('purchase_date')
+            
             investments.drop_duplicates(subset='Symbol', keep='first', inplace=True)
-            investments.drop(investments.columns[1:], axis=1, inplace=True)
+            investments = investments[columns]
             investments.set_index('Symbol', inplace=True)
             investments.sort_index(inplace=True)
             
             # Save processed investments
-            investments.to_csv(self.config.tracker.investments_file)
+            with self._state_lock():
+                self._save_csv(investments, self.config.tracker.investments_file)
             self.logger.info(f"Processed {len(investments)} unique symbols")
             
             return True
@@ -88,37 +243,31 @@ class StockTracker:
     def update_meta(self) -> List[str]:
         """Update metadata for investments"""
         try:
-            # Load current data
-            investments_df = pd.read_csv(self.config.tracker.investments_file, header=0, index_col=0)
-            
-            # Load or create data file
-            if os.path.exists(self.config.tracker.data_file):
-                data_df = pd.read_csv(self.config.tracker.data_file, header=0, index_col=0)
-            else:
-                data_df = pd.DataFrame(columns=['high', 'high_date', 'close', 'tolerance', 'updated'])
-            
-            deleted_symbols = []
-            
-            # Add new symbols
-            for symbol in investments_df.index:
-                if symbol not in data_df.index:
-                    data_df.loc[symbol] = [1, '', 1, self.config.tracker.default_tolerance, '']
-                    self.logger.info(f"Added new symbol: {symbol}")
-            
-            # Remove symbols no longer in investments
-            for symbol in data_df.index:
-                if symbol not in investments_df.index:
-                    deleted_symbols.append(symbol)
-            
-            if deleted_symbols:
-                data_df.drop(deleted_symbols, inplace=True)
-                self.logger.info(f"Removed symbols: {deleted_symbols}")
-            
-            # Save updated data
-            data_df.sort_index(inplace=True)
-            data_df.to_csv(self.config.tracker.data_file)
-            
-            return deleted_symbols
+            with self._state_lock():
+                # Load current data
+                investments_df = pd.read_csv(self.config.tracker.investments_file, header=0, index_col=0)
+                
+                # Load or create the portfolio state
+                data_df = self.store.load()
+                
+                # Symbols to add and to drop, as whole-index set operations
+                added_symbols = investments_df.index.difference(data_df.index)
+                deleted_symbols = data_df.index.difference(investments_df.index).tolist()
+                
+                if len(added_symbols):
+                    self.logger.info(f"Added symbols: {added_symbols.tolist()}")
+                
+                if deleted_symbols:
+                    self.logger.info(f"Removed symbols: {deleted_symbols}")
+                
+                new_rows = new_portfolio_rows(added_symbols, self.config.tracker.default_tolerance)
+                data_df = to_portfolio(pd.concat([data_df.drop(deleted_symbols), new_rows]))
+                
+                # Save updated data
+                data_df.sort_index(inplace=True)
+                self.store.save(data_df)
+                
+                return deleted_symbols
             
         except Exception as e:
             self.logger.error(f"Error in update_meta: {e}")
@@ -127,75 +276,80 @@ class StockTracker:
     def update_prices(self) -> bool:
         """Update stock prices from Yahoo Finance"""
         try:
-            if not os.path.exists(self.config.tracker.data_file):
-                self.logger.error(f"Data file not found: {self.config.tracker.data_file}")
+            if not self.store.exists():
+                self.logger.error(f"Portfolio state not found: {self.store.path}")
                 return False
             
-            symbol_list = pd.read_csv(self.config.tracker.data_file, index_col='symbol')
+            symbol_list = self.store.load()
             
             if symbol_list.empty:
                 self.logger.warning("No symbols to update")
                 return True
             
-            # Calculate date range
+            # Known-bad symbols wait out their back-off instead of slowing every batch
+            suppressed = self.negative_cache.suppressed(symbol_list.index)
+            ticker_list = symbol_list.index.difference(suppressed).tolist()
+            if suppressed:
+                self.logger.info(f"Skipping {len(suppressed)} symbols that recently returned no data")
+            if not ticker_list:
+                self.logger.warning("Every symbol is waiting out a re-probe interval, skipping price refresh")
+                return True
+            
+            # Group symbols by exchange; each venue uses its own calendar and pacing
             curr_day = datetime.today()
-            prev_day = curr_day - BDay(self.config.tracker.lookback_days)
+            plan = self.registry.batches(ticker_list)
             
-            # Prepare ticker string for yfinance
-            ticker_list = symbol_list.index.tolist()
-            ticker_string = ' '.join(ticker_list)
+            # Only symbols behind their exchange's last closed session are fetched
+            stale = self._stale_symbols(symbol_list.loc[ticker_list], plan, curr_day)
+            if not stale:
+                self.logger.info("No trading sessions since the last update, skipping price refresh")
+                return True
+            if len(stale) < len(ticker_list):
+                self.logger.info(f"{len(ticker_list) - len(stale)} symbols already have their latest session")
+                ticker_list = stale
+                plan = self.registry.batches(ticker_list)
             
-            self.logger.info(f"Fetching data for {len(ticker_list)} symbols from {prev_day.date()} to {curr_day.date()}")
+            self.logger.info(f"Fetching data for {len(ticker_list)} symbols across {len(plan)} exchanges: {', '.join(plan)}")
             
             # Fetch data from Yahoo Finance
             try:
-                ticker_hist = yf.download(ticker_string, start=prev_day, end=curr_day, progress=False)
+                close_data, failed_symbols = self._fetch_closes(plan, curr_day)
                 
-                if ticker_hist.empty:
+                if close_data.empty:
                     self.logger.warning("No data returned from Yahoo Finance")
                     return False
                 
-                # Handle single vs multiple tickers
-                if len(ticker_list) == 1:
-                    close_data = {ticker_list[0]: ticker_hist['Close']}
-                else:
-                    close_data = ticker_hist['Close']
-                
             except Exception as e:
                 self.logger.error(f"Error fetching data from Yahoo Finance: {e}")
                 return False
+            finally:
+                cache_stats = self.price_cache.stats()
+                self.logger.info(f"Price cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                                 f"{cache_stats['evictions']} evictions")
             
-            # Update prices
-            updated_count = 0
-            for symbol in symbol_list.index:
-                try:
-                    if symbol in close_data:
-                        prices = close_data[symbol].dropna()
-                        
-                        if not prices.empty:
-                            min_close = prices.min()
-                            symbol_list.loc[symbol, 'close'] = min_close
-                            symbol_list.loc[symbol, 'updated'] = datetime.now().date()
-                            
-                            # Update high if current minimum is higher than recorded high
-                            if min_close > symbol_list.loc[symbol, 'high']:
-                                symbol_list.loc[symbol, 'high'] = min_close
-                                symbol_list.loc[symbol, 'high_date'] = datetime.now().date()
-                                self.logger.info(f"New high for {symbol}: {min_close}")
-                            
-                            updated_count += 1
-                        else:
-                            self.logger.warning(f"No valid price data for {symbol}")
-                    else:
-                        self.logger.warning(f"Symbol {symbol} not found in Yahoo Finance data")
-                        
-                except Exception as e:
-                    self.logger.error(f"Error updating prices for {symbol}: {e}")
-                    continue
+            # Keep every fetched daily bar, not just the window minimum
+            try:
+                self.warehouse.append(self.registry.final_bars(close_data, curr_day))
+            except Exception as e:
+                self.logger.warning(f"Could not store price history: {e}")
+            
+            # Fetching happens unlocked; re-read under the lock so a concurrent run's writes are kept
+            with self._state_lock():
+                symbol_list = self.store.load()
+                
+                # Update prices for the whole portfolio at once
+                updated, new_highs = apply_window_closes(symbol_list, close_data, datetime.now().date())
+                
+                for symbol in new_highs:
+                    self.logger.info(f"New high for {symbol}: {symbol_list.loc[symbol, 'high']}")
+                
+                # Save updated data
+                self.store.save(symbol_list)
+            
+            # Symbols of failed batches were never really asked about
+            self._record_symbol_health(pd.Index(ticker_list).difference(failed_symbols), updated, close_data)
             
-            # Save updated data
-            symbol_list.to_csv(self.config.tracker.data_file)
-            self.logger.info(f"Updated prices for {updated_count} symbols")
+            self.logger.info(f"Updated prices for {len(updated)} symbols")
             
             return True
             
@@ -203,110 +357,123 @@ class StockTracker:
             self.logger.error(f"Error in update_prices: {e}")
             return False
     
+    def _record_symbol_health(self, requested: pd.Index, updated: pd.Index, close_data: pd.DataFrame) -> None:
+        """Back off symbols that returned no usable prices and report each one once"""
+        missing = requested.difference(updated)
+        no_data = [symbol for symbol in missing if symbol in close_data]
+        not_found = [symbol for symbol in missing if symbol not in close_data]
+        
+        for symbol in self.negative_cache.record_missing(no_data, "no valid price data"):
+            self.logger.warning(f"No valid price data for {symbol}, backing off")
+        for symbol in self.negative_cache.record_missing(not_found, "not found in price data"):
+            self.logger.warning(f"Symbol {symbol} not found in price data, backing off")
+        for symbol in self.negative_cache.record_found(updated):
+            self.logger.info(f"{symbol} is returning price data again")
+        
+        summary = self.negative_cache.summary()
+        if summary:
+            self.logger.warning(summary)
+        
+        try:
+            self.negative_cache.save()
+        except OSError as e:
+            self.logger.warning(f"Could not save negative cache: {e}")
+    
     def calculate_variance(self) -> bool:
         """Calculate variance and send notifications if thresholds are breached"""
         try:
-            if not os.path.exists(self.config.tracker.data_file):
-                self.logger.error(f"Data file not found: {self.config.tracker.data_file}")
+            if not self.store.exists():
+                self.logger.error(f"Portfolio state not found: {self.store.path}")
                 return False
             
-            notify_data = pd.read_csv(self.config.tracker.data_file, header=0, index_col=0)
+            notify_data = self.store.load()
             
             # Initialize alert categories
-            alerts = {
-                'tolerance_breach': [],
-                'ten_percent': [],
-                'five_percent': [],
-                'stagnant': []
-            }
+            alerts = empty_alerts()
+            
+            # Parse the date columns and compute drawdowns once for the whole portfolio
+            stagnation = calendar_days_between(notify_data['updated'], notify_data['high_date'])
+            drawdowns = drawdown_pct(notify_data['high'], notify_data['close'])
             
             # Check each stock
-            for index, row in notify_data.iterrows():
+            for position, (index, row) in enumerate(notify_data.iterrows()):
                 try:
-                    # Calculate percentage drop from high
-                    if pd.isna(row['high']) or pd.isna(row['close']) or row['high'] == 0:
+                    # Percentage drop from high
+                    diff = drawdowns[position]
+                    if np.isnan(diff):
                         continue
                     
-                    diff = ((row['high'] - row['close']) / row['high']) * 100
-                    
                     # Check stagnation
-                    if pd.notna(row['updated']) and pd.notna(row['high_date']):
-                        stagnating_days = self.days_between(str(row['updated']), str(row['high_date']))
-                        if stagnating_days > self.config.tracker.stagnation_threshold_days:
-                            alerts['stagnant'].append([index, stagnating_days])
+                    if is_stagnant(stagnation[position], self.config.tracker):
+                        alerts[STAGNANT].append([index, int(stagnation[position])])
                     
-                    # Check tolerance breach
-                    if diff > row['tolerance']:
-                        alerts['tolerance_breach'].append([index, round(diff, 2)])
-                    
-                    # Check percentage thresholds
-                    if diff >= 10:
-                        alerts['ten_percent'].append([index, round(diff, 2)])
-                    elif diff >= 5:
-                        alerts['five_percent'].append([index, round(diff, 2)])
+                    # Check tolerance breach and percentage thresholds
+                    for category in drawdown_categories(diff, row['tolerance'], self.config.tracker):
+                        alerts[category].append([index, round(float(diff), 2)])
                         
                 except Exception as e:
                     self.logger.error(f"Error processing {index}: {e}")
                     continue
             
-            # Send notifications if needed
+            # Send notifications if needed; a history write failure must not hold back an alert
+            sent = True
             if any(alerts.values()):
-                return self._send_alerts(alerts)
+                sent = self.notifier.notify(alerts)
             else:
                 self.logger.info("No alerts to send")
-                return True
+            self._record_alerts(alerts, notify_data.index)
+            return sent
                 
         except Exception as e:
             self.logger.error(f"Error in calculate_variance: {e}")
             return False
     
+    def _load_subscribers(self) -> List[Tuple[str, str, Optional[set]]]:
+        """(email, name, watched symbols) per subscriber; an empty symbols column means every symbol"""
+        path = self.config.tracker.subscribers_file
+        if not os.path.exists(path):
+            return []
+        
+        subscribers = pd.read_csv(path, dtype=str, keep_default_na=False)
+        result = []
+        for row in subscribers.itertuples(index=False):
+            symbols = {normalize_symbol(symbol) for symbol in getattr(row, 'symbols', '').split(';') if symbol.strip()}
+            result.append((row.email, getattr(row, 'name', ''), symbols or None))
+        return result
+    
+    def _send_digests(self, alerts: Dict[str, List], subscribers: List[Tuple[str, str, Optional[set]]]) -> bool:
+        """Send each subscriber the alerts for the symbols they watch, in bulk merge sends"""
+        day = datetime.now()
+        digests = []
+        for email, name, symbols in subscribers:
+            own = alerts if symbols is None else {
+                category: [entry for entry in entries if entry[0] in symbols] for category, entries in alerts.items()}
+            if any(own.values()):
+                digests.append(Digest(email, name, self.renderer.render(own, day, name or None), own))
+        
+        if not digests:
+            self.logger.info("No subscriber watches the alerted symbols")
+            return True
+        
+        sent = self.email_service.send_digests(digests)
+        self.logger.info(f"Sent {sent} of {len(digests)} alert digests")
+        return sent == len(digests)
+    
     def _send_alerts(self, alerts: Dict[str, List]) -> bool:
         """Send email alerts based on calculated variances"""
         try:
-            subject_parts = []
-            message_parts = []
-            
-            # Build message content
-            if alerts['tolerance_breach']:
-                subject_parts.append("Tolerance Breach")
-                message_parts.append("🚨 CONSIDER SELLING - Tolerance Breached:")
-                for symbol, diff in alerts['tolerance_breach']:
-                    message_parts.append(f"  {symbol}: {diff}% drop from high")
-                message_parts.append("")
-            
-            if alerts['ten_percent']:
-                if not subject_parts:
-                    subject_parts.append("10% Threshold Breached")
-                message_parts.append("⚠️  10% Threshold Breached:")
-                for symbol, diff in alerts['ten_percent']:
-                    message_parts.append(f"  {symbol}: {diff}% drop from high")
-                message_parts.append("")
-            
-            if alerts['five_percent']:
-                if not subject_parts:
-                    subject_parts.append("5% Threshold Breached")
-                message_parts.append("📉 5% Threshold Breached:")
-                for symbol, diff in alerts['five_percent']:
-                    message_parts.append(f"  {symbol}: {diff}% drop from high")
-                message_parts.append("")
-            
-            if alerts['stagnant']:
-                if not subject_parts:
-                    subject_parts.append("Stagnant Stocks")
-                message_parts.append("😴 Stagnant Stocks (Time to Review?):")
-                for symbol, days in alerts['stagnant']:
-                    message_parts.append(f"  {symbol}: {days} days since peak")
-                message_parts.append("")
-            
-            # Create final message
-            subject = f"Stock Alert: {', '.join(subject_parts)} - {datetime.now().strftime('%Y-%m-%d')}"
-            message = "\n".join(message_parts)
+            subscribers = self._load_subscribers()
+            if subscribers:
+                return self._send_digests(alerts, subscribers)
+            
+            rendered = self.renderer.render(alerts)
             
             # Send email
-            success = self.email_service.send_notification(subject, message)
+            success = self.email_service.send_notification(rendered.subject, rendered.text, html=rendered.html,
+                                                           alerts=alerts)
             
             if success:
-                self.logger.info(f"Alert sent successfully: {subject}")
+                self.logger.info(f"Alert sent successfully: {rendered.subject}")
             else:
                 self.logger.error("Failed to send alert email")
             
@@ -316,26 +483,182 @@ class StockTracker:
             self.logger.error(f"Error sending alerts: {e}")
             return False
     
-    def run(self, update_investments: bool = False) -> bool:
+    def _resend_undelivered(self, entries: List[Dict]) -> None:
+        """Re-send tolerance breaches whose alert email was not delivered through the fallback channel
+
+        With FALLBACK_EMAILS set, all breaches go to those addresses in one
+        message. Otherwise, when SMTP is configured, each message's breaches
+        are re-sent over SMTP to the recipients that did not get it; a merge
+        send's recipients each get only the breaches of their own digest.
+        """
+        fallback = self.config.email.fallback_emails
+        if fallback:
+            breaches = []
+            for entry in entries:
+                breaches.extend(breach for breach in undelivered_breaches(entry) if breach not in breaches)
+            resends = [(fallback, breaches)]
+        elif self.email_service.smtp is not None:
+            resends = []
+            for entry in entries:
+                if entry.get('recipient_alerts') is None:
+                    resends.append((entry['undelivered'], undelivered_breaches(entry)))
+                    continue
+                # Merge sends carried a different digest to each recipient
+                for address in entry['undelivered']:
+                    breaches = undelivered_breaches(entry, address)
+                    if breaches:
+                        resends.append(([address], breaches))
+        else:
+            symbols = ', '.join(str(symbol) for entry in entries for symbol, _ in undelivered_breaches(entry))
+            self.logger.error(f"Undelivered tolerance breaches for {symbols}; "
+                              f"set FALLBACK_EMAILS or SMTP_HOST to re-send them")
+            return
+        
+        for recipients, breaches in resends:
+            symbols = ', '.join(str(symbol) for symbol, _ in breaches)
+            rendered = self.renderer.render({TOLERANCE_BREACH: breaches})
+            subject = f"Undelivered {rendered.subject}"
+            if self.email_service.send_fallback(subject, rendered.text, html=rendered.html, to=recipients):
+                self.logger.warning(f"Re-sent undelivered tolerance breaches for {symbols} to {', '.join(recipients)}")
+            else:
+                self.logger.error(f"Failed to re-send undelivered tolerance breaches for {symbols}")
+    
+    def reconcile_deliveries(self) -> bool:
+        """Check the delivery of every logged alert email that is due, once"""
+        try:
+            counts = self.reconciler.reconcile()
+            self.logger.info("Alert email delivery: " + ", ".join(f"{count} {status}" for status, count in counts.items()))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error reconciling deliveries: {e}")
+            return False
+        finally:
+            self.email_service.close()
+    
+    def _send_stream_alert(self, event: AlertEvent) -> None:
+        """Notify and record one alert from stream mode as soon as it fires"""
+        if event.category == STAGNANT:
+            detail = f"{event.symbol}: {int(event.value)} days since peak"
+        else:
+            detail = f"{event.symbol}: {event.value}% drop from high ({event.price} vs high {event.high})"
+        
+        subject = f"Stock Alert: {event.symbol} {event.category.replace('_', ' ')} - {event.timestamp.strftime('%Y-%m-%d %H:%M')}"
+        alerts = {event.category: [[event.symbol, float(event.value)]]}
+        if not self.notifier.notify(alerts, subject, detail):
+            self.logger.error(f"Failed to send stream alert for {event.symbol}")
+        self._record_alerts(alerts)
+    
+    def _record_alerts(self, alerts: Dict[str, List], evaluated: Optional[pd.Index] = None) -> None:
+        """Record alerts in the history after they were sent, logging instead of raising on failure"""
+        try:
+            self.store.record_alerts(alerts, evaluated)
+        except Exception as e:
+            self.logger.error(f"Could not record alert history: {e}")
+    
+    def run_stream(self, source_spec: str, follow: bool = True) -> bool:
+        """Evaluate alerts on a quote stream ('tcp://host:port' or a file to tail)"""
+        try:
+            if not self.store.exists():
+                self.logger.error(f"Portfolio state not found: {self.store.path}")
+                return False
+            
+            evaluator = StreamEvaluator(self.config.tracker, self.logger, on_alert=self._send_stream_alert)
+            evaluator.load_portfolio(self.store.load())
+            
+            source = open_source(source_spec, self.logger, follow=follow)
+            self.logger.info(f"Starting stream mode on {source_spec}")
+            # cProfile would slow every tick; a long-running stream is sampled instead
+            sampler = SamplingProfiler(self.logger, top_n=self.profiler.top_n).start() if self.profile else None
+            if self.config.email.api_key:
+                self.reconciler.start(self.config.tracker.delivery_check_seconds)
+            try:
+                evaluator.run(source)
+            except KeyboardInterrupt:
+                source.stop()
+            finally:
+                if sampler is not None:
+                    sampler.stop()
+                self.reconciler.stop(timeout=self.config.tracker.delivery_check_seconds)
+                self.outbound.save()
+                self.email_service.close()
+                self.notifier.close()
+            
+            self.logger.info(f"Stream mode stopped after {evaluator.quotes_seen} quotes and {evaluator.events_emitted} alerts")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error in stream mode: {e}")
+            return False
+    
+    def dry_run(self, grid: Optional[Dict[str, List[float]]] = None) -> bool:
+        """Print the alerts the cached state would raise, without fetching prices or sending email
+
+        ``grid`` maps what-if parameters to candidate values; every
+        combination is evaluated in one pass and its alert counts printed.
+        """
+        try:
+            if not self.store.exists():
+                self.logger.error(f"Portfolio state not found: {self.store.path}")
+                return False
+            
+            portfolio = self.store.load()
+            sets = parameter_sets(grid or {}, self.config.tracker)
+            
+            start = time.perf_counter()
+            with self.profiler.stage('what_if'):
+                counts = alert_counts(portfolio, sets)
+            elapsed = time.perf_counter() - start
+            
+            self.logger.info(f"Evaluated {len(sets)} parameter sets against {len(portfolio)} symbols in {elapsed:.3f}s")
+            print(format_counts(counts))
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error in dry run: {e}")
+            return False
+    
+    def run(self, update_investments: bool = False, backfill: bool = False) -> bool:
         """Main execution method"""
         try:
             self.logger.info("Starting stock tracker run")
             
+            # Confirm delivery of earlier alerts while this run fetches prices
+            if self.config.email.api_key:
+                self.reconciler.start(self.config.tracker.delivery_check_seconds)
+            
             # Update investments if requested
             if update_investments:
                 self.logger.info("Updating investment list")
-                if not self.get_investments():
+                with self._state_lock():
+                    with self.profiler.stage('get_investments'):
+                        investments_loaded = self.get_investments()
+                    if not investments_loaded:
+                        return False
+                    
+                    with self.profiler.stage('update_meta'):
+                        deleted_symbols = self.update_meta()
+                    if deleted_symbols:
+                        self.logger.info(f"Removed {len(deleted_symbols)} symbols from tracking")
+            
+            # Seed highs for newly added symbols from their full history
+            if backfill:
+                provider = self.providers[YahooFinanceProvider.name]
+                backfiller = Backfiller(self.config.tracker, provider, self.warehouse, self.logger, self.store,
+                                        self.registry)
+                with self.profiler.stage('backfill'):
+                    backfilled = backfiller.run()
+                if not backfilled:
                     return False
-                
-                deleted_symbols = self.update_meta()
-                if deleted_symbols:
-                    self.logger.info(f"Removed {len(deleted_symbols)} symbols from tracking")
             
             # Update prices and calculate alerts
-            if not self.update_prices():
+            with self.profiler.stage('update_prices'):
+                prices_updated = self.update_prices()
+            if not prices_updated:
                 return False
             
-            if not self.calculate_variance():
+            with self.profiler.stage('calculate_variance'):
+                variance_checked = self.calculate_variance()
+            if not variance_checked:
                 return False
             
             self.logger.info("Stock tracker run completed successfully")
@@ -344,16 +667,57 @@ class StockTracker:
         except Exception as e:
             self.logger.error(f"Error in main run: {e}")
             return False
+        
+        finally:
+            self.reconciler.stop(timeout=self.config.tracker.delivery_check_seconds)
+            self.outbound.save()
+            self.email_service.close()
+            self.notifier.close()
+            for provider in self.providers.values():
+                provider.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Track portfolio highs and send drawdown alerts")
+    parser.add_argument('--update-investments', action='store_true',
+                        help="reload the investment files and sync the tracked symbols")
+    parser.add_argument('--backfill', action='store_true',
+                        help="load multi-year history for newly added symbols and seed their highs")
+    parser.add_argument('--stream', metavar='SOURCE',
+                        help="evaluate alerts on live quotes from tcp://host:port or a file to tail")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile each stage (sampled in stream mode) and write reports under logs/")
+    parser.add_argument('--profile-top', type=int, default=15, metavar='N',
+                        help="hotspots to report per profiled stage (default: 15)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="count the alerts the cached state would raise, without network or email")
+    parser.add_argument('--what-if', action='append', default=[], metavar='PARAM=VALUES',
+                        help="candidate values to sweep in a dry run, e.g. tolerance=5:30:0.5 or "
+                             "ten_percent=8,10,12 (parameters: tolerance, five_percent, ten_percent, "
+                             "stagnation_days); repeat to sweep every combination")
+    parser.add_argument('--reconcile-deliveries', action='store_true',
+                        help="check the delivery of sent alert emails and re-send undelivered tolerance breaches")
+    return parser.parse_args(argv)
 
 
 def main():
     """Main entry point"""
     try:
+        args = parse_args()
+        dry_run = args.dry_run or bool(args.what_if)
+        
+        try:
+            grid = parse_what_if(args.what_if)
+        except ValueError as e:
+            print(f"Invalid --what-if: {e}")
+            return 1
+        
         # Load configuration
         config = Config()
         
-        # Validate configuration
-        errors = config.validate()
+        # Validate configuration; a dry run sends no email and needs no credentials
+        errors = [] if dry_run else config.validate()
         if errors:
             print("Configuration errors:")
             for error in errors:
@@ -362,13 +726,20 @@ def main():
             return 1
         
         # Create tracker instance
-        tracker = StockTracker(config)
-        
-        # Check command line arguments
-        update_investments = len(sys.argv) > 1 and sys.argv[1] == '--update-investments'
+        tracker = StockTracker(config, profile=args.profile, profile_top=args.profile_top)
         
         # Run tracker
-        success = tracker.run(update_investments=update_investments)
+        try:
+            if dry_run:
+                success = tracker.dry_run(grid)
+            elif args.reconcile_deliveries:
+                success = tracker.reconcile_deliveries()
+            elif args.stream:
+                success = tracker.run_stream(args.stream)
+            else:
+                success = tracker.run(update_investments=args.update_investments, backfill=args.backfill)
+        finally:
+            tracker.store.close()
         
         return 0 if success else 1
         
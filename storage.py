@@ -0,0 +1,380 @@
+"""
+Crash-safe writes, locking and state stores for Stock Tracker
+"""
+import glob
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from portfolio import to_portfolio
+from trading_calendar import to_days
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class _PathLock:
+    """Per-process state of one lock file"""
+
+    def __init__(self):
+        self.rlock = threading.RLock()
+        self.depth = 0
+        self.handle = None
+
+
+_locks: Dict[str, _PathLock] = {}
+_locks_guard = threading.Lock()
+
+
+def _try_os_lock(handle) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _release_os_lock(handle) -> None:
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        handle.close()
+
+
+@contextmanager
+def file_lock(path: str, timeout: Optional[float] = None, poll_interval: float = 0.1):
+    """Hold an exclusive advisory lock on ``<path>.lock``
+
+    Serializes read-modify-write cycles between processes (a cron run and a
+    manual run, say). The lock is re-entrant within a thread, so a method that
+    locks the file can be called from a run that already holds it. Raises
+    TimeoutError if the lock is not acquired within ``timeout`` seconds.
+    """
+    lock_path = f"{os.path.abspath(path)}.lock"
+    with _locks_guard:
+        state = _locks.setdefault(lock_path, _PathLock())
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    if not state.rlock.acquire(timeout=-1 if timeout is None else timeout):
+        raise TimeoutError(f"Timed out waiting for lock on {path}")
+
+    try:
+        if state.depth == 0:
+            handle = open(lock_path, "a+")
+            while not _try_os_lock(handle):
+                if deadline is not None and time.monotonic() >= deadline:
+                    handle.close()
+                    raise TimeoutError(f"Timed out waiting for lock on {path}")
+                time.sleep(poll_interval)
+            state.handle = handle
+
+        state.depth += 1
+        try:
+            yield
+        finally:
+            state.depth -= 1
+            if state.depth == 0:
+                _release_os_lock(state.handle)
+                state.handle = None
+    finally:
+        state.rlock.release()
+
+
+def snapshot_file(path: str, snapshot_dir: str, keep: int) -> Optional[str]:
+    """Keep a copy of path in snapshot_dir, pruning all but the newest ``keep``"""
+    if keep <= 0 or not os.path.exists(path):
+        return None
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    base, ext = os.path.splitext(os.path.basename(path))
+    snapshot_path = os.path.join(snapshot_dir, f"{base}.{datetime.now().strftime('%Y%m%dT%H%M%S%f')}{ext}")
+
+    # A hard link is free; the file is about to be replaced, not modified in place
+    try:
+        os.link(path, snapshot_path)
+    except OSError:
+        shutil.copy2(path, snapshot_path)
+
+    snapshots = sorted(glob.glob(os.path.join(snapshot_dir, f"{glob.escape(base)}.*{ext}")))
+    for stale in snapshots[:-keep]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+    return snapshot_path
+
+
+def _fsync_directory(directory: str) -> None:
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_csv(df: pd.DataFrame, path: str, snapshot_dir: Optional[str] = None, keep: int = 0) -> None:
+    """Write df to path so readers only ever see the old or the new file
+
+    The frame is written and fsynced to a temporary file in the same directory,
+    the current file is snapshotted when ``keep`` is set, and the temporary file
+    is moved into place with ``os.replace``.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+
+    try:
+        with os.fdopen(fd, "w", newline="") as f:
+            df.to_csv(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # mkstemp creates the file private to the owner; keep the permissions of the file being replaced
+        if os.path.exists(path):
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+
+        if snapshot_dir and keep:
+            snapshot_file(path, snapshot_dir, keep)
+
+        os.replace(tmp_path, path)
+        _fsync_directory(directory)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+STATE_COLUMNS = ['high', 'high_date', 'close', 'tolerance', 'updated']
+NUMERIC_COLUMNS = ['high', 'close', 'tolerance']
+
+
+def _comparable(df: pd.DataFrame) -> pd.DataFrame:
+    """State columns in a form where equal values compare equal across dtypes
+
+    Prices may come back from a CSV as ints and dates as strings, date
+    objects or datetime64; missing values may be NaN, NaT, None or ''. Dates
+    are compared as day numbers.
+    """
+    out = pd.DataFrame(index=df.index)
+    for column in STATE_COLUMNS:
+        values = df[column] if column in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if column in NUMERIC_COLUMNS:
+            out[column] = pd.to_numeric(values, errors='coerce').astype(float)
+        else:
+            days = to_days(values)
+            out[column] = np.where(np.isnat(days), np.nan, days.astype('int64').astype(float))
+    return out
+
+
+def dirty_rows(clean: pd.DataFrame, df: pd.DataFrame) -> Tuple[pd.Index, pd.Index]:
+    """Symbols of df that differ from the persisted state, and symbols removed from it"""
+    removed = clean.index.difference(df.index)
+    common = df.index.intersection(clean.index)
+
+    before = _comparable(clean.loc[common]).to_numpy()
+    after = _comparable(df.loc[common]).to_numpy()
+    # NaN != NaN, so count a cell unchanged when both sides are missing
+    changed = ((before != after) & ~(np.isnan(before) & np.isnan(after))).any(axis=1)
+
+    dirty = common[changed].append(df.index.difference(clean.index))
+    return dirty, removed
+
+
+class StateStore:
+    """Base class for portfolio state backends
+
+    ``load`` remembers the state it returned, and ``save`` hands the backend
+    only the rows that differ from it, so a run that changed nothing writes
+    nothing.
+    """
+
+    def __init__(self, config, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self._clean: Optional[pd.DataFrame] = None
+
+    def lock(self):
+        """Lock serializing read-modify-write cycles on the state"""
+        return file_lock(self.path, timeout=self.config.lock_timeout)
+
+    def exists(self) -> bool:
+        raise NotImplementedError
+
+    def _read(self) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def _write(self, df: pd.DataFrame, dirty: pd.Index, removed: pd.Index) -> None:
+        raise NotImplementedError
+
+    def load(self) -> pd.DataFrame:
+        """The portfolio state as a typed frame (see ``portfolio.to_portfolio``)"""
+        df = to_portfolio(self._read())
+        self._clean = df.copy()
+        return df
+
+    def save(self, df: pd.DataFrame) -> int:
+        """Persist the rows of df that changed since the last load or save
+
+        Returns the number of rows written or deleted.
+        """
+        clean = self._clean if self._clean is not None else to_portfolio(self._read())
+        dirty, removed = dirty_rows(clean, df)
+
+        if len(dirty) or len(removed):
+            self._write(df, dirty, removed)
+            self.logger.debug(f"Saved {len(dirty)} changed and {len(removed)} removed symbols to {self.path}")
+        else:
+            self.logger.debug(f"No state changes to save to {self.path}")
+
+        self._clean = df.copy()
+        return len(dirty) + len(removed)
+
+    def record_alerts(self, alerts: Dict[str, List], evaluated: Optional[Iterable[str]] = None) -> int:
+        """Alert history needs the SQLite backend; nothing is recorded here"""
+        return 0
+
+    def record_delivery_events(self, events: Iterable[Dict], batch_size: int = 1000) -> int:
+        """Delivery events need the SQLite backend; nothing is recorded here"""
+        return 0
+
+    def close(self) -> None:
+        """Release connections held by the backend"""
+
+
+class CSVStateStore(StateStore):
+    """Portfolio state kept in the data CSV file plus an append-only delta log
+
+    Changed rows are appended to ``<data file>.delta`` instead of rewriting the
+    whole file; removed symbols are appended as tombstones. Reads replay the
+    log over the base file. Once the log already holds more records than
+    ``delta_compact_ratio`` times the portfolio size, the next save folds it
+    into the base file, which is replaced atomically with a snapshot kept.
+    Only records already in the log count, so a daily run that touches every
+    row (each fetch moves ``updated``) still appends until the log has grown.
+    """
+
+    DELTA_COLUMNS = STATE_COLUMNS + ['deleted']
+
+    def __init__(self, config, logger: logging.Logger):
+        super().__init__(config, logger)
+        self.path = config.data_file
+        self.delta_path = f"{self.path}.delta"
+        self._delta_records = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) or os.path.exists(self.delta_path)
+
+    def _read(self) -> pd.DataFrame:
+        if os.path.exists(self.path):
+            df = pd.read_csv(self.path, header=0, index_col=0)
+        else:
+            df = pd.DataFrame(columns=STATE_COLUMNS).rename_axis('symbol')
+
+        self._delta_records = 0
+        if not os.path.exists(self.delta_path):
+            return df
+
+        delta = pd.read_csv(self.delta_path, header=0, index_col=0)
+        self._delta_records = len(delta)
+        # A record cut short by a crash is missing its trailing 'deleted' field;
+        # the next append cuts it off (see _repair_delta_tail)
+        delta = delta[delta['deleted'].notna()]
+        delta = delta[~delta.index.duplicated(keep='last')]
+        if delta.empty:
+            return df
+
+        deleted = delta['deleted'].astype(int) == 1
+        upserts = delta.loc[~deleted, STATE_COLUMNS]
+        df = df.drop(delta.index, errors='ignore')
+        df = pd.concat([df, upserts]) if not df.empty else upserts
+        return df.sort_index()
+
+    def _repair_delta_tail(self) -> None:
+        """Drop a final record left without its newline by a crash mid-append
+
+        Appending after it would glue the next record onto the torn line and
+        leave a row with too many fields, which the CSV reader rejects.
+        """
+        if not os.path.exists(self.delta_path):
+            return
+        with open(self.delta_path, "rb+") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            end = f.read().rfind(b"\n") + 1
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+        self.logger.warning(f"Dropped a partly written record at the end of {self.delta_path}")
+
+    def _write(self, df: pd.DataFrame, dirty: pd.Index, removed: pd.Index) -> None:
+        if self._delta_records > self.config.delta_compact_ratio * max(len(df), 1):
+            self.compact(df)
+            return
+
+        self._repair_delta_tail()
+
+        records = df.loc[dirty, STATE_COLUMNS].assign(deleted=0)
+        if len(removed):
+            tombstones = pd.DataFrame(index=removed, columns=STATE_COLUMNS).assign(deleted=1)
+            records = pd.concat([records, tombstones])
+        records.index.name = 'symbol'
+
+        write_header = not os.path.exists(self.delta_path) or os.path.getsize(self.delta_path) == 0
+        with open(self.delta_path, "a", newline="") as f:
+            records.to_csv(f, header=write_header)
+            f.flush()
+            os.fsync(f.fileno())
+        self._delta_records += len(records)
+
+    def compact(self, df: Optional[pd.DataFrame] = None) -> None:
+        """Fold the delta log into the base file"""
+        if df is None:
+            df = self._read()
+        atomic_write_csv(df, self.path, self.config.snapshot_dir, self.config.snapshot_count)
+        # Replaying a stale log over the new base is harmless, so a crash here loses nothing
+        if os.path.exists(self.delta_path):
+            os.remove(self.delta_path)
+        self._delta_records = 0
+        self.logger.info(f"Compacted state delta log into {self.path}")
+
+
+def create_state_store(config, logger: logging.Logger) -> StateStore:
+    """Build the state store selected by ``config.storage_backend``"""
+    if config.storage_backend == "sqlite":
+        from sqlite_store import SQLiteStateStore
+        return SQLiteStateStore(config, logger)
+    if config.storage_backend != "csv":
+        logger.warning(f"Unknown storage backend '{config.storage_backend}', using csv")
+    return CSVStateStore(config, logger)
@@ -0,0 +1,393 @@
+"""
+Streaming alert evaluation on live quotes
+"""
+import argparse
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from alerts import (ALERT_SEVERITIES, FIVE_PERCENT, STAGNANT, TEN_PERCENT, drawdown_categories,
+                    is_stagnant)
+from config import TrackerConfig
+from symbol_registry import normalize_symbol
+
+
+@dataclass
+class Quote:
+    """One price observation"""
+    symbol: str
+    price: float
+    timestamp: datetime
+
+
+def parse_quote(line: str) -> Optional[Quote]:
+    """Parse a 'symbol,price[,timestamp]' line; blank, comment and header lines give None
+
+    Symbols are normalized like the portfolio's ('nse:infy' becomes
+    'INFY.NS'). Quotes without a timestamp are stamped with the time they
+    were read.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+
+    fields = [part.strip() for part in line.split(',')]
+    if len(fields) < 2 or fields[0].lower() == 'symbol':
+        return None
+
+    price = float(fields[1])
+    timestamp = datetime.fromisoformat(fields[2]) if len(fields) > 2 and fields[2] else datetime.now()
+    return Quote(symbol=normalize_symbol(fields[0]), price=price, timestamp=timestamp)
+
+
+class QuoteSource:
+    """Base class for quote streams"""
+
+    name = "base"
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self._stopped = threading.Event()
+
+    def quotes(self) -> Iterator[Quote]:
+        """Yield quotes until the stream ends or ``stop`` is called"""
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _parse(self, line: str) -> Optional[Quote]:
+        try:
+            return parse_quote(line)
+        except ValueError as e:
+            self.logger.warning(f"Skipping malformed quote {line.strip()!r}: {e}")
+            return None
+
+
+class FileTailSource(QuoteSource):
+    """Quotes appended to a local file, read as they arrive (like ``tail -f``)
+
+    With ``follow`` off the file is read once to the end, which replays a
+    recorded session. A file that shrinks is assumed to have been rotated and
+    is read again from the start.
+    """
+
+    name = "file"
+
+    def __init__(self, path: str, logger: logging.Logger, follow: bool = True,
+                 from_start: bool = True, poll_interval: float = 0.5):
+        super().__init__(logger)
+        self.path = path
+        self.follow = follow
+        self.from_start = from_start
+        self.poll_interval = poll_interval
+
+    def quotes(self) -> Iterator[Quote]:
+        with open(self.path, "r") as f:
+            if not self.from_start:
+                f.seek(0, os.SEEK_END)
+
+            partial = ""
+            while not self._stopped.is_set():
+                line = f.readline()
+                if line:
+                    partial += line
+                    # A writer may be halfway through a line; wait for the rest
+                    if not partial.endswith("\n"):
+                        continue
+                    quote = self._parse(partial)
+                    partial = ""
+                    if quote is not None:
+                        yield quote
+                    continue
+
+                if not self.follow:
+                    if partial:
+                        quote = self._parse(partial)
+                        if quote is not None:
+                            yield quote
+                    return
+
+                if os.path.getsize(self.path) < f.tell():
+                    self.logger.info(f"{self.path} was truncated, reading from the start")
+                    f.seek(0)
+                    partial = ""
+                time.sleep(self.poll_interval)
+
+
+class SocketSource(QuoteSource):
+    """Newline-delimited quotes read from a TCP connection
+
+    Reconnects after ``reconnect_interval`` seconds when the feed drops,
+    unless ``reconnect`` is off, in which case the stream ends.
+    """
+
+    name = "socket"
+
+    def __init__(self, host: str, port: int, logger: logging.Logger,
+                 reconnect: bool = True, reconnect_interval: float = 5.0, timeout: float = 30.0):
+        super().__init__(logger)
+        self.host = host
+        self.port = port
+        self.reconnect = reconnect
+        self.reconnect_interval = reconnect_interval
+        self.timeout = timeout
+
+    def quotes(self) -> Iterator[Quote]:
+        while not self._stopped.is_set():
+            try:
+                with socket.create_connection((self.host, self.port), timeout=self.timeout) as conn:
+                    conn.settimeout(None)
+                    self.logger.info(f"Connected to quote feed {self.host}:{self.port}")
+                    with conn.makefile("r", encoding="utf-8", newline="\n") as feed:
+                        for line in feed:
+                            if self._stopped.is_set():
+                                return
+                            quote = self._parse(line)
+                            if quote is not None:
+                                yield quote
+                self.logger.warning(f"Quote feed {self.host}:{self.port} closed")
+            except OSError as e:
+                self.logger.warning(f"Quote feed {self.host}:{self.port} unavailable: {e}")
+
+            if not self.reconnect:
+                return
+            self._stopped.wait(self.reconnect_interval)
+
+
+class QuoteReplayServer:
+    """Serve a recorded quote file over TCP, standing in for a live feed
+
+    Every client receives the whole file, paced at ``rate`` quotes per second
+    (0 sends as fast as the client reads). Port 0 picks a free port; see
+    ``address`` after ``start``.
+    """
+
+    def __init__(self, path: str, logger: logging.Logger, host: str = "127.0.0.1",
+                 port: int = 0, rate: float = 0.0):
+        self.path = path
+        self.logger = logger
+        self.rate = rate
+
+        replay = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                replay._replay(self.wfile)
+
+        self._server = socketserver.ThreadingTCPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def _replay(self, wfile) -> None:
+        interval = 1.0 / self.rate if self.rate else 0.0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    wfile.write(line if line.endswith(b"\n") else line + b"\n")
+                    if interval:
+                        wfile.flush()
+                        time.sleep(interval)
+        except (BrokenPipeError, ConnectionResetError):
+            self.logger.debug("Replay client disconnected")
+
+    def start(self) -> "QuoteReplayServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="quote-replay", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Replaying {self.path} on {self.address[0]}:{self.address[1]}")
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def open_source(spec: str, logger: logging.Logger, follow: bool = True) -> QuoteSource:
+    """Quote source for 'tcp://host:port' or a file path"""
+    if spec.startswith("tcp://"):
+        host, _, port = spec[len("tcp://"):].rpartition(":")
+        return SocketSource(host or "127.0.0.1", int(port), logger, reconnect=follow)
+    return FileTailSource(spec, logger, follow=follow)
+
+
+@dataclass
+class AlertEvent:
+    """A threshold crossed by a quote"""
+    symbol: str
+    category: str
+    value: float
+    price: float
+    high: float
+    timestamp: datetime
+
+    @property
+    def severity(self) -> str:
+        return ALERT_SEVERITIES.get(self.category, 'low')
+
+
+@dataclass
+class SymbolState:
+    """Running per-symbol state; dates are day ordinals so updates stay O(1)"""
+    high: float
+    high_day: Optional[int]
+    tolerance: float
+    price: float = float('nan')
+    fired: Set[str] = field(default_factory=set)
+
+
+class StreamEvaluator:
+    """Evaluate drawdown alerts on every quote as it arrives
+
+    Uses the categories and thresholds of the batch run. Each category fires
+    once per drawdown: a symbol is not reported again until it makes a new
+    high, and crossing into the ten percent tier also silences the five
+    percent tier for the rest of the drawdown. Highs made in the stream only
+    live in memory; the recorded highs are still maintained by the batch run.
+    Alerts are handed to ``on_alert`` on a separate thread, in order, so a
+    slow email never holds up the quotes behind it.
+    """
+
+    def __init__(self, config: TrackerConfig, logger: logging.Logger,
+                 on_alert: Optional[Callable[[AlertEvent], None]] = None):
+        self.config = config
+        self.logger = logger
+        self.on_alert = on_alert
+        self.states: Dict[str, SymbolState] = {}
+        self.quotes_seen = 0
+        self.events_emitted = 0
+
+    def load_portfolio(self, portfolio: pd.DataFrame) -> None:
+        """Seed state from the typed portfolio, marking alerts that are already active
+
+        Symbols that already breach a threshold when the stream starts were
+        reported by the batch run, so only new crossings are emitted.
+        """
+        high_days = portfolio['high_date'].to_numpy(dtype='datetime64[D]')
+        last_days = portfolio['updated'].to_numpy(dtype='datetime64[D]')
+        epoch_offset = datetime(1970, 1, 1).toordinal()
+
+        self.states = {}
+        for position, symbol in enumerate(portfolio.index):
+            high = float(portfolio['high'].iat[position])
+            close = float(portfolio['close'].iat[position])
+            high_day = None if np.isnat(high_days[position]) else int(high_days[position].astype(int)) + epoch_offset
+            state = SymbolState(high=high, high_day=high_day, tolerance=float(portfolio['tolerance'].iat[position]),
+                                price=close)
+
+            if high and not np.isnan(high) and not np.isnan(close):
+                state.fired.update(drawdown_categories((high - close) / high * 100, state.tolerance, self.config))
+                if not np.isnat(last_days[position]) and high_day is not None:
+                    last_day = int(last_days[position].astype(int)) + epoch_offset
+                    if is_stagnant(last_day - high_day, self.config):
+                        state.fired.add(STAGNANT)
+                if TEN_PERCENT in state.fired:
+                    state.fired.add(FIVE_PERCENT)
+
+            self.states[str(symbol)] = state
+
+        self.logger.info(f"Streaming evaluator tracking {len(self.states)} symbols")
+
+    def process(self, quote: Quote) -> List[AlertEvent]:
+        """Update one symbol's state and return the alerts the quote triggers"""
+        self.quotes_seen += 1
+        state = self.states.get(quote.symbol)
+        if state is None or not quote.price > 0:
+            return []
+
+        state.price = quote.price
+        day = quote.timestamp.toordinal()
+
+        if np.isnan(state.high) or quote.price > state.high:
+            state.high = quote.price
+            state.high_day = day
+            state.fired.clear()
+            return []
+
+        diff = (state.high - quote.price) / state.high * 100
+        categories = drawdown_categories(diff, state.tolerance, self.config)
+
+        events = []
+        for category in categories:
+            if category not in state.fired:
+                events.append(AlertEvent(quote.symbol, category, round(diff, 2), quote.price, state.high,
+                                         quote.timestamp))
+        if state.high_day is not None and is_stagnant(day - state.high_day, self.config) and STAGNANT not in state.fired:
+            events.append(AlertEvent(quote.symbol, STAGNANT, day - state.high_day, quote.price, state.high,
+                                     quote.timestamp))
+
+        state.fired.update(event.category for event in events)
+        if TEN_PERCENT in state.fired:
+            state.fired.add(FIVE_PERCENT)
+        return events
+
+    def _handle(self, event: AlertEvent) -> None:
+        try:
+            self.on_alert(event)
+        except Exception as e:
+            self.logger.error(f"Error handling alert for {event.symbol}: {e}")
+
+    def run(self, source: QuoteSource, max_quotes: Optional[int] = None) -> int:
+        """Consume a source, passing alerts to ``on_alert``; returns the number of alerts
+
+        Alerts already emitted are still handled if the loop is interrupted.
+        """
+        emitted = 0
+        dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-alerts") if self.on_alert else None
+        try:
+            for quote in source.quotes():
+                for event in self.process(quote):
+                    emitted += 1
+                    self.events_emitted += 1
+                    self.logger.info(f"{event.category} alert for {event.symbol}: {event.value} at {event.price}")
+                    if dispatcher is not None:
+                        dispatcher.submit(self._handle, event)
+
+                if max_quotes is not None and self.quotes_seen >= max_quotes:
+                    break
+        finally:
+            if dispatcher is not None:
+                dispatcher.shutdown(wait=True)
+        return emitted
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Replay a recorded quote file over TCP for testing stream mode"""
+    parser = argparse.ArgumentParser(description="Replay a quote file as a TCP feed")
+    parser.add_argument('path', help="file of 'symbol,price[,timestamp]' lines")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=9009)
+    parser.add_argument('--rate', type=float, default=10.0, help="quotes per second (0 for unpaced)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = QuoteReplayServer(args.path, logging.getLogger("quote_replay"), args.host, args.port, args.rate)
+    logging.getLogger("quote_replay").info(f"Replaying {args.path} on {args.host}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
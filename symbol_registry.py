@@ -0,0 +1,182 @@
+"""
+Symbol normalization and exchange routing for Stock Tracker
+"""
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import TradingCalendar, get_calendar, to_days
+
+DEFAULT_EXCHANGE = "NYSE"
+
+# Yahoo-style ticker suffixes and the exchange they trade on
+SUFFIX_EXCHANGES = {
+    "NS": "NSE",
+    "BO": "BSE",
+}
+
+# Spellings seen in broker exports, mapped to the Yahoo suffix
+SUFFIX_ALIASES = {
+    "NSE": "NS",
+    "BSE": "BO",
+    "BOM": "BO",
+}
+
+# "EXCHANGE:TICKER" prefixes, mapped to the Yahoo suffix ('' for US listings)
+PREFIX_SUFFIXES = {
+    "NSE": "NS",
+    "BSE": "BO",
+    "BOM": "BO",
+    "NYSE": "",
+    "NASDAQ": "",
+    "NYSEARCA": "",
+    "AMEX": "",
+}
+
+
+@dataclass(frozen=True)
+class ExchangeRoute:
+    """How symbols of one exchange are fetched"""
+    provider: str = "yahoo"
+    batch_size: int = 200
+    min_interval: float = 0.0  # seconds between batch requests to this venue
+
+
+DEFAULT_ROUTES = {
+    "NYSE": ExchangeRoute(provider="yahoo", batch_size=200, min_interval=0.0),
+    "NSE": ExchangeRoute(provider="nse", batch_size=100, min_interval=1.0),
+    "BSE": ExchangeRoute(provider="yahoo", batch_size=100, min_interval=1.0),
+}
+
+
+@dataclass(frozen=True)
+class SymbolInfo:
+    """A resolved symbol: normalized identifier, bare ticker and venue"""
+    symbol: str
+    ticker: str
+    exchange: str
+    provider: str
+
+
+@dataclass
+class FetchBatch:
+    """Symbols of one exchange fetched together"""
+    exchange: str
+    route: ExchangeRoute
+    calendar: TradingCalendar
+    symbols: List[str]
+
+
+def normalize_symbol(raw: str) -> str:
+    """Normalize a broker or Yahoo identifier to the Yahoo form used in state files
+
+    'nse:infy', 'INFY.NSE' and ' infy.ns ' all become 'INFY.NS'; US tickers
+    such as 'NASDAQ:AAPL' become 'AAPL'.
+    """
+    symbol = str(raw).strip().upper()
+
+    if ":" in symbol:
+        prefix, _, ticker = symbol.partition(":")
+        if prefix in PREFIX_SUFFIXES:
+            suffix = PREFIX_SUFFIXES[prefix]
+            return f"{ticker}.{suffix}" if suffix else ticker
+
+    if "." in symbol:
+        ticker, _, suffix = symbol.rpartition(".")
+        if suffix in SUFFIX_ALIASES:
+            return f"{ticker}.{SUFFIX_ALIASES[suffix]}"
+
+    return symbol
+
+
+def exchange_for_symbol(symbol: str) -> str:
+    """Exchange a normalized ticker trades on, judged by its suffix"""
+    if "." not in symbol:
+        return DEFAULT_EXCHANGE
+    return SUFFIX_EXCHANGES.get(symbol.rsplit(".", 1)[1], DEFAULT_EXCHANGE)
+
+
+class SymbolRegistry:
+    """Resolve symbols to exchanges and providers and group them into fetch batches
+
+    Resolutions are cached for the lifetime of the registry since the same
+    portfolio is resolved on every run.
+    """
+
+    def __init__(self, routes: Optional[Dict[str, ExchangeRoute]] = None, holidays_file: Optional[str] = None):
+        self.routes = dict(DEFAULT_ROUTES)
+        if routes:
+            self.routes.update(routes)
+        self.holidays_file = holidays_file
+        self._cache: Dict[str, SymbolInfo] = {}
+        self._lock = threading.Lock()
+
+    def route(self, exchange: str) -> ExchangeRoute:
+        return self.routes.get(exchange, self.routes[DEFAULT_EXCHANGE])
+
+    def calendar(self, exchange: str) -> TradingCalendar:
+        return get_calendar(exchange, self.holidays_file)
+
+    def resolve(self, raw: str) -> SymbolInfo:
+        """Resolve a raw identifier (cached)"""
+        info = self._cache.get(raw)
+        if info is not None:
+            return info
+
+        symbol = normalize_symbol(raw)
+        exchange = exchange_for_symbol(symbol)
+        ticker = symbol.rsplit(".", 1)[0] if exchange in SUFFIX_EXCHANGES.values() else symbol
+        info = SymbolInfo(symbol=symbol, ticker=ticker, exchange=exchange, provider=self.route(exchange).provider)
+
+        with self._lock:
+            self._cache[raw] = info
+        return info
+
+    def group_by_exchange(self, symbols: List[str]) -> Dict[str, List[SymbolInfo]]:
+        """Resolved symbols keyed by exchange, in input order"""
+        groups: Dict[str, List[SymbolInfo]] = {}
+        for raw in symbols:
+            info = self.resolve(raw)
+            groups.setdefault(info.exchange, []).append(info)
+        return groups
+
+    def batches(self, symbols: List[str]) -> Dict[str, List[FetchBatch]]:
+        """Per-exchange fetch batches sized by each exchange's route
+
+        Batches carry the symbols exactly as given so fetched columns line up
+        with the caller's index.
+        """
+        groups: Dict[str, List[str]] = {}
+        for raw in symbols:
+            groups.setdefault(self.resolve(raw).exchange, []).append(raw)
+
+        plan = {}
+        for exchange, names in groups.items():
+            route = self.route(exchange)
+            calendar = self.calendar(exchange)
+            plan[exchange] = [
+                FetchBatch(exchange=exchange, route=route, calendar=calendar, symbols=names[i:i + route.batch_size])
+                for i in range(0, len(names), route.batch_size)
+            ]
+        return plan
+
+    def final_bars(self, close_data: pd.DataFrame, now: Optional[datetime] = None) -> pd.DataFrame:
+        """Closes without the bars of sessions still trading, which are not final yet
+
+        Each column is cut at the last closed session of its symbol's exchange.
+        """
+        groups: Dict[str, List[str]] = {}
+        for raw in close_data.columns.unique():
+            groups.setdefault(self.resolve(raw).exchange, []).append(raw)
+
+        final = close_data.copy()
+        days = to_days(final.index)
+        for exchange, columns in groups.items():
+            unfinished = days > to_days(self.calendar(exchange).last_closed_session(now))
+            if unfinished.any():
+                final.loc[unfinished, columns] = np.nan
+        return final
@@ -1,9 +1,11 @@
+import os
+
 import requests
 
 class ApiClient:
-    apiUri = 'https://api.elasticemail.com/v2'
-    f = open("/Users/deepak.kumar/PycharmProjects/StockTracker/Ignore for Inclusion/details_elastic_API.csv", "r")
-    apiKey = str(f.read())
+    # Point ELASTIC_EMAIL_API_URI at benchmarks/mock_elastic.py to run without a real account
+    apiUri = os.getenv('ELASTIC_EMAIL_API_URI', 'https://api.elasticemail.com/v2')
+    apiKey = os.getenv('ELASTIC_EMAIL_API_KEY', '')
 
     def Request(method, url, data):
         data['apikey'] = ApiClient.apiKey
@@ -0,0 +1,108 @@
+"""
+Tests for how the adaptive and cached providers report chunks that could not be fetched
+
+    python -m pytest test/test_data_provider.py
+"""
+import logging
+import os
+import sys
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TrackerConfig  # noqa: E402
+from data_provider import AdaptiveProvider, CachedProvider, PartialFetchError, StockDataProvider  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+from symbol_registry import SymbolRegistry  # noqa: E402
+
+LOGGER = logging.getLogger("test_data_provider")
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.response = SimpleNamespace(status_code=status_code)
+
+
+class FakeProvider(StockDataProvider):
+    """Answers every chunk with one close per symbol, or a 503 when the chunk holds a bad symbol"""
+
+    name = "fake"
+
+    def __init__(self, host: str, bad=(), empty: bool = False):
+        super().__init__(LOGGER)
+        self.host = host
+        self.bad = set(bad)
+        self.empty = empty
+        self.requests = []
+
+    def fetch_closes(self, symbols, start, end) -> pd.DataFrame:
+        self.requests.append(list(symbols))
+        if self.bad & set(symbols):
+            raise HTTPError(503)
+        if self.empty:
+            return pd.DataFrame()
+        return pd.DataFrame({symbol: [1.0] for symbol in symbols}, index=pd.to_datetime(['2024-03-04']))
+
+
+def adaptive(provider: FakeProvider, **overrides) -> AdaptiveProvider:
+    settings = dict(fetch_rate=1000.0, fetch_max_rate=1000.0, fetch_burst=1000.0, fetch_chunk_step=1,
+                    fetch_min_chunk_size=1, breaker_failures=100, breaker_reset_seconds=3600.0)
+    settings.update(overrides)
+    return AdaptiveProvider(provider, LOGGER, TrackerConfig(**settings))
+
+
+def test_chunks_given_up_on_are_reported_with_the_closes_fetched(request):
+    provider = adaptive(FakeProvider(request.node.name, bad=['X']), fetch_chunk_size=4)
+
+    with pytest.raises(PartialFetchError) as raised:
+        provider.fetch_closes(['A', 'B', 'C', 'X'], '2024-03-01', '2024-03-08')
+
+    assert raised.value.failed == ['X']
+    assert sorted(raised.value.close_data.columns) == ['A', 'B', 'C']
+
+
+def test_open_breaker_keeps_fetched_closes_and_reports_pending_chunks(request):
+    fake = FakeProvider(request.node.name, bad=['C'])
+    provider = adaptive(fake, fetch_chunk_size=2, fetch_min_chunk_size=2, breaker_failures=1)
+
+    with pytest.raises(PartialFetchError) as raised:
+        provider.fetch_closes(['A', 'B', 'C', 'D', 'E', 'F'], '2024-03-01', '2024-03-08')
+
+    assert raised.value.failed == ['C', 'D', 'E', 'F']
+    assert list(raised.value.close_data.columns) == ['A', 'B']
+    # The breaker opened on the failing chunk, so the last one was never requested
+    assert fake.requests == [['A', 'B'], ['C', 'D']]
+
+
+def test_empty_response_is_not_a_failure(request):
+    provider = adaptive(FakeProvider(request.node.name, empty=True), fetch_chunk_size=2)
+
+    assert provider.fetch_closes(['A', 'B', 'C'], '2024-03-01', '2024-03-08').empty
+    assert provider.chunk_size.value == 2
+    assert provider.breaker.allow()
+
+
+def test_cached_provider_caches_partial_results_and_passes_failures_on(request, tmp_path):
+    fake = FakeProvider(request.node.name, bad=['X'])
+    cache = ResponseCache(str(tmp_path), LOGGER, 2**20)
+    provider = CachedProvider(adaptive(fake, fetch_chunk_size=2), LOGGER, cache, SymbolRegistry(), 60.0, 3600.0)
+
+    with pytest.raises(PartialFetchError) as raised:
+        provider.fetch_closes(['A', 'X'], '2024-03-01', '2024-03-08')
+    assert raised.value.failed == ['X']
+    assert list(raised.value.close_data.columns) == ['A']
+
+    requests = len(fake.requests)
+    assert list(provider.fetch_closes(['A'], '2024-03-01', '2024-03-08').columns) == ['A']
+    assert len(fake.requests) == requests
+
+
+def test_cache_ttl_follows_the_session_close():
+    provider = CachedProvider(FakeProvider("unused"), LOGGER, None, SymbolRegistry(), 60.0, 3600.0)
+    assert not provider._includes_open_session('NYSE', date(2024, 3, 1), date(2024, 3, 8))
+    assert provider._includes_open_session('NYSE', date.today(), date.today() + timedelta(days=10))
@@ -0,0 +1,85 @@
+"""
+Tests for the outbound log of sent alert emails
+
+    python -m pytest test/test_delivery.py
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import TOLERANCE_BREACH  # noqa: E402
+from delivery import DELIVERED, EXPIRED, FAILED, PENDING, OutboundLog, undelivered_breaches  # noqa: E402
+
+LOGGER = logging.getLogger("test_delivery")
+
+
+def make_log(tmp_path) -> OutboundLog:
+    return OutboundLog(str(tmp_path / "outbound.json"), LOGGER, check_interval=10.0, max_check_interval=25.0,
+                       timeout=100.0, retention=1000.0)
+
+
+def test_pending_checks_back_off_then_expire(tmp_path):
+    log = make_log(tmp_path)
+    key = log.record({'messageid': 'm1'}, ['a@example.com'], "Alert", now=0.0)
+    assert log.due(now=9.0) == []
+    assert [due_key for due_key, _ in log.due(now=10.0)] == [key]
+
+    assert log.update(key, PENDING, now=10.0) is None
+    assert log.entries[key]["next_check"] == 30.0
+    assert log.update(key, PENDING, now=30.0) is None
+    assert log.entries[key]["next_check"] == 55.0
+
+    entry = log.update(key, PENDING, now=100.0)
+    assert entry["status"] == EXPIRED
+    assert entry["undelivered"] == ['a@example.com']
+
+
+def test_save_keeps_the_entry_further_along(tmp_path):
+    first = make_log(tmp_path)
+    key = first.record({'messageid': 'm1'}, ['a@example.com'], "Alert", now=0.0)
+    first.save()
+
+    # Another process confirms delivery while this one still holds the entry as pending
+    second = make_log(tmp_path)
+    second.update(key, DELIVERED, now=10.0)
+    other = second.record({'transactionid': 't1'}, ['b@example.com'], "Digest", now=5.0)
+    second.save()
+
+    first.save()
+    assert first.entries[key]["status"] == DELIVERED
+    assert set(make_log(tmp_path).entries) == {key, other}
+
+
+def test_pruned_entries_are_not_merged_back(tmp_path):
+    log = make_log(tmp_path)
+    key = log.record({'messageid': 'm1'}, ['a@example.com'], "Alert", now=0.0)
+    log.update(key, DELIVERED, now=10.0)
+    log.save()
+
+    assert log.prune(now=2000.0) == 1
+    log.save()
+    assert make_log(tmp_path).entries == {}
+
+
+def test_merge_send_re_sends_each_recipient_only_their_breaches(tmp_path):
+    log = make_log(tmp_path)
+    key = log.record({'transactionid': 't1'}, ['a@example.com', 'b@example.com'], "2 alert digests",
+                     alerts={TOLERANCE_BREACH: [['AAA', 12.0], ['BBB', 15.0]]}, now=0.0,
+                     recipient_alerts={'a@example.com': {TOLERANCE_BREACH: [['AAA', 12.0]]},
+                                       'b@example.com': {TOLERANCE_BREACH: [['BBB', 15.0]]}})
+
+    entry = log.update(key, FAILED, undelivered=['B@example.com'], now=10.0)
+    assert undelivered_breaches(entry) == [['BBB', 15.0]]
+    assert undelivered_breaches(entry, 'a@example.com') == [['AAA', 12.0]]
+
+
+def test_single_message_breaches_go_to_every_recipient(tmp_path):
+    log = make_log(tmp_path)
+    key = log.record({'messageid': 'm1'}, ['a@example.com', 'b@example.com'], "Alert",
+                     alerts={TOLERANCE_BREACH: [['AAA', 12.0]]}, now=0.0)
+
+    entry = log.update(key, FAILED, now=10.0)
+    assert entry["undelivered"] == ['a@example.com', 'b@example.com']
+    assert undelivered_breaches(entry) == [['AAA', 12.0]]
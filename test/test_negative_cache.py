@@ -0,0 +1,50 @@
+"""
+Tests for the back-off of symbols that return no price data
+
+    python -m pytest test/test_negative_cache.py
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from negative_cache import NegativeCache  # noqa: E402
+
+HOUR = 3600.0
+
+
+def make_cache(tmp_path) -> NegativeCache:
+    return NegativeCache(str(tmp_path / "negative.json"), logging.getLogger("test_negative_cache"),
+                         base_interval=HOUR, max_interval=4 * HOUR, summary_interval=24 * HOUR)
+
+
+def test_each_miss_doubles_the_wait_up_to_the_maximum(tmp_path):
+    cache = make_cache(tmp_path)
+    waits = []
+    for _ in range(4):
+        cache.record_missing(['BAD'], "not found", now=0.0)
+        waits.append(cache.entries['BAD']["next_probe"])
+    assert waits == [HOUR, 2 * HOUR, 4 * HOUR, 4 * HOUR]
+
+
+def test_suppressed_until_next_probe_and_cleared_by_data(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.record_missing(['BAD', 'GONE'], "not found", now=0.0) == ['BAD', 'GONE']
+    assert cache.record_missing(['BAD'], "not found", now=0.0) == []
+
+    assert cache.suppressed(['BAD', 'GONE', 'OK'], now=HOUR - 1) == ['BAD', 'GONE']
+    assert cache.suppressed(['BAD', 'GONE', 'OK'], now=HOUR) == ['BAD']
+
+    assert cache.record_found(['GONE', 'OK']) == ['GONE']
+    assert cache.suppressed(['GONE'], now=0.0) == []
+
+
+def test_back_off_survives_between_runs(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.record_missing(['BAD'], "no valid price data", now=0.0)
+    cache.save()
+
+    reloaded = make_cache(tmp_path)
+    assert reloaded.suppressed(['BAD'], now=1.0) == ['BAD']
+    assert reloaded.entries['BAD']["reason"] == "no valid price data"
@@ -0,0 +1,38 @@
+"""
+Tests for parsing notification routes
+
+    python -m pytest test/test_notifier.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import ALERT_CATEGORIES, STAGNANT, TOLERANCE_BREACH  # noqa: E402
+from notifier import parse_routes  # noqa: E402
+
+CHANNELS = ['email', 'sms', 'webhook']
+
+
+def test_empty_spec_sends_every_category_by_email():
+    assert parse_routes('', CHANNELS) == {category: [('email', 0.0)] for category in ALERT_CATEGORIES}
+
+
+def test_routes_replace_the_default_for_named_categories():
+    routes = parse_routes(' stagnant=email@weekly ; tolerance_breach=sms,webhook@hourly ', CHANNELS)
+    assert routes[STAGNANT] == [('email', 7 * 86400.0)]
+    assert routes[TOLERANCE_BREACH] == [('sms', 0.0), ('webhook', 3600.0)]
+    assert all(routes[category] == [('email', 0.0)] for category in ALERT_CATEGORIES
+               if category not in (STAGNANT, TOLERANCE_BREACH))
+
+
+def test_category_routed_nowhere_is_silenced():
+    assert parse_routes('stagnant=', CHANNELS)[STAGNANT] == []
+
+
+@pytest.mark.parametrize('spec', ['unknown=email', 'stagnant=pager', 'stagnant=email@monthly'])
+def test_unknown_names_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_routes(spec, CHANNELS)
@@ -0,0 +1,96 @@
+"""
+Tests for collapsed stacks built from cProfile statistics
+
+    python -m pytest test/test_profiling.py
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import collapsed_stacks  # noqa: E402
+
+
+class FakeStats:
+    """Just the ``stats`` mapping of pstats.Stats: key -> (cc, nc, own, cumulative, callers)"""
+
+    def __init__(self):
+        self.stats = {}
+
+    def add(self, name, own, cumulative, callers=None):
+        self.stats[('~', 0, name)] = (1, 1, own, cumulative,
+                                      {('~', 0, caller): (1, 1, 0.0, seconds) for caller, seconds in (callers or {}).items()})
+
+
+def test_tree_splits_own_time_by_path():
+    stats = FakeStats()
+    stats.add('main', 1.0, 10.0)
+    stats.add('a', 2.0, 6.0, {'main': 6.0})
+    stats.add('b', 3.0, 3.0, {'main': 3.0})
+    stats.add('c', 4.0, 4.0, {'a': 4.0})
+
+    assert collapsed_stacks(stats) == {'main': 1.0, 'main;a': 2.0, 'main;b': 3.0, 'main;a;c': 4.0}
+
+
+def test_shared_callee_is_split_between_callers():
+    stats = FakeStats()
+    stats.add('main', 0.0, 4.0)
+    stats.add('a', 0.0, 1.0, {'main': 1.0})
+    stats.add('b', 0.0, 3.0, {'main': 3.0})
+    stats.add('leaf', 4.0, 4.0, {'a': 1.0, 'b': 3.0})
+
+    stacks = collapsed_stacks(stats)
+    assert stacks['main;a;leaf'] == pytest.approx(1.0)
+    assert stacks['main;b;leaf'] == pytest.approx(3.0)
+
+
+def test_wide_call_graph_finishes_quickly():
+    # Twelve layers of ten functions, each calling every function of the next layer: 10**11 paths
+    width, layers = 10, 12
+    stats = FakeStats()
+    stats.add('main', 1.0, 1.0 + width * (layers - 1))
+    for layer in range(1, layers):
+        cumulative = float(layers - layer)
+        for i in range(width):
+            callers = ({'main': cumulative} if layer == 1 else
+                       {f'f{layer - 1}_{j}': cumulative / width for j in range(width)})
+            stats.add(f'f{layer}_{i}', 1.0, cumulative, callers)
+
+    start = time.perf_counter()
+    stacks = collapsed_stacks(stats)
+    assert time.perf_counter() - start < 5.0
+    total = sum(entry[2] for entry in stats.stats.values())
+    assert stacks['main'] == 1.0
+    assert sum(stacks.values()) <= total + 1e-9
+
+
+def test_wide_pandas_profile_finishes_quickly():
+    pd = pytest.importorskip('pandas')
+    np = pytest.importorskip('numpy')
+
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(rng.normal(size=(2000, 50)), columns=[f'S{i}' for i in range(50)])
+    profile = cProfile.Profile()
+    profile.enable()
+    for _ in range(3):
+        buffer = io.StringIO()
+        frame.to_csv(buffer)
+        buffer.seek(0)
+        loaded = pd.read_csv(buffer, index_col=0)
+        loaded.rolling(5, min_periods=1).min().max()
+        loaded.stack().groupby(level=1).describe()
+    profile.disable()
+    stats = pstats.Stats(profile, stream=io.StringIO())
+
+    start = time.perf_counter()
+    stacks = collapsed_stacks(stats)
+    assert time.perf_counter() - start < 30.0
+    assert stacks
+    total = sum(entry[2] for entry in stats.stats.values())
+    assert sum(stacks.values()) <= total * 1.001
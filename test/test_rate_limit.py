@@ -0,0 +1,107 @@
+"""
+Tests for the token bucket, AIMD limits and circuit breaker used to pace price requests
+
+    python -m pytest test/test_rate_limit.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit import AIMDController, CircuitBreaker, TokenBucket, breaker_for  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_allows_bursts_then_refills_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=3.0, clock=clock)
+    assert all(bucket.try_acquire() for _ in range(3))
+    assert not bucket.try_acquire()
+
+    clock.now = 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+    # Idle time never earns more than the burst capacity
+    clock.now = 100.0
+    assert all(bucket.try_acquire() for _ in range(3))
+    assert not bucket.try_acquire()
+
+
+def test_token_bucket_rate_change_keeps_tokens_earned_at_old_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1.0, capacity=10.0, clock=clock)
+    assert bucket.try_acquire(10.0)
+
+    clock.now = 2.0
+    bucket.set_rate(0.1)
+    clock.now = 3.0
+    assert bucket.try_acquire(2.0)
+    assert not bucket.try_acquire(0.2)
+
+
+def test_aimd_grows_additively_and_shrinks_multiplicatively_within_bounds():
+    limit = AIMDController(initial=8.0, minimum=1.0, maximum=10.0, increase=1.0, decrease=0.5)
+    assert limit.on_success() == 9.0
+    assert limit.on_success() == 10.0
+    assert limit.on_success() == 10.0
+    assert limit.on_failure() == 5.0
+    assert limit.on_failure() == 2.5
+    assert limit.on_failure() == 1.25
+    assert limit.on_failure() == 1.0
+
+
+def test_aimd_clamps_initial_value():
+    assert AIMDController(initial=50.0, minimum=1.0, maximum=10.0).value == 10.0
+    assert AIMDController(initial=0.0, minimum=1.0, maximum=10.0).value == 1.0
+
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60.0, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_probe_through_after_reset_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0, clock=clock)
+    breaker.record_failure()
+    clock.now = 59.0
+    assert not breaker.allow()
+
+    clock.now = 60.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed probe opens the circuit for another full timeout
+    breaker.record_failure()
+    clock.now = 119.0
+    assert not breaker.allow()
+
+    clock.now = 120.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_is_shared_per_host():
+    assert breaker_for("test-rate-limit-a") is breaker_for("test-rate-limit-a")
+    assert breaker_for("test-rate-limit-a") is not breaker_for("test-rate-limit-b")
@@ -0,0 +1,73 @@
+"""
+Tests for the CSV state store's delta log
+
+    python -m pytest test/test_state_store.py
+"""
+import logging
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TrackerConfig  # noqa: E402
+from portfolio import new_portfolio_rows, to_portfolio  # noqa: E402
+from storage import CSVStateStore  # noqa: E402
+
+SYMBOLS = ['AAA', 'BBB', 'CCC', 'DDD']
+
+
+def make_store(tmp_path, **overrides) -> CSVStateStore:
+    config = TrackerConfig(data_file=str(tmp_path / "data.csv"), snapshot_dir=str(tmp_path / "snapshots"),
+                           **overrides)
+    return CSVStateStore(config, logging.getLogger("test_state_store"))
+
+
+def daily_run(store: CSVStateStore, day: str) -> pd.DataFrame:
+    """A weekday run: every symbol gets a new close and today's ``updated``"""
+    df = store.load()
+    df['close'] = df['close'] + 1.0
+    df['updated'] = pd.Timestamp(day)
+    df = to_portfolio(df)
+    store.save(df)
+    return df
+
+
+def seed(store: CSVStateStore) -> pd.DataFrame:
+    df = new_portfolio_rows(SYMBOLS, 15.0)
+    store.save(df)
+    store.compact(df)
+    return df
+
+
+def test_full_churn_run_appends_instead_of_compacting(tmp_path):
+    store = make_store(tmp_path, delta_compact_ratio=2.0)
+    seed(store)
+
+    daily_run(store, '2024-03-04')
+    daily_run(store, '2024-03-05')
+    daily_run(store, '2024-03-06')
+    with open(store.delta_path) as f:
+        assert len(f.read().splitlines()) == 1 + 3 * len(SYMBOLS)
+
+    # The log now holds three generations, more than twice the portfolio, so the next run folds it in
+    expected = daily_run(store, '2024-03-07')
+    assert not os.path.exists(store.delta_path)
+    pd.testing.assert_frame_equal(store.load(), expected, check_categorical=False)
+
+
+def test_append_after_torn_record(tmp_path):
+    store = make_store(tmp_path)
+    seed(store)
+    first = daily_run(store, '2024-03-04')
+
+    # A crash mid-append leaves the last record without its trailing fields and newline
+    with open(store.delta_path, "a") as f:
+        f.write("AAA,99.0,2024-03-05")
+    pd.testing.assert_frame_equal(store.load(), first, check_categorical=False)
+
+    second = daily_run(store, '2024-03-05')
+    with open(store.delta_path, "rb") as f:
+        assert f.read().endswith(b"\n")
+    pd.testing.assert_frame_equal(store.load(), second, check_categorical=False)
@@ -0,0 +1,58 @@
+"""
+Tests for symbol normalization, exchange routing and fetch batches
+
+    python -m pytest test/test_symbol_registry.py
+"""
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from symbol_registry import ExchangeRoute, SymbolRegistry, exchange_for_symbol, normalize_symbol  # noqa: E402
+
+
+def test_broker_spellings_normalize_to_yahoo_form():
+    assert normalize_symbol('nse:infy') == 'INFY.NS'
+    assert normalize_symbol('INFY.NSE') == 'INFY.NS'
+    assert normalize_symbol(' infy.ns ') == 'INFY.NS'
+    assert normalize_symbol('BOM:500325') == '500325.BO'
+    assert normalize_symbol('NASDAQ:AAPL') == 'AAPL'
+    assert normalize_symbol('BRK.B') == 'BRK.B'
+
+
+def test_exchange_is_judged_by_suffix():
+    assert exchange_for_symbol('INFY.NS') == 'NSE'
+    assert exchange_for_symbol('500325.BO') == 'BSE'
+    assert exchange_for_symbol('AAPL') == 'NYSE'
+    assert exchange_for_symbol('BRK.B') == 'NYSE'
+
+
+def test_resolve_keeps_bare_ticker_and_route_provider():
+    info = SymbolRegistry().resolve('nse:infy')
+    assert (info.symbol, info.ticker, info.exchange, info.provider) == ('INFY.NS', 'INFY', 'NSE', 'nse')
+
+
+def test_batches_group_by_exchange_and_split_by_route_size():
+    registry = SymbolRegistry(routes={'NYSE': ExchangeRoute(batch_size=2)})
+    plan = registry.batches(['AAPL', 'INFY.NS', 'MSFT', 'TCS.NS', 'IBM'])
+
+    assert list(plan) == ['NYSE', 'NSE']
+    assert [batch.symbols for batch in plan['NYSE']] == [['AAPL', 'MSFT'], ['IBM']]
+    assert [batch.symbols for batch in plan['NSE']] == [['INFY.NS', 'TCS.NS']]
+    assert plan['NSE'][0].route.min_interval == 1.0
+    assert plan['NSE'][0].calendar.exchange == 'NSE'
+
+
+def test_final_bars_cut_each_column_at_its_exchange_close():
+    closes = pd.DataFrame({'AAPL': [1.0, 2.0], 'INFY.NS': [3.0, 4.0]},
+                          index=pd.to_datetime(['2024-03-04', '2024-03-05']))
+    # 12:00 in New York is after the close in Kolkata
+    final = SymbolRegistry().final_bars(closes, datetime(2024, 3, 5, 17, 0, tzinfo=timezone.utc))
+
+    assert final['AAPL'].tolist()[0] == 1.0 and np.isnan(final['AAPL'].iloc[1])
+    assert final['INFY.NS'].tolist() == [3.0, 4.0]
+    assert closes['AAPL'].tolist() == [1.0, 2.0]
@@ -0,0 +1,65 @@
+"""
+Tests for exchange trading calendars and session closes
+
+    python -m pytest test/test_trading_calendar.py
+"""
+import os
+import sys
+from datetime import date, datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trading_calendar import get_calendar  # noqa: E402
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_nyse_holidays_are_not_sessions():
+    nyse = get_calendar("NYSE")
+    assert not nyse.is_session(date(2024, 3, 29))  # Good Friday
+    assert not nyse.is_session(date(2024, 7, 4))
+    assert not nyse.is_session(date(2024, 11, 28))  # Thanksgiving
+    assert not nyse.is_session(date(2021, 7, 5))  # July 4th on a Sunday, observed Monday
+    assert nyse.is_session(date(2021, 12, 31))  # Saturday New Year's Day is not observed
+    assert not nyse.is_session(date(2024, 3, 9))
+
+
+def test_session_arithmetic_skips_holidays():
+    nyse = get_calendar("NYSE")
+    assert nyse.sessions_between(date(2024, 7, 1), date(2024, 7, 8)) == 4
+    assert nyse.previous_session(date(2024, 7, 5)) == date(2024, 7, 3)
+    assert nyse.next_session(date(2024, 7, 3)) == date(2024, 7, 5)
+    assert nyse.window_start(date(2024, 7, 8), 5) == date(2024, 6, 28)
+
+
+def test_last_closed_session_counts_today_only_after_the_close():
+    nyse = get_calendar("NYSE")
+    # 15:30 and 16:30 in New York, before daylight saving time starts
+    assert nyse.last_closed_session(utc(2024, 3, 5, 20, 30)) == date(2024, 3, 4)
+    assert nyse.last_closed_session(utc(2024, 3, 5, 21, 30)) == date(2024, 3, 5)
+    # 16:30 in New York after the switch to daylight saving time
+    assert nyse.last_closed_session(utc(2024, 3, 11, 20, 30)) == date(2024, 3, 11)
+
+
+def test_last_closed_session_on_weekends_and_after_holidays():
+    nyse = get_calendar("NYSE")
+    assert nyse.last_closed_session(utc(2024, 3, 9, 18, 0)) == date(2024, 3, 8)
+    assert nyse.last_closed_session(utc(2024, 3, 11, 14, 0)) == date(2024, 3, 8)
+    assert nyse.last_closed_session(utc(2024, 7, 5, 14, 0)) == date(2024, 7, 3)
+
+
+def test_nse_closes_at_half_past_three_in_kolkata():
+    nse = get_calendar("NSE")
+    assert nse.last_closed_session(utc(2024, 3, 5, 9, 45)) == date(2024, 3, 4)
+    assert nse.last_closed_session(utc(2024, 3, 5, 10, 15)) == date(2024, 3, 5)
+    # Republic Day falls on a Friday
+    assert nse.last_closed_session(utc(2024, 1, 27, 12, 0)) == date(2024, 1, 25)
+
+
+def test_holidays_file_adds_closures_to_its_exchange_only(tmp_path):
+    path = tmp_path / "holidays.csv"
+    path.write_text("exchange,date\nnse,2024-03-08\n")
+    assert not get_calendar("NSE", str(path)).is_session(date(2024, 3, 8))
+    assert get_calendar("NYSE", str(path)).is_session(date(2024, 3, 8))
@@ -0,0 +1,196 @@
+"""
+Exchange trading calendars for session-aware date math
+"""
+import functools
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+FIRST_YEAR = 1990
+
+
+def to_days(values) -> np.ndarray:
+    """Parse dates (strings, date objects, timestamps) once into datetime64[D]
+
+    Unparseable or missing values become NaT.
+    """
+    if values is None or np.isscalar(values) or isinstance(values, date):
+        timestamp = pd.to_datetime(values, errors="coerce")
+        return np.datetime64("NaT", "D") if pd.isna(timestamp) else np.datetime64(timestamp.date(), "D")
+    return pd.to_datetime(pd.Series(values), errors="coerce").to_numpy(dtype="datetime64[D]")
+
+
+def calendar_days_between(d1, d2) -> np.ndarray:
+    """Absolute calendar-day distance between two date arrays, NaN where missing"""
+    delta = to_days(d2) - to_days(d1)
+    return np.abs(np.where(np.isnat(delta), np.nan, delta.astype(float)))
+
+
+def _easter(year: int) -> date:
+    """Western Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th given weekday of a month (n=-1 for the last one)"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: date) -> date:
+    """Move a Saturday holiday to Friday and a Sunday holiday to Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def nyse_holidays(start_year: int, end_year: int) -> List[date]:
+    """Regular NYSE full-day holidays; one-off closures are not included"""
+    holidays = []
+    for year in range(start_year, end_year + 1):
+        new_year = date(year, 1, 1)
+        # A Saturday New Year's Day is not observed on the preceding Friday
+        if new_year.weekday() != 5:
+            holidays.append(_observed(new_year))
+        if year >= 1998:
+            holidays.append(_nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. Day
+        holidays.append(_nth_weekday(year, 2, 0, 3))  # Washington's Birthday
+        holidays.append(_easter(year) - timedelta(days=2))  # Good Friday
+        holidays.append(_nth_weekday(year, 5, 0, -1))  # Memorial Day
+        if year >= 2022:
+            holidays.append(_observed(date(year, 6, 19)))  # Juneteenth
+        holidays.append(_observed(date(year, 7, 4)))
+        holidays.append(_nth_weekday(year, 9, 0, 1))  # Labor Day
+        holidays.append(_nth_weekday(year, 11, 3, 4))  # Thanksgiving
+        holidays.append(_observed(date(year, 12, 25)))
+    return holidays
+
+
+# National holidays on which Indian exchanges always close. Festival holidays
+# move every year and are announced by the exchange; add them via the
+# holidays file.
+NSE_FIXED_HOLIDAYS = [(1, 26), (5, 1), (8, 15), (10, 2), (12, 25)]
+
+
+def nse_holidays(start_year: int, end_year: int) -> List[date]:
+    """Fixed-date NSE/BSE holidays; they are not shifted when on a weekend"""
+    return [date(year, month, day)
+            for year in range(start_year, end_year + 1)
+            for month, day in NSE_FIXED_HOLIDAYS]
+
+
+HOLIDAY_RULES = {
+    "NYSE": nyse_holidays,
+    "NASDAQ": nyse_holidays,
+    "NSE": nse_holidays,
+    "BSE": nse_holidays,
+}
+
+# Local timezone and regular closing time of each exchange's session
+SESSION_CLOSES = {
+    "NYSE": ("America/New_York", time(16, 0)),
+    "NASDAQ": ("America/New_York", time(16, 0)),
+    "NSE": ("Asia/Kolkata", time(15, 30)),
+    "BSE": ("Asia/Kolkata", time(15, 30)),
+}
+
+
+def load_holidays_file(path: Optional[str]) -> Dict[str, List[date]]:
+    """Read extra holidays from a CSV with ``exchange`` and ``date`` columns"""
+    if not path or not os.path.exists(path):
+        return {}
+    table = pd.read_csv(path)
+    table["date"] = pd.to_datetime(table["date"], errors="coerce")
+    table = table.dropna(subset=["date"])
+    return {exchange.upper(): group["date"].dt.date.tolist() for exchange, group in table.groupby("exchange")}
+
+
+class TradingCalendar:
+    """Session calendar for one exchange backed by numpy.busdaycalendar
+
+    Every method accepts scalars or arrays of dates and is vectorized over
+    datetime64[D], so counting or shifting sessions for a whole portfolio is a
+    single NumPy call.
+    """
+
+    def __init__(self, exchange: str, holidays: List[date], timezone: str = "America/New_York",
+                 close: time = time(16, 0)):
+        self.exchange = exchange
+        self.timezone = ZoneInfo(timezone)
+        self.close = close
+        self._calendar = np.busdaycalendar(weekmask="1111100",
+                                           holidays=np.array(sorted(set(holidays)), dtype="datetime64[D]"))
+
+    @property
+    def holidays(self) -> np.ndarray:
+        return self._calendar.holidays
+
+    def is_session(self, dates):
+        """True for days the exchange is open"""
+        return np.is_busday(to_days(dates), busdaycal=self._calendar)
+
+    def offset(self, dates, sessions: int, roll: str = "forward"):
+        """Shift dates by a number of sessions, rolling non-sessions first"""
+        return np.busday_offset(to_days(dates), sessions, roll=roll, busdaycal=self._calendar)
+
+    def sessions_between(self, start, end):
+        """Number of sessions in [start, end)"""
+        return np.busday_count(to_days(start), to_days(end), busdaycal=self._calendar)
+
+    def window_start(self, end, sessions: int) -> date:
+        """First day of a window of the given number of sessions before end"""
+        return self.offset(end, -sessions).astype(object)
+
+    def previous_session(self, day) -> date:
+        """Latest session strictly before day"""
+        return self.offset(to_days(day) - 1, 0, roll="backward").astype(object)
+
+    def next_session(self, day) -> date:
+        """Earliest session strictly after day"""
+        return self.offset(to_days(day) + 1, 0, roll="forward").astype(object)
+
+    def close_at(self, day) -> datetime:
+        """Timezone-aware closing time of the session on day"""
+        return datetime.combine(to_days(day).astype(object), self.close, tzinfo=self.timezone)
+
+    def last_closed_session(self, now: Optional[datetime] = None) -> date:
+        """Latest session that has already closed; today's counts only after its close
+
+        ``now`` may be naive local time or timezone-aware.
+        """
+        now = (now or datetime.now()).astimezone(self.timezone)
+        today = now.date()
+        if self.is_session(today) and now >= self.close_at(today):
+            return today
+        return self.previous_session(today)
+
+
+@functools.lru_cache(maxsize=None)
+def get_calendar(exchange: str, holidays_file: Optional[str] = None) -> TradingCalendar:
+    """Return the (cached) trading calendar for an exchange"""
+    exchange = exchange.upper()
+    rule = HOLIDAY_RULES.get(exchange, nyse_holidays)
+    holidays = rule(FIRST_YEAR, date.today().year + 2)
+    holidays.extend(load_holidays_file(holidays_file).get(exchange, []))
+    timezone, close = SESSION_CLOSES.get(exchange, SESSION_CLOSES["NYSE"])
+    return TradingCalendar(exchange, holidays, timezone, close)
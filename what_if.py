@@ -0,0 +1,113 @@
+"""
+What-if evaluation of alert thresholds against the cached portfolio state
+"""
+import itertools
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from alerts import ALERT_CATEGORIES, FIVE_PERCENT, STAGNANT, TEN_PERCENT, TOLERANCE_BREACH, drawdown_pct
+from config import TrackerConfig
+from trading_calendar import calendar_days_between
+
+# --what-if names and the TrackerConfig settings they stand for; tolerance
+# overrides every symbol's own tolerance
+PARAMETERS = {
+    'tolerance': None,
+    'five_percent': 'five_percent_threshold',
+    'ten_percent': 'ten_percent_threshold',
+    'stagnation_days': 'stagnation_threshold_days',
+}
+
+
+def parse_values(text: str) -> List[float]:
+    """Parse '5,10,15' or an inclusive 'start:stop:step' range (or a mix of both)"""
+    values = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if ':' in part:
+            bounds = [float(bound) for bound in part.split(':')]
+            if len(bounds) != 3 or bounds[2] <= 0:
+                raise ValueError(f"range must be start:stop:step with a positive step, got {part!r}")
+            start, stop, step = bounds
+            count = int(np.floor((stop - start) / step + 1e-9)) + 1
+            values.extend(np.round(start + step * np.arange(max(count, 0)), 10).tolist())
+        else:
+            values.append(float(part))
+    if not values:
+        raise ValueError(f"no values in {text!r}")
+    return values
+
+
+def parse_what_if(specs: Sequence[str]) -> Dict[str, List[float]]:
+    """Parse repeated 'name=values' options into candidate values per parameter"""
+    grid = {}
+    for spec in specs:
+        name, sep, values = spec.partition('=')
+        name = name.strip().replace('-', '_')
+        if not sep or name not in PARAMETERS:
+            raise ValueError(f"expected one of {', '.join(PARAMETERS)} as name=values, got {spec!r}")
+        grid[name] = parse_values(values)
+    return grid
+
+
+def parameter_sets(grid: Dict[str, List[float]], config: TrackerConfig) -> pd.DataFrame:
+    """Every combination of the candidate values, one row per parameter set
+
+    Parameters without candidates keep their configured value; tolerance is
+    NaN there, meaning each symbol's own tolerance applies.
+    """
+    base = {name: [getattr(config, setting) if setting else np.nan] for name, setting in PARAMETERS.items()}
+    base.update(grid)
+    rows = list(itertools.product(*base.values()))
+    return pd.DataFrame(rows, columns=list(base), dtype=float)
+
+
+def alert_counts(portfolio: pd.DataFrame, sets: pd.DataFrame, chunk_size: int = 1024) -> pd.DataFrame:
+    """Alerts each parameter set would raise on the portfolio, by category
+
+    Mirrors ``StockTracker.calculate_variance``: symbols without a usable
+    drawdown are skipped, a tolerance breach is counted alongside the tier
+    and the ten percent tier takes precedence. The drawdowns are computed
+    once and every set is compared against them as one (sets x symbols)
+    array, ``chunk_size`` sets at a time.
+    """
+    drawdowns = drawdown_pct(portfolio['high'], portfolio['close'])
+    valid = ~np.isnan(drawdowns)
+    drawdowns = drawdowns[valid]
+    own_tolerance = portfolio['tolerance'].to_numpy(dtype=float)[valid]
+    stagnation = calendar_days_between(portfolio['updated'], portfolio['high_date'])[valid]
+
+    counts = np.zeros((len(sets), len(ALERT_CATEGORIES)), dtype=np.int64)
+    columns = {category: position for position, category in enumerate(ALERT_CATEGORIES)}
+    for start in range(0, len(sets), chunk_size):
+        chunk = sets.iloc[start:start + chunk_size]
+        rows = slice(start, start + len(chunk))
+
+        tolerance = chunk['tolerance'].to_numpy()[:, None]
+        tolerance = np.where(np.isnan(tolerance), own_tolerance[None, :], tolerance)
+        ten = drawdowns[None, :] >= chunk['ten_percent'].to_numpy()[:, None]
+        five = ~ten & (drawdowns[None, :] >= chunk['five_percent'].to_numpy()[:, None])
+        with np.errstate(invalid='ignore'):
+            stagnant = stagnation[None, :] > chunk['stagnation_days'].to_numpy()[:, None]
+
+        counts[rows, columns[TOLERANCE_BREACH]] = (drawdowns[None, :] > tolerance).sum(axis=1)
+        counts[rows, columns[TEN_PERCENT]] = ten.sum(axis=1)
+        counts[rows, columns[FIVE_PERCENT]] = five.sum(axis=1)
+        counts[rows, columns[STAGNANT]] = stagnant.sum(axis=1)
+
+    result = sets.copy()
+    for category, position in columns.items():
+        result[category] = counts[:, position]
+    result['total'] = counts.sum(axis=1)
+    return result
+
+
+def format_counts(result: pd.DataFrame) -> str:
+    """Render alert counts per parameter set as a plain table"""
+    table = result.copy()
+    table['tolerance'] = table['tolerance'].map(lambda value: 'own' if np.isnan(value) else f"{value:g}")
+    return table.to_string(index=False)